@@ -1,5 +1,9 @@
 from tokenizers import Tokenizer
+from collections import OrderedDict
+import functools
+import hashlib
 import os
+import threading
 import requests
 import onnxruntime
 import numpy as np
@@ -24,6 +28,76 @@ QUANT_VALUES = {
     },
 }
 
+ONNX_PROVIDERS = [
+    "TensorrtExecutionProvider",
+    "CUDAExecutionProvider",
+    "CPUExecutionProvider",
+]
+EMBEDDING_CACHE_SIZE = 1024
+
+
+class EmbeddingCache:
+    """Thread-safe LRU cache of raw (unpadded, unquantized) prompt embeddings.
+
+    Keys are (model_name, class name or image hash, precision) tuples, values are
+    1D float32 embedding vectors.
+    """
+
+    def __init__(self, max_size=EMBEDDING_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+            return embedding
+
+    def put(self, key, embedding):
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+embedding_cache = EmbeddingCache()
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_inference_session(model_path):
+    """Return a process-wide ONNX session for `model_path`, creating it on first use.
+
+    Sessions are shared between services; `InferenceSession.run` is thread-safe.
+    """
+    with _sessions_lock:
+        session = _sessions.get(model_path)
+        if session is None:
+            session = onnxruntime.InferenceSession(model_path, providers=ONNX_PROVIDERS)
+            _sessions[model_path] = session
+        return session
+
+
+@functools.lru_cache(maxsize=1)
+def get_tokenizer():
+    tokenizer_json_path = download_tokenizer(
+        url="https://huggingface.co/openai/clip-vit-base-patch32/resolve/main/tokenizer.json",
+        save_path="tokenizer.json",
+    )
+    tokenizer = Tokenizer.from_file(tokenizer_json_path)
+    tokenizer.enable_padding(
+        pad_id=tokenizer.token_to_id("<|endoftext|>"), pad_token="<|endoftext|>"
+    )
+    return tokenizer
+
 
 def pad_and_quantize_features(
     features, max_num_classes=80, model_name="yolo-world", precision="int8"
@@ -50,14 +124,29 @@ def pad_and_quantize_features(
 def extract_text_embeddings(
     class_names, max_num_classes=80, model_name="yolo-world", precision="int8"
 ):
-    tokenizer_json_path = download_tokenizer(
-        url="https://huggingface.co/openai/clip-vit-base-patch32/resolve/main/tokenizer.json",
-        save_path="tokenizer.json",
-    )
-    tokenizer = Tokenizer.from_file(tokenizer_json_path)
-    tokenizer.enable_padding(
-        pad_id=tokenizer.token_to_id("<|endoftext|>"), pad_token="<|endoftext|>"
+    """
+    Embed `class_names` and return them padded and quantized for the model input.
+    Only class names missing from the embedding cache are run through the encoder.
+    """
+    keys = [(model_name, class_name, precision) for class_name in class_names]
+    embeddings = [embedding_cache.get(key) for key in keys]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+    if missing:
+        textual_output = _encode_text([class_names[i] for i in missing], model_name)
+        for i, embedding in zip(missing, textual_output):
+            embeddings[i] = embedding
+            embedding_cache.put(keys[i], embedding)
+
+    text_features = pad_and_quantize_features(
+        np.stack(embeddings), max_num_classes, model_name, precision
     )
+
+    return text_features
+
+
+def _encode_text(class_names, model_name):
+    tokenizer = get_tokenizer()
     encodings = tokenizer.encode_batch(class_names)
 
     text_onnx = np.array([e.ids for e in encodings], dtype=np.int64)
@@ -70,14 +159,7 @@ def extract_text_embeddings(
             "clip_textual_hf.onnx",
         )
 
-        session_textual = onnxruntime.InferenceSession(
-            textual_onnx_model_path,
-            providers=[
-                "TensorrtExecutionProvider",
-                "CUDAExecutionProvider",
-                "CPUExecutionProvider",
-            ],
-        )
+        session_textual = get_inference_session(textual_onnx_model_path)
         textual_output = session_textual.run(
             None,
             {
@@ -96,14 +178,7 @@ def extract_text_embeddings(
             "mobileclip_textual_hf.onnx",
         )
 
-        session_textual = onnxruntime.InferenceSession(
-            textual_onnx_model_path,
-            providers=[
-                "TensorrtExecutionProvider",
-                "CUDAExecutionProvider",
-                "CPUExecutionProvider",
-            ],
-        )
+        session_textual = get_inference_session(textual_onnx_model_path)
         textual_output = session_textual.run(
             None,
             {
@@ -115,13 +190,7 @@ def extract_text_embeddings(
             textual_output, ord=2, axis=-1, keepdims=True
         )  # Normalize the output
 
-    text_features = pad_and_quantize_features(
-        textual_output, max_num_classes, model_name, precision
-    )
-
-    del session_textual
-
-    return text_features
+    return textual_output.astype(np.float32)
 
 
 def extract_image_prompt_embeddings(
@@ -131,6 +200,30 @@ def extract_image_prompt_embeddings(
     mask_prompt=None,
     precision="int8",
 ):
+    cache_key = (model_name, _hash_image_prompt(image, mask_prompt), precision)
+    image_embeddings = embedding_cache.get(cache_key)
+    if image_embeddings is None:
+        image_embeddings = _encode_image(image, model_name, mask_prompt)
+        embedding_cache.put(cache_key, image_embeddings)
+
+    image_features = pad_and_quantize_features(
+        image_embeddings[None, :], max_num_classes, model_name, precision
+    )
+
+    return image_features
+
+
+def _hash_image_prompt(image, mask_prompt=None):
+    digest = hashlib.sha1(np.ascontiguousarray(image).data)
+    digest.update(str(image.shape).encode())
+    if mask_prompt is not None:
+        mask_array = np.ascontiguousarray(mask_prompt, dtype=np.float32)
+        digest.update(mask_array.data)
+        digest.update(str(mask_array.shape).encode())
+    return digest.hexdigest()
+
+
+def _encode_image(image, model_name, mask_prompt=None):
     # Select model and preprocess accordingly
     if model_name == "yoloe":
         image_resized = cv2.resize(image, (640, 640))
@@ -152,14 +245,7 @@ def extract_image_prompt_embeddings(
 
     onnx_model_path = download_model(model_url, model_path)
 
-    session = onnxruntime.InferenceSession(
-        onnx_model_path,
-        providers=[
-            "TensorrtExecutionProvider",
-            "CUDAExecutionProvider",
-            "CPUExecutionProvider",
-        ],
-    )
+    session = get_inference_session(onnx_model_path)
 
     if model_name == "yoloe":
         if mask_prompt is None:
@@ -182,14 +268,7 @@ def extract_image_prompt_embeddings(
         input_name = session.get_inputs()[0].name
         outputs = session.run(None, {input_name: input_tensor})
 
-    image_embeddings = outputs[0].squeeze(0).reshape(1, -1)
-    image_features = pad_and_quantize_features(
-        image_embeddings, max_num_classes, model_name, precision
-    )
-
-    del session
-
-    return image_features
+    return outputs[0].reshape(-1).astype(np.float32)
 
 
 def download_tokenizer(url, save_path):
@@ -1,3 +1,8 @@
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional
+
 import depthai as dai
 import numpy as np
 import cv2
@@ -5,7 +10,7 @@ from depthai_nodes.message.img_detections import (
     ImgDetectionExtended,
     ImgDetectionsExtended,
 )
-from .helper_functions import reverse_resize_and_pad
+from .helper_functions import reverse_resize_and_pad_indices
 import time
 
 from depthai_nodes.utils import AnnotationHelper
@@ -16,6 +21,32 @@ INPUT_SHAPE = (NN_WIDTH, NN_HEIGHT)
 
 IMG_WIDTH, IMG_HEIGHT = 640, 400
 
+# Cuboids of different boxes are fitted in parallel, one CuboidFitter per worker
+NUM_WORKERS = min(os.cpu_count() or 1, 4)
+# A fit of the previous frame warm-starts the fit of a box whose point cloud center
+# moved less than this (mm)
+WARM_START_MAX_SHIFT = 100.0
+# Margin (in mask pixels) added around a detection's bounding box when its mask is
+# scaled back to the point cloud resolution
+MASK_ROI_MARGIN = 4
+
+
+class MaskROI(NamedTuple):
+    """Mask of one detection inside its bounding box, at point cloud resolution."""
+
+    top: int
+    left: int
+    mask: np.ndarray
+
+
+class CuboidFit(NamedTuple):
+    """Result of fitting a cuboid to the point cloud of one detection."""
+
+    center: np.ndarray
+    planes: Optional[np.ndarray] = None
+    dimensions: Optional[np.ndarray] = None
+    corners: Optional[np.ndarray] = None
+
 
 class BoxProcessingNode(dai.node.ThreadedHostNode):
     """Node for processing box detection and annotation."""
@@ -29,28 +60,35 @@ class BoxProcessingNode(dai.node.ThreadedHostNode):
         self.outputANN = self.createOutput()
         self.outputANNCuboid = self.createOutput()
 
-        self.fitter = CuboidFitter()
+        self._fitters: "queue.SimpleQueue[CuboidFitter]" = queue.SimpleQueue()
+        for _ in range(NUM_WORKERS):
+            self._fitters.put(CuboidFitter())
+        self._pool = ThreadPoolExecutor(max_workers=NUM_WORKERS)
+        self._previous_fits: List[CuboidFit] = []
+        # Nearest-neighbor inverse of the NN input resize, from point cloud pixels to mask pixels
+        self._mask_rows, self._mask_cols = reverse_resize_and_pad_indices(
+            (IMG_WIDTH, IMG_HEIGHT), INPUT_SHAPE
+        )
         self.intrinsics = tuple()
-        self.fit = False
         self.helper_det = None
         self.helper_cuboid = None
         self.last_successful_fit = 0
         self.dimensions_cache = None
         self.cache_duration = 1.0  # seconds
 
-    def _draw_mask(self, mask: np.ndarray, idx: int):
+    def _draw_mask(self, roi: MaskROI):
         """
         Trace the binary mask for a single instance and draw it as a filled polygon.
         """
-        h, w = mask.shape
-        binary = (mask == idx).astype(np.uint8)
-
-        if not np.any(binary):
+        if not np.any(roi.mask):
             return
 
         # Extract mask contours to draw polygon lines
         contours, _ = cv2.findContours(
-            binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+            roi.mask.view(np.uint8),
+            cv2.RETR_EXTERNAL,
+            cv2.CHAIN_APPROX_SIMPLE,
+            offset=(roi.left, roi.top),
         )
 
         for cnt in contours:
@@ -60,7 +98,7 @@ class BoxProcessingNode(dai.node.ThreadedHostNode):
             pts = approx.reshape(-1, 2)
 
             # pts = cnt.reshape(-1, 2)                   # To keep original mask
-            norm_pts = [(float(x) / w, float(y) / h) for x, y in pts]
+            norm_pts = [(float(x) / IMG_WIDTH, float(y) / IMG_HEIGHT) for x, y in pts]
             self.helper_det.draw_polyline(
                 norm_pts,
                 outline_color=(1.0, 0.5, 0.5, 0.0),  # Color for mask outline
@@ -114,39 +152,42 @@ class BoxProcessingNode(dai.node.ThreadedHostNode):
 
     def _fit_cuboid(
         self,
-        idx: int,
-        mask: np.ndarray,
-        pcl: np.ndarray,
-        pcl_color: np.ndarray,
-    ):
-        """Fits cuboid and draws its 3D outline as lines."""
-
-        mask_bool = mask == idx
-        pts3d = pcl.reshape((IMG_HEIGHT, IMG_WIDTH, 3))[mask_bool]
-        cols = cv2.cvtColor(pcl_color, cv2.COLOR_BGR2RGB)[mask_bool]
-
-        self.fitter.reset()
-        self.fitter.set_point_cloud(pts3d, cols)
-
-        if not self.fitter.fit_orthogonal_planes():
-            self.fit = False
-            return
-
-        dimensions, corners = self.fitter.calculate_dimensions_corners_MAD()
-
-        # print('Dimensions: ', dimensions)
-
-        self.dimensions = dimensions
-        self.fit = True
-        self.last_successful_fit = time.time()
-        self.dimensions_cache = dimensions
-
-        corners = np.asarray(corners)
-        outline = self.fitter.get_3d_lines_o3d(corners)
-        corners3d = np.asarray(outline.points)
-        self._draw_cuboid_outline(corners3d)
-
-    def _draw_box_and_label(self, det: ImgDetectionExtended) -> None:
+        center: np.ndarray,
+        pts3d: np.ndarray,
+        cols: np.ndarray,
+        warm_start: Optional[np.ndarray],
+    ) -> CuboidFit:
+        """Fits a cuboid to the points of one detection, runs on a worker thread."""
+        fitter = self._fitters.get()
+        try:
+            fitter.reset()
+            fitter.set_point_cloud(pts3d, cols)
+            if not fitter.fit_orthogonal_planes(warm_start):
+                return CuboidFit(center)
+
+            dimensions, corners = fitter.calculate_dimensions_corners_MAD()
+            outline = fitter.get_3d_lines_o3d(np.asarray(corners))
+            return CuboidFit(
+                center,
+                np.asarray(fitter.planes),
+                dimensions,
+                np.asarray(outline.points),
+            )
+        finally:
+            self._fitters.put(fitter)
+
+    def _warm_start(self, center: np.ndarray) -> Optional[np.ndarray]:
+        """Planes of the closest successful fit of the previous frame, if close enough."""
+        best, best_shift = None, WARM_START_MAX_SHIFT
+        for fit in self._previous_fits:
+            shift = np.linalg.norm(fit.center - center)
+            if fit.planes is not None and shift < best_shift:
+                best, best_shift = fit.planes, shift
+        return best
+
+    def _draw_box_and_label(
+        self, det: ImgDetectionExtended, dimensions: Optional[np.ndarray]
+    ) -> None:
         """Draws rotated rect and label"""
 
         # All annotation coordinates are normalized to the NN input size (512×320)
@@ -171,10 +212,10 @@ class BoxProcessingNode(dai.node.ThreadedHostNode):
         corners = rr.getPoints()
         corner0 = (corners[0].x, corners[0].y)
 
-        if self.fit:
+        if dimensions is not None:
             label = (
                 f"Box ({det._confidence:.2f}) "
-                f"{self.dimensions[0]:.1f} x {self.dimensions[1]:.1f} x {self.dimensions[2]:.1f} cm"
+                f"{dimensions[0]:.1f} x {dimensions[1]:.1f} x {dimensions[2]:.1f} cm"
             )
         elif self.dimensions_cache is not None and (
             time.time() - self.last_successful_fit < self.cache_duration
@@ -194,68 +235,129 @@ class BoxProcessingNode(dai.node.ThreadedHostNode):
             size=18,
         )
 
+    def _detection_mask(
+        self, det: ImgDetectionExtended, idx: int, mask: np.ndarray
+    ) -> MaskROI:
+        """Scales the mask of one detection back to point cloud resolution, only inside its bounding box."""
+        mask_h, mask_w = mask.shape
+        xmin, ymin, xmax, ymax = det._rotated_rect.getOuterRect()
+        x0 = int(xmin * mask_w) - MASK_ROI_MARGIN
+        y0 = int(ymin * mask_h) - MASK_ROI_MARGIN
+        x1 = int(np.ceil(xmax * mask_w)) + MASK_ROI_MARGIN
+        y1 = int(np.ceil(ymax * mask_h)) + MASK_ROI_MARGIN
+        # Point cloud pixels whose mask pixel lies in the bounding box
+        left, right = np.searchsorted(self._mask_cols, (x0, x1))
+        top, bottom = np.searchsorted(self._mask_rows, (y0, y1))
+        rows = self._mask_rows[top:bottom]
+        cols = self._mask_cols[left:right]
+        if not len(rows) or not len(cols):
+            return MaskROI(int(top), int(left), np.zeros((0, 0), dtype=bool))
+        # Compare at mask resolution, then sample the binary crop
+        binary = mask[rows[0] : rows[-1] + 1, cols[0] : cols[-1] + 1] == idx
+        binary = binary.take(rows - rows[0], axis=0).take(cols - cols[0], axis=1)
+        return MaskROI(int(top), int(left), binary)
+
+    def _fit_cuboids(
+        self, rois: List[MaskROI], pcl: np.ndarray, pcl_colors: np.ndarray
+    ) -> List[CuboidFit]:
+        """Fits cuboids to all detections on the worker pool, warm-started from the previous frame."""
+        points = pcl.reshape((IMG_HEIGHT, IMG_WIDTH, 3))
+        colors = pcl_colors.reshape((IMG_HEIGHT, IMG_WIDTH, 4))
+        futures = []
+        for top, left, mask in rois:
+            rows = slice(top, top + mask.shape[0])
+            cols = slice(left, left + mask.shape[1])
+            pts3d = points[rows, cols][mask]
+            if not len(pts3d):
+                futures.append(None)
+                continue
+            # The colors of the point cloud are BGRA, the fitter expects RGB
+            cols3d = colors[rows, cols][mask][:, 2::-1]
+            center = pts3d.mean(axis=0)
+            futures.append(
+                self._pool.submit(
+                    self._fit_cuboid,
+                    center,
+                    pts3d,
+                    cols3d,
+                    self._warm_start(center),
+                )
+            )
+        fits = [
+            future.result() if future is not None else CuboidFit(np.zeros(3))
+            for future in futures
+        ]
+        self._previous_fits = fits
+        return fits
+
     def _annotate_detection(
-        self, det: ImgDetectionExtended, idx: int, mask: np.ndarray, pcl, pcl_colors
+        self, det: ImgDetectionExtended, roi: MaskROI, fit: CuboidFit
     ):
         """Draw all annotations (mask, 3D box fit, bounding box + label) for a single detection."""
-        self._draw_mask(mask, idx)
-        self._fit_cuboid(idx, mask, pcl, pcl_colors)
-        self._draw_box_and_label(det)
+        self._draw_mask(roi)
+        if fit.dimensions is not None:
+            self.last_successful_fit = time.time()
+            self.dimensions_cache = fit.dimensions
+            self._draw_cuboid_outline(fit.corners)
+        self._draw_box_and_label(det, fit.dimensions)
 
     def run(self):
-        while self.isRunning():
-            pcl_msg = self.inputPCL.get()
-            rgb_msg = self.inputRGB.get()
-            det_msg = self.inputDet.get()
-
-            if pcl_msg is None or rgb_msg is None or det_msg is None:
-                print(
-                    f"AnnotationNode: Missing messages - PCL: {pcl_msg is None}, RGB: {rgb_msg is None}, Det: {det_msg is None}"
-                )
-                time.sleep(0.005)
-                continue
-
-            assert isinstance(pcl_msg, dai.PointCloudData)
-            assert isinstance(rgb_msg, dai.ImgFrame)
-            assert isinstance(det_msg, ImgDetectionsExtended)
-            inPointCloud: dai.PointCloudData = pcl_msg
-            inRGB: dai.ImgFrame = rgb_msg
-            parser_output: ImgDetectionsExtended = det_msg
-
-            try:
-                points, colors = inPointCloud.getPointsRGB()
-                if points is None:
-                    print("AnnotationNode: Empty PCL points array.")
+        try:
+            while self.isRunning():
+                pcl_msg = self.inputPCL.get()
+                rgb_msg = self.inputRGB.get()
+                det_msg = self.inputDet.get()
+
+                if pcl_msg is None or rgb_msg is None or det_msg is None:
+                    print(
+                        f"AnnotationNode: Missing messages - PCL: {pcl_msg is None}, RGB: {rgb_msg is None}, Det: {det_msg is None}"
+                    )
+                    time.sleep(0.005)
                     continue
 
-                rgba_img = colors.reshape(IMG_HEIGHT, IMG_WIDTH, 4)
-                bgr_img = cv2.cvtColor(rgba_img, cv2.COLOR_BGRA2BGR)
-                mask = parser_output._masks._mask
-                detections = parser_output.detections
-                mask_full = reverse_resize_and_pad(
-                    mask, (IMG_WIDTH, IMG_HEIGHT), INPUT_SHAPE
-                )  # This is still a heavy operation
-
-                timestamp = inPointCloud.getTimestamp()
-                seq_num = inPointCloud.getSequenceNum()
-
-                self.helper_det = AnnotationHelper()
-                self.helper_cuboid = AnnotationHelper()
-
-                for idx, det in enumerate(detections):
-                    self._annotate_detection(det, idx, mask_full, points, bgr_img)
-
-                ann_msg = self.helper_det.build(timestamp, seq_num)
-                ann_msg_cuboid = self.helper_cuboid.build(timestamp, seq_num)
-
-                self.outputANN.send(ann_msg)
-                self.outputANNCuboid.send(ann_msg_cuboid)
-
-            except Exception as e:
-                print(
-                    f"AnnotationNode: Error during processing frame (Seq {inRGB.getSequenceNum()}): {e}"
-                )
-                import traceback
-
-                traceback.print_exc()
-                continue
+                assert isinstance(pcl_msg, dai.PointCloudData)
+                assert isinstance(rgb_msg, dai.ImgFrame)
+                assert isinstance(det_msg, ImgDetectionsExtended)
+                inPointCloud: dai.PointCloudData = pcl_msg
+                inRGB: dai.ImgFrame = rgb_msg
+                parser_output: ImgDetectionsExtended = det_msg
+
+                try:
+                    points, colors = inPointCloud.getPointsRGB()
+                    if points is None:
+                        print("AnnotationNode: Empty PCL points array.")
+                        continue
+
+                    mask = parser_output._masks._mask
+                    detections = parser_output.detections
+                    rois = [
+                        self._detection_mask(det, idx, mask)
+                        for idx, det in enumerate(detections)
+                    ]
+
+                    timestamp = inPointCloud.getTimestamp()
+                    seq_num = inPointCloud.getSequenceNum()
+
+                    self.helper_det = AnnotationHelper()
+                    self.helper_cuboid = AnnotationHelper()
+
+                    fits = self._fit_cuboids(rois, points, colors) if rois else []
+                    for det, roi, fit in zip(detections, rois, fits):
+                        self._annotate_detection(det, roi, fit)
+
+                    ann_msg = self.helper_det.build(timestamp, seq_num)
+                    ann_msg_cuboid = self.helper_cuboid.build(timestamp, seq_num)
+
+                    self.outputANN.send(ann_msg)
+                    self.outputANNCuboid.send(ann_msg_cuboid)
+
+                except Exception as e:
+                    print(
+                        f"AnnotationNode: Error during processing frame (Seq {inRGB.getSequenceNum()}): {e}"
+                    )
+                    import traceback
+
+                    traceback.print_exc()
+                    continue
+        finally:
+            self._pool.shutdown(wait=False)
@@ -3,6 +3,13 @@ import open3d as o3d
 from itertools import combinations
 from typing import List, Tuple, Optional
 
+# RANSAC hypotheses are first scored on a random subset of this many points, only the
+# best RANSAC_RESCORED hypotheses are then scored on all points
+RANSAC_SUBSET_POINTS = 256
+RANSAC_RESCORED = 16
+# Hypotheses per warm-start normal, each through one sampled point
+WARM_START_HYPOTHESES = 50
+
 
 class CuboidFitter:
     """
@@ -11,6 +18,12 @@ class CuboidFitter:
     This class takes a point cloud as input and fits a cuboid to it by finding
     three orthogonal planes. It can then calculate the dimensions and corners
     of the fitted cuboid.
+
+    Planes are fitted with a vectorized RANSAC: all hypotheses are sampled at once and
+    scored with matrix products, first on a subset of the points, then the best of them
+    on all points. Hypotheses that are not orthogonal to the planes already found are
+    discarded before scoring, and the planes of the previous frame can be passed as warm
+    start.
     """
 
     def __init__(
@@ -45,6 +58,7 @@ class CuboidFitter:
         self.center: Optional[np.ndarray] = None
         self.planes: List[np.ndarray] = []
         self.plane_points: List[o3d.geometry.PointCloud] = []
+        self._rng = np.random.default_rng()
         self.reset()
 
     def update_point_cloud(self, points: np.ndarray) -> None:
@@ -221,33 +235,134 @@ class CuboidFitter:
         dot_product = np.dot(points, normal)
         return np.abs(dot_product + plane_eq[3]) / norm
 
-    def fit_plane(self) -> Tuple[Optional[np.ndarray], Optional[List[int]], bool]:
+    def fit_plane(
+        self, warm_start_normals: Optional[np.ndarray] = None
+    ) -> Tuple[Optional[np.ndarray], Optional[List[int]], bool]:
         """
-        Fits a plane to the point cloud using RANSAC.
+        Fits a plane orthogonal to the already fitted planes to the point cloud using RANSAC.
+
+        Args:
+            warm_start_normals (np.ndarray, optional): Normals of planes expected in the point cloud, e.g. from the previous frame, tried in addition to the sampled hypotheses. Defaults to None.
 
         Returns:
             tuple: A tuple containing the plane equation, the inlier indices, and a boolean indicating success.
         """
-        if len(self.point_cloud.points) < self.sample_points:
+        points = np.asarray(self.point_cloud.points)
+        if len(points) < self.sample_points:
             return None, None, False
 
-        try:
-            plane_eq, plane_inliers = self.point_cloud.segment_plane(
-                self.distance_threshold, self.sample_points, self.max_iterations
-            )
-        except RuntimeError:
+        plane_eq = self.ransac_plane(points, warm_start_normals)
+        if plane_eq is None:
             return None, None, False
 
-        inlier_count = len(plane_inliers)
-        if len(self.point_cloud.points) == 0:
-            return None, None, False
-        inlier_ratio = inlier_count / len(self.point_cloud.points)
+        plane_inliers = np.flatnonzero(
+            self.dist_to_plane(points, plane_eq) <= self.distance_threshold
+        )
+        inlier_ratio = len(plane_inliers) / len(points)
 
         if inlier_ratio >= 0.2:
-            return np.array(plane_eq), plane_inliers, True
+            return plane_eq, plane_inliers.tolist(), True
 
         return None, None, False
 
+    def ransac_plane(
+        self, points: np.ndarray, warm_start_normals: Optional[np.ndarray] = None
+    ) -> Optional[np.ndarray]:
+        """
+        Finds the plane with the most inliers among max_iterations hypotheses, scored at once.
+
+        Each hypothesis is the least-squares plane of sample_points random points (the
+        plane through them for three points). Warm-start normals add hypotheses with
+        that normal through single random points. Hypotheses that are degenerate or not
+        orthogonal to the already fitted planes are discarded. All hypotheses are scored
+        on a random subset of the points and the best of them on all points. The winning
+        plane is refined with a least-squares fit to its inliers.
+
+        Args:
+            points (np.ndarray): An (N, 3) array of points.
+            warm_start_normals (np.ndarray, optional): An (M, 3) array of plane normals to try. Defaults to None.
+
+        Returns:
+            Optional[np.ndarray]: The plane equation [a, b, c, d] with a unit normal, or None if no valid hypothesis was found.
+        """
+        samples = points[
+            self._rng.integers(
+                0, len(points), size=(self.max_iterations, self.sample_points)
+            )
+        ]
+        centroids = samples.mean(axis=1)
+        if self.sample_points == 3:
+            normals = np.cross(
+                samples[:, 1] - samples[:, 0], samples[:, 2] - samples[:, 0]
+            )
+            lengths = np.linalg.norm(normals, axis=1)
+            # Collinear samples do not define a plane
+            valid = lengths > 1e-9
+            normals /= np.maximum(lengths, 1e-12)[:, None]
+        else:
+            centered = samples - centroids[:, None]
+            eigenvalues, eigenvectors = np.linalg.eigh(
+                np.einsum("hni,hnj->hij", centered, centered)
+            )
+            normals = eigenvectors[:, :, 0]
+            valid = eigenvalues[:, 1] > 1e-9 * np.maximum(eigenvalues[:, 2], 1e-12)
+
+        if warm_start_normals is not None and len(warm_start_normals):
+            warm_normals = np.asarray(warm_start_normals, dtype=np.float64)[:, :3]
+            warm_normals = warm_normals / np.linalg.norm(warm_normals, axis=1)[:, None]
+            warm_normals = np.repeat(warm_normals, WARM_START_HYPOTHESES, axis=0)
+            warm_points = points[self._rng.integers(0, len(points), len(warm_normals))]
+            normals = np.vstack([normals, warm_normals])
+            centroids = np.vstack([centroids, warm_points])
+            valid = np.concatenate([valid, np.ones(len(warm_normals), dtype=bool)])
+
+        if self.planes:
+            existing = np.asarray(self.planes)[:, :3]
+            existing = existing / np.linalg.norm(existing, axis=1)[:, None]
+            cosines = np.abs(normals @ existing.T)
+            valid &= np.all(cosines <= self.orthogonality_thr, axis=1)
+
+        normals, centroids = normals[valid], centroids[valid]
+        if not len(normals):
+            return None
+        offsets = -np.einsum("ij,ij->i", normals, centroids)
+
+        # Preemptive scoring: all hypotheses on a subset, the best ones on all points
+        if len(points) > RANSAC_SUBSET_POINTS and len(normals) > RANSAC_RESCORED:
+            subset = points[
+                self._rng.choice(len(points), RANSAC_SUBSET_POINTS, replace=False)
+            ]
+            counts = self._count_inliers(subset, normals, offsets)
+            candidates = np.argpartition(counts, -RANSAC_RESCORED)[-RANSAC_RESCORED:]
+            normals, offsets = normals[candidates], offsets[candidates]
+        counts = self._count_inliers(points, normals, offsets)
+
+        best = int(np.argmax(counts))
+        plane_eq = np.append(normals[best], offsets[best])
+
+        inliers = points[
+            self.dist_to_plane(points, plane_eq) <= self.distance_threshold
+        ]
+        if len(inliers) >= 3:
+            centroid = inliers.mean(axis=0)
+            centered = inliers - centroid
+            refined_normal = np.linalg.eigh(centered.T @ centered)[1][:, 0]
+            refined = np.append(refined_normal, -refined_normal @ centroid)
+            if all(
+                self.check_orthogonal(refined, existing) for existing in self.planes
+            ):
+                plane_eq = refined
+        return plane_eq
+
+    def _count_inliers(
+        self, points: np.ndarray, normals: np.ndarray, offsets: np.ndarray
+    ) -> np.ndarray:
+        """Counts the inliers of every plane hypothesis with one matrix product."""
+        distances = points @ normals.T
+        distances += offsets
+        np.abs(distances, out=distances)
+        return np.count_nonzero(distances <= self.distance_threshold, axis=0)
+
     def check_orthogonal(self, plane_eq1: np.ndarray, plane_eq2: np.ndarray) -> bool:
         """
         Checks if two planes are orthogonal.
@@ -273,12 +388,15 @@ class CuboidFitter:
             )
         )
 
-    def fit_orthogonal_planes(self) -> bool:
+    def fit_orthogonal_planes(self, warm_start: Optional[np.ndarray] = None) -> bool:
         """
         Fits three orthogonal planes to the point cloud.
 
         This method iteratively fits planes and checks for orthogonality.
 
+        Args:
+            warm_start (np.ndarray, optional): The planes fitted to the same object in the previous frame. Defaults to None.
+
         Returns:
             bool: True if three orthogonal planes were successfully fitted, False otherwise.
         """
@@ -287,7 +405,7 @@ class CuboidFitter:
 
         attempts = 0
         while len(self.planes) < 3 and attempts < self.max_attempts:
-            plane_eq, inliers, success = self.fit_plane()
+            plane_eq, inliers, success = self.fit_plane(warm_start)
             if not success or inliers is None or plane_eq is None:
                 if len(self.point_cloud.points) < self.sample_points:
                     return False
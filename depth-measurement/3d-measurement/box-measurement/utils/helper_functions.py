@@ -1,3 +1,5 @@
+from typing import Tuple
+
 import cv2
 import depthai as dai
 import numpy as np
@@ -16,6 +18,67 @@ def read_intrinsics(device: dai.Device, resize_w: int, resize_h: int) -> tuple:
     return fx, fy, cx, cy
 
 
+def resize_and_pad_transform(
+    original_size: Tuple[int, int], target_size: Tuple[int, int]
+) -> Tuple[int, int, int, int]:
+    """
+    Computes the transform applied by `resize_and_pad` to an image of a given size.
+
+    Args:
+        original_size (tuple[int, int]): The (width, height) of the original image.
+        target_size (tuple[int, int]): The (width, height) of the padded image.
+
+    Returns:
+        tuple[int, int, int, int]: The (width, height) of the resized image inside the
+                                   padded image and its (left, top) padding.
+    """
+    original_aspect = original_size[0] / original_size[1]
+    target_aspect = target_size[0] / target_size[1]
+
+    if original_aspect > target_aspect:
+        # Original has a wider aspect than target. Resize based on width.
+        new_w = target_size[0]
+        new_h = int(new_w / original_aspect)
+    else:
+        # Original has a taller aspect or equal to target. Resize based on height.
+        new_h = target_size[1]
+        new_w = int(new_h * original_aspect)
+
+    pad_left = (target_size[0] - new_w) // 2
+    pad_top = (target_size[1] - new_h) // 2
+    return new_w, new_h, pad_left, pad_top
+
+
+def reverse_resize_and_pad_indices(
+    original_size: Tuple[int, int], modified_size: Tuple[int, int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Precomputes the nearest-neighbor inverse of `resize_and_pad` as index arrays.
+
+    For every row and column of the original image, the returned arrays hold the row and
+    column of the padded image it maps to, so any region of a padded image (e.g. the
+    bounding box of one instance of a segmentation mask) can be scaled back with
+    `padded_img[np.ix_(rows[y0:y1], cols[x0:x1])]` without touching the rest of the image.
+    Both arrays are non-decreasing.
+
+    Args:
+        original_size (tuple[int, int]): The original (width, height) of the image
+                                         before any processing.
+        modified_size (tuple[int, int]): The (width, height) of the padded image.
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: The row and column indices into the padded image.
+    """
+    original_width, original_height = original_size
+    new_w, new_h, pad_left, pad_top = resize_and_pad_transform(
+        original_size, modified_size
+    )
+    # Same sampling as cv2.resize with INTER_NEAREST
+    rows = pad_top + np.arange(original_height) * new_h // original_height
+    cols = pad_left + np.arange(original_width) * new_w // original_width
+    return rows, cols
+
+
 def resize_and_pad(img, target_size, pad_color=0):
     """
     Resizes an image to a target size while maintaining its aspect ratio by adding padding.
@@ -34,30 +97,16 @@ def resize_and_pad(img, target_size, pad_color=0):
     Returns:
         numpy.ndarray: The resized and padded image as a NumPy array.
     """
-    # Compute the aspect ratio of the original and target image
-    original_aspect = img.shape[1] / img.shape[0]
-    target_aspect = target_size[0] / target_size[1]
-
-    if original_aspect > target_aspect:
-        # Original has a wider aspect than target. Resize based on width.
-        new_w = target_size[0]
-        new_h = int(new_w / original_aspect)
-    else:
-        # Original has a taller aspect or equal to target. Resize based on height.
-        new_h = target_size[1]
-        new_w = int(new_h * original_aspect)
+    new_w, new_h, pad_left, pad_top = resize_and_pad_transform(
+        (img.shape[1], img.shape[0]), target_size
+    )
 
     # Resize the image
     img_resized = cv2.resize(img, (new_w, new_h))
 
     # Compute the padding required
-    pad_vert = target_size[1] - new_h
-    pad_horz = target_size[0] - new_w
-
-    pad_top = pad_vert // 2
-    pad_bottom = pad_vert - pad_top
-    pad_left = pad_horz // 2
-    pad_right = pad_horz - pad_left
+    pad_bottom = target_size[1] - new_h - pad_top
+    pad_right = target_size[0] - new_w - pad_left
 
     # Pad the image
     img_padded = cv2.copyMakeBorder(
@@ -94,34 +143,12 @@ def reverse_resize_and_pad(padded_img, original_size, modified_size):
         numpy.ndarray: The image resized back to its original dimensions.
     """
     original_width, original_height = original_size
-    modified_width, modified_height = modified_size
-
-    # Compute the aspect ratio of the original and target image
-    original_aspect = original_width / original_height
-    modified_aspect = modified_width / modified_height
-
-    if original_aspect > modified_aspect:
-        # Original has a wider aspect than target. Resize based on width.
-        new_w = modified_width
-        new_h = int(new_w / original_aspect)
-    else:
-        # Original has a taller aspect or equal to target. Resize based on height.
-        new_h = modified_height
-        new_w = int(new_h * original_aspect)
-
-    # Compute padding
-    pad_vert = modified_height - new_h
-    pad_horz = modified_width - new_w
-
-    pad_top = pad_vert // 2
-    pad_bottom = pad_vert - pad_top
-    pad_left = pad_horz // 2
-    pad_right = pad_horz - pad_left
+    new_w, new_h, pad_left, pad_top = resize_and_pad_transform(
+        original_size, modified_size
+    )
 
     # Remove padding by cropping
-    cropped_img = padded_img[
-        pad_top : modified_height - pad_bottom, pad_left : modified_width - pad_right
-    ]
+    cropped_img = padded_img[pad_top : pad_top + new_h, pad_left : pad_left + new_w]
 
     # Resize back to original dimensions
     original_img = cv2.resize(cropped_img, (original_width, original_height))
@@ -35,6 +35,12 @@ first_update_final = True
 # Store latest frames for point cloud updates
 latest_frames = {"raw": None, "final": None}
 
+# Cached projection tables and reused point/color buffers
+ray_tables = {}
+point_buffers = {}
+color_buffers = {}
+projection_lock = threading.Lock()
+
 # Live update timing control
 last_pointcloud_update_time = 0
 POINTCLOUD_UPDATE_INTERVAL = 0.1  # Update every 100ms (10 FPS)
@@ -65,76 +71,115 @@ def toggle_pause():
         return paused
 
 
-def depth_to_pointcloud(depth_frame, intrinsics, max_distance=3000, decimation=1):
-    """Convert depth frame to 3D point cloud"""
-    if depth_frame is None or depth_frame.size == 0:
-        return np.array([]), np.array([]), np.array([])
-
-    h, w = depth_frame.shape
+def get_ray_table(shape, intrinsics, decimation=1):
+    """Return cached (x, y) ray factors (u - cx) / fx and (v - cy) / fy of shape
+    (N, 2) for every decimated pixel of a depth frame with the given shape"""
+    h, w = shape
     fx, fy = intrinsics["fx"], intrinsics["fy"]
     cx, cy = intrinsics["cx"], intrinsics["cy"]
+    key = (h, w, decimation, fx, fy, cx, cy)
+
+    rays = ray_tables.get(key)
+    if rays is None:
+        u, v = np.meshgrid(np.arange(0, w, decimation), np.arange(0, h, decimation))
+        rays = np.column_stack(((u.ravel() - cx) / fx, (v.ravel() - cy) / fy))
+        ray_tables[key] = rays
+    return rays
+
+
+def get_point_buffer(source_key, num_points):
+    """Return the next of two alternating (num_points, 3) float64 point buffers
+    for the source, so the buffer being drawn is not overwritten by the next frame"""
+    buffers, index = point_buffers.get(source_key, ([], 0))
+    if not buffers or buffers[0].shape[0] != num_points:
+        buffers = [np.empty((num_points, 3), dtype=np.float64) for _ in range(2)]
+        index = 0
+    point_buffers[source_key] = (buffers, 1 - index)
+    return buffers[index]
+
+
+def depth_to_pointcloud(
+    depth_frame, intrinsics, max_distance=3000, decimation=1, source_key="raw"
+):
+    """Convert depth frame to an (N, 3) array of 3D points (in mm)
+
+    The returned array is a view into a reused buffer of `source_key`.
+    """
+    if depth_frame is None or depth_frame.size == 0:
+        return np.empty((0, 3))
+
+    with projection_lock:
+        rays = get_ray_table(depth_frame.shape, intrinsics, decimation)
+
+        # Get corresponding depth values
+        depth_decimated = depth_frame[::decimation, ::decimation].ravel()
+
+        # Filter out invalid depths
+        valid_mask = (depth_decimated > 0) & (depth_decimated < max_distance)
+        valid_idx = np.flatnonzero(valid_mask)
 
-    # Create coordinate grids
-    u, v = np.meshgrid(np.arange(0, w, decimation), np.arange(0, h, decimation))
+        if valid_idx.size == 0:
+            return np.empty((0, 3))
 
-    # Get corresponding depth values
-    depth_decimated = depth_frame[::decimation, ::decimation]
+        # Convert to 3D coordinates (in mm)
+        points = get_point_buffer(source_key, depth_decimated.size)[: valid_idx.size]
+        points[:, 2] = depth_decimated[valid_idx]
+        np.multiply(rays[valid_idx], points[:, 2:3], out=points[:, :2])
 
-    # Filter out invalid depths
-    valid_mask = (depth_decimated > 0) & (depth_decimated < max_distance)
+        return points
 
-    if np.sum(valid_mask) == 0:
-        return np.array([]), np.array([]), np.array([])
 
-    # Extract valid coordinates and depths
-    u_valid = u[valid_mask]
-    v_valid = v[valid_mask]
-    z_valid = depth_decimated[valid_mask]
+def get_color_buffer(source_key, num_points):
+    """Return a reused (num_points, 3) color buffer for the source"""
+    buffer = color_buffers.get(source_key)
+    if buffer is None or buffer.shape[0] < num_points:
+        buffer = np.empty((num_points, 3))
+        color_buffers[source_key] = buffer
+    return buffer[:num_points]
 
-    # Convert to 3D coordinates (in mm)
-    x = (u_valid - cx) * z_valid / fx
-    y = (v_valid - cy) * z_valid / fy
-    z = z_valid
 
-    return x, y, z
+def make_jet_lut(size=256):
+    """Jet-like colormap lookup table (blue -> cyan -> green -> yellow -> red)"""
+    val = np.linspace(0.0, 1.0, size)
+    lut = np.zeros((size, 3))
+    # Blue to cyan
+    lut[:, 1] = np.where(val < 0.25, 4 * val, 1)
+    lut[:, 2] = np.where(val < 0.25, 1, 1 - 4 * (val - 0.25))
+    # Cyan to green, then green to yellow and yellow to red
+    lut[:, 2] = np.where(val < 0.5, lut[:, 2], 0)
+    lut[:, 0] = np.where(val < 0.5, 0, np.where(val < 0.75, 4 * (val - 0.5), 1))
+    lut[:, 1] = np.where(val < 0.75, lut[:, 1], 1 - 4 * (val - 0.75))
+    return lut
 
 
-def create_colored_pointcloud(x, y, z):
-    """Create an Open3D point cloud with colors based on depth"""
-    if len(x) == 0:
+JET_LUT = make_jet_lut()
+
+
+def create_colored_pointcloud(points, colors_out=None):
+    """Create an Open3D point cloud with colors based on depth
+
+    `colors_out` is an optional reusable (N, 3) buffer for the per-point colors.
+    """
+    if len(points) == 0:
         return o3d.geometry.PointCloud()
 
     # Create point cloud
     pcd = o3d.geometry.PointCloud()
-    points = np.column_stack((x, y, z))
     pcd.points = o3d.utility.Vector3dVector(points)
 
     # Create colors based on depth (z values)
-    if len(z) > 0:
-        # Normalize z values to 0-1
-        z_min, z_max = np.min(z), np.max(z)
-        if z_max > z_min:
-            z_norm = (z - z_min) / (z_max - z_min)
-        else:
-            z_norm = np.zeros_like(z)
-
-        # Apply colormap (jet-like: blue -> cyan -> yellow -> red)
-        colors = np.zeros((len(z), 3))
-        for i, val in enumerate(z_norm):
-            if val < 0.25:
-                # Blue to cyan
-                colors[i] = [0, 4 * val, 1]
-            elif val < 0.5:
-                # Cyan to green
-                colors[i] = [0, 1, 1 - 4 * (val - 0.25)]
-            elif val < 0.75:
-                # Green to yellow
-                colors[i] = [4 * (val - 0.5), 1, 0]
-            else:
-                # Yellow to red
-                colors[i] = [1, 1 - 4 * (val - 0.75), 0]
-
-        pcd.colors = o3d.utility.Vector3dVector(colors)
+    z = points[:, 2]
+    z_min, z_max = z.min(), z.max()
+    if z_max > z_min:
+        lut_idx = ((z - z_min) * ((len(JET_LUT) - 1) / (z_max - z_min))).astype(np.intp)
+    else:
+        lut_idx = np.zeros(len(z), dtype=np.intp)
+
+    # Apply colormap as a lookup table
+    colors = np.empty((len(z), 3)) if colors_out is None else colors_out
+    np.take(JET_LUT, lut_idx, axis=0, out=colors)
+
+    pcd.colors = o3d.utility.Vector3dVector(colors)
 
     return pcd
 
@@ -194,9 +239,9 @@ def pointcloud_visualization():
             with pointcloud_lock:
                 # Update raw point cloud if needed
                 if latest_pointcloud_raw is not None and needs_update_raw:
-                    x, y, z, source = latest_pointcloud_raw
+                    points, source = latest_pointcloud_raw
 
-                    if len(x) > 0:
+                    if len(points) > 0:
                         # Save current camera parameters BEFORE updating geometry
                         if not source.startswith("Manual") and not first_update_raw:
                             try:
@@ -209,7 +254,9 @@ def pointcloud_visualization():
 
                         # Clear and create new point cloud
                         vis_raw.clear_geometries()
-                        pcd_raw = create_colored_pointcloud(x, y, z)
+                        pcd_raw = create_colored_pointcloud(
+                            points, get_color_buffer("raw", len(points))
+                        )
                         vis_raw.add_geometry(pcd_raw)
 
                         # Restore camera position for live updates, reset for manual/first updates
@@ -230,16 +277,16 @@ def pointcloud_visualization():
                         if not is_paused() or source.startswith("Manual"):
                             status = "⏸️ PAUSED" if is_paused() else "🔴 LIVE"
                             print(
-                                f"📊 {status} RAW point cloud: {len(x)} points ({source})"
+                                f"📊 {status} RAW point cloud: {len(points)} points ({source})"
                             )
 
                     needs_update_raw = False
 
                 # Update final point cloud if needed
                 if latest_pointcloud_final is not None and needs_update_final:
-                    x, y, z, source = latest_pointcloud_final
+                    points, source = latest_pointcloud_final
 
-                    if len(x) > 0:
+                    if len(points) > 0:
                         # Save current camera parameters BEFORE updating geometry
                         if not source.startswith("Manual") and not first_update_final:
                             try:
@@ -252,7 +299,9 @@ def pointcloud_visualization():
 
                         # Clear and create new point cloud
                         vis_final.clear_geometries()
-                        pcd_final = create_colored_pointcloud(x, y, z)
+                        pcd_final = create_colored_pointcloud(
+                            points, get_color_buffer("final", len(points))
+                        )
                         vis_final.add_geometry(pcd_final)
 
                         # Restore camera position for live updates, reset for manual/first updates
@@ -273,7 +322,7 @@ def pointcloud_visualization():
                         if not is_paused() or source.startswith("Manual"):
                             status = "⏸️ PAUSED" if is_paused() else "🔴 LIVE"
                             print(
-                                f"📊 {status} FINAL point cloud: {len(x)} points ({source})"
+                                f"📊 {status} FINAL point cloud: {len(points)} points ({source})"
                             )
 
                     needs_update_final = False
@@ -365,19 +414,20 @@ def update_pointcloud_live(source_key):
     try:
         depth_frame = latest_frames[source_key]
 
-        x, y, z = depth_to_pointcloud(
+        points = depth_to_pointcloud(
             depth_frame,
             CAMERA_INTRINSICS,
             max_distance=pointcloud_params["max_distance"],
             decimation=max(1, pointcloud_params["decimation"]),
+            source_key=source_key,
         )
 
         with pointcloud_lock:
             if source_key == "raw":
-                latest_pointcloud_raw = (x, y, z, "Live Raw")
+                latest_pointcloud_raw = (points, "Live Raw")
                 needs_update_raw = True
             elif source_key == "final":
-                latest_pointcloud_final = (x, y, z, "Live Final")
+                latest_pointcloud_final = (points, "Live Final")
                 needs_update_final = True
 
         last_pointcloud_update_time = current_time
@@ -402,24 +452,25 @@ def update_pointcloud_manual(source_key):
     try:
         depth_frame = latest_frames[source_key]
 
-        x, y, z = depth_to_pointcloud(
+        points = depth_to_pointcloud(
             depth_frame,
             CAMERA_INTRINSICS,
             max_distance=pointcloud_params["max_distance"],
             decimation=max(1, pointcloud_params["decimation"]),
+            source_key=source_key,
         )
 
         with pointcloud_lock:
             if source_key == "raw":
-                latest_pointcloud_raw = (x, y, z, "Manual Raw")
+                latest_pointcloud_raw = (points, "Manual Raw")
                 needs_update_raw = True
             elif source_key == "final":
-                latest_pointcloud_final = (x, y, z, "Manual Final")
+                latest_pointcloud_final = (points, "Manual Final")
                 needs_update_final = True
 
         status = "⏸️ PAUSED" if is_paused() else "🔴 LIVE"
         print(
-            f"🎯 {status} Manual update: {source_key.upper()} point cloud - {len(x)} points (view reset)"
+            f"🎯 {status} Manual update: {source_key.upper()} point cloud - {len(points)} points (view reset)"
         )
 
     except Exception as e:
@@ -2,10 +2,11 @@
 
 import cv2
 import depthai as dai
-from utils.roi_control import ROIControl
+import numpy as np
+from utils.roi_control import ROIControl, ROIGridDisplay
 from utils.arguments import initialize_argparser
 from depthai_nodes.node import ApplyColormap
-from utils.measure_distance import MeasureDistance
+from utils.measure_distance import MeasureDistance, grid_rois
 
 
 _, args = initialize_argparser()
@@ -36,11 +37,20 @@ with dai.Pipeline(device) as pipeline:
     )
 
     calibdata = device.readCalibration()
-    spatials = pipeline.create(ROIControl).build(
-        disparity_frames=depth_color_transform.out,
-        measured_depth=measure_distance.output,
-    )
-    spatials.output_roi.link(measure_distance.roi_input)
+    if args.roi_grid:
+        rows, cols = args.roi_grid
+        measure_distance.setRois(grid_rois(0, 0, 640, 400, rows, cols))
+        measure_distance.setAveragingMethod(np.median)
+        spatials = pipeline.create(ROIGridDisplay).build(
+            disparity_frames=depth_color_transform.out,
+            measured_depth=measure_distance.output,
+        )
+    else:
+        spatials = pipeline.create(ROIControl).build(
+            disparity_frames=depth_color_transform.out,
+            measured_depth=measure_distance.output,
+        )
+        spatials.output_roi.link(measure_distance.roi_input)
 
     visualizer.addTopic("Disparity", spatials.passthrough)
     visualizer.addTopic("Spatial Calculations", spatials.annotation_output)
@@ -54,5 +64,5 @@ with dai.Pipeline(device) as pipeline:
         if key == ord("q"):
             print("Got q key from the remote connection!")
             break
-        else:
+        elif not args.roi_grid:
             spatials.handle_key_press(key)
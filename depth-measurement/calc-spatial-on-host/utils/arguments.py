@@ -17,6 +17,17 @@ def initialize_argparser():
         type=str,
     )
 
+    parser.add_argument(
+        "-g",
+        "--roi_grid",
+        help="Measure a grid of ROWS x COLS ROIs over the whole frame instead of a single movable ROI. The depth of every ROI is the approximate median of its valid depth.",
+        required=False,
+        default=None,
+        nargs=2,
+        metavar=("ROWS", "COLS"),
+        type=int,
+    )
+
     args = parser.parse_args()
 
     return parser, args
@@ -1,7 +1,10 @@
 import math
+import cv2
 import depthai as dai
 import numpy as np
-from typing import Tuple
+from typing import Dict, Optional, Tuple
+
+MEDIAN_BINS = 128  # histogram bins of the approximate median in multi-ROI mode
 
 
 class RegionOfInterest(dai.Buffer):
@@ -101,13 +104,76 @@ class SpatialDistance(dai.Buffer):
         self._centroid = value
 
 
+class SpatialDistances(dai.Buffer):
+    """Spatial coordinates of many ROIs of one depth frame.
+
+    `rois` holds the (N, 4) ROIs (xmin, ymin, xmax, ymax), `centroids` their (N, 2)
+    centers and `spatials` the (N, 3) spatial coordinates (x, y, z) in mm, NaN for
+    ROIs without valid depth.
+    """
+
+    def __init__(
+        self, rois: np.ndarray, centroids: np.ndarray, spatials: np.ndarray
+    ) -> None:
+        super().__init__(0)
+        self._rois = rois
+        self._centroids = centroids
+        self._spatials = spatials
+
+    @property
+    def rois(self) -> np.ndarray:
+        return self._rois
+
+    @rois.setter
+    def rois(self, value: np.ndarray) -> None:
+        self._rois = value
+
+    @property
+    def centroids(self) -> np.ndarray:
+        return self._centroids
+
+    @centroids.setter
+    def centroids(self, value: np.ndarray) -> None:
+        self._centroids = value
+
+    @property
+    def spatials(self) -> np.ndarray:
+        return self._spatials
+
+    @spatials.setter
+    def spatials(self, value: np.ndarray) -> None:
+        self._spatials = value
+
+
+def grid_rois(
+    xmin: int, ymin: int, xmax: int, ymax: int, rows: int, cols: int
+) -> np.ndarray:
+    """(rows * cols, 4) ROIs (xmin, ymin, xmax, ymax) tiling the given area, row by row."""
+    xs = np.linspace(xmin, xmax, cols + 1).round().astype(np.int64)
+    ys = np.linspace(ymin, ymax, rows + 1).round().astype(np.int64)
+    x0, y0 = np.meshgrid(xs[:-1], ys[:-1])
+    x1, y1 = np.meshgrid(xs[1:], ys[1:])
+    return np.stack([x0.ravel(), y0.ravel(), x1.ravel(), y1.ravel()], axis=1)
+
+
 class MeasureDistance(dai.node.HostNode):
+    """Calculates the spatial coordinates of a ROI of the depth frames.
+
+    In multi-ROI mode (`setRois`), the coordinates of all ROIs are sent as one
+    SpatialDistances message per frame. Mean depths are then read from summed-area
+    tables of the valid depth and of the valid pixel count, built once per frame, so
+    every ROI costs O(1). With np.median as averaging method, an approximate median is
+    interpolated from a MEDIAN_BINS histogram of every ROI.
+    """
+
     def __init__(self) -> None:
         super().__init__()
         self.output = self.createOutput()
         self._threshold_low = 200  # 20cm
         self._threshold_high = 30000  # 30m
         self._averaging_method = np.mean
+        self._rois: Optional[np.ndarray] = None
+        self._hfov: Dict[int, float] = {}  # radians, per camera instance number
         self.roi_input = self.createInput()
 
     def build(
@@ -124,22 +190,30 @@ class MeasureDistance(dai.node.HostNode):
     def setAveragingMethod(self, method) -> None:
         self._averaging_method = method
 
+    def setRois(self, rois: Optional[np.ndarray]) -> None:
+        """Switches to multi-ROI mode for the (N, 4) `rois` (xmin, ymin, xmax, ymax),
+        None switches back to the single ROI."""
+        self._rois = (
+            None if rois is None else np.asarray(rois, dtype=np.int64).reshape(-1, 4)
+        )
+
     def process(self, depth_frame: dai.ImgFrame) -> None:
         # print("Measure distance process start")
-        self._update_roi()
         depth = depth_frame.getFrame()
 
+        # Required information for calculating spatial coordinates on the host
+        HFOV = self._get_hfov(depth_frame.getInstanceNum())
+
+        if self._rois is not None:
+            self._process_rois(depth_frame, depth, HFOV)
+            return
+
+        self._update_roi()
+
         # Calculate the average depth in the ROI.
         depthROI = self._roi.get_frame_roi(depth)
         inRange = (self._threshold_low <= depthROI) & (depthROI <= self._threshold_high)
 
-        # Required information for calculating spatial coordinates on the host
-        HFOV: float = np.deg2rad(
-            self._calib_data.getFov(
-                dai.CameraBoardSocket(depth_frame.getInstanceNum()), useSpec=False
-            )
-        )
-
         if inRange.any():
             averageDepth: float = self._averaging_method(depthROI[inRange])
         else:
@@ -172,6 +246,58 @@ class MeasureDistance(dai.node.HostNode):
         self.output.send(spatial_distance)
         # print("Measure distance process end")
 
+    def _process_rois(
+        self, depth_frame: dai.ImgFrame, depth: np.ndarray, HFOV: float
+    ) -> None:
+        height, width = depth.shape
+        rois = self._rois
+        # ROIs clipped to the frame, as in RegionOfInterest.get_frame_roi
+        x0 = np.clip(rois[:, 0], 0, width)
+        y0 = np.clip(rois[:, 1], 0, height)
+        x1 = np.maximum(np.clip(rois[:, 2], 0, width), x0)
+        y1 = np.maximum(np.clip(rois[:, 3], 0, height), y0)
+        inRange = (self._threshold_low <= depth) & (depth <= self._threshold_high)
+
+        if self._averaging_method is np.mean:
+            averageDepth = _roi_means(depth, inRange, x0, y0, x1, y1)
+        elif self._averaging_method is np.median:
+            averageDepth = _roi_medians(depth, inRange, x0, y0, x1, y1)
+        else:
+            averageDepth = np.full(len(rois), np.nan)
+            for i in range(len(rois)):
+                roi_depth = depth[y0[i] : y1[i], x0[i] : x1[i]]
+                roi_in_range = inRange[y0[i] : y1[i], x0[i] : x1[i]]
+                if roi_in_range.any():
+                    averageDepth[i] = self._averaging_method(roi_depth[roi_in_range])
+
+        centroids = ((rois[:, :2] + rois[:, 2:]) / 2).astype(np.int64)
+        offsets = centroids - np.array([int(width / 2), int(height / 2)])
+        # tan(_calc_angle(offset)) for all ROIs
+        tan_angles = math.tan(HFOV / 2.0) * offsets / (width / 2.0)
+        spatials = np.stack(
+            [
+                averageDepth * tan_angles[:, 0],
+                -averageDepth * tan_angles[:, 1],
+                averageDepth,
+            ],
+            axis=1,
+        )
+
+        spatial_distances = SpatialDistances(rois, centroids, spatials)
+        spatial_distances.setTimestamp(depth_frame.getTimestamp())
+        spatial_distances.setTimestampDevice(depth_frame.getTimestampDevice())
+        spatial_distances.setSequenceNum(depth_frame.getSequenceNum())
+        self.output.send(spatial_distances)
+
+    def _get_hfov(self, instance_num: int) -> float:
+        if instance_num not in self._hfov:
+            self._hfov[instance_num] = np.deg2rad(
+                self._calib_data.getFov(
+                    dai.CameraBoardSocket(instance_num), useSpec=False
+                )
+            )
+        return self._hfov[instance_num]
+
     def _update_roi(self) -> None:
         rois = self.roi_input.tryGetAll()
         if rois:
@@ -186,3 +312,86 @@ class MeasureDistance(dai.node.HostNode):
 
     def setUpperThreshold(self, threshold_high):
         self._threshold_high = threshold_high
+
+
+def _roi_sums(table: np.ndarray, x0, y0, x1, y1) -> np.ndarray:
+    return table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+
+
+def _roi_means(depth: np.ndarray, valid: np.ndarray, x0, y0, x1, y1) -> np.ndarray:
+    """Mean valid depth of every ROI from summed-area tables, NaN if none is valid."""
+    sums = cv2.integral(np.where(valid, depth, 0).astype(np.float64))
+    counts = cv2.integral(valid.view(np.uint8))
+    roi_sums = _roi_sums(sums, x0, y0, x1, y1)
+    roi_counts = _roi_sums(counts, x0, y0, x1, y1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(roi_counts > 0, roi_sums / roi_counts, np.nan)
+
+
+def _roi_medians(depth: np.ndarray, valid: np.ndarray, x0, y0, x1, y1) -> np.ndarray:
+    """Approximate median valid depth of every ROI, NaN if none is valid.
+
+    The valid depths of every ROI are binned into a histogram of MEDIAN_BINS bins
+    over the depth range of that ROI, and the median is interpolated linearly within
+    its bin, so the error is below the ROI's depth range / MEDIAN_BINS.
+    """
+    num_rois = len(x0)
+    width = depth.shape[1]
+    pixels, roi_ids = _roi_pixels(x0, y0, x1, y1, width)
+    keep = valid.ravel()[pixels]
+    values = depth.ravel()[pixels[keep]].astype(np.float64)
+    roi_ids = roi_ids[keep]
+    medians = np.full(num_rois, np.nan)
+    if not len(values):
+        return medians
+
+    # Pixels are grouped by ROI, so every ROI's values are one contiguous run
+    counts = np.bincount(roi_ids, minlength=num_rois)
+    has_values = counts > 0
+    starts = (np.cumsum(counts) - counts)[has_values]
+    low = np.zeros(num_rois)
+    high = np.zeros(num_rois)
+    low[has_values] = np.minimum.reduceat(values, starts)
+    high[has_values] = np.maximum.reduceat(values, starts)
+    bin_width = np.maximum(high - low, 1.0) / MEDIAN_BINS
+    bins = np.minimum(
+        ((values - low[roi_ids]) / bin_width[roi_ids]).astype(np.int64),
+        MEDIAN_BINS - 1,
+    )
+    histograms = np.bincount(
+        roi_ids * MEDIAN_BINS + bins, minlength=num_rois * MEDIAN_BINS
+    ).reshape(num_rois, MEDIAN_BINS)
+
+    cumulative = np.cumsum(histograms, axis=1)
+    half = counts / 2
+    # First bin holding at least half of the ROI's values
+    median_bin = np.minimum((cumulative < half[:, None]).sum(axis=1), MEDIAN_BINS - 1)
+    rows = np.arange(num_rois)
+    in_bin = histograms[rows, median_bin]
+    below = cumulative[rows, median_bin] - in_bin
+    fraction = (half - below) / np.maximum(in_bin, 1)
+
+    medians[has_values] = np.clip(
+        (low + (median_bin + fraction) * bin_width)[has_values],
+        low[has_values],
+        high[has_values],
+    )
+    return medians
+
+
+def _roi_pixels(x0, y0, x1, y1, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Flat indices of all pixels of the ROIs and the ROI index of every pixel."""
+    heights = y1 - y0
+    widths = x1 - x0
+    # One segment per ROI row
+    segment_rois = np.repeat(np.arange(len(x0)), heights)
+    segment_rows = y0[segment_rois] + (
+        np.arange(len(segment_rois)) - np.repeat(np.cumsum(heights) - heights, heights)
+    )
+    segment_starts = segment_rows * width + x0[segment_rois]
+    segment_lengths = widths[segment_rois]
+    offsets = np.arange(segment_lengths.sum()) - np.repeat(
+        np.cumsum(segment_lengths) - segment_lengths, segment_lengths
+    )
+    pixels = np.repeat(segment_starts, segment_lengths) + offsets
+    return pixels, np.repeat(segment_rois, segment_lengths)
@@ -1,7 +1,9 @@
 import math
 import depthai as dai
+import numpy as np
 from depthai_nodes.utils import AnnotationHelper
 from .measure_distance import SpatialDistance
+from .measure_distance import SpatialDistances
 from .measure_distance import RegionOfInterest
 
 
@@ -150,3 +152,58 @@ class ROIControl(dai.node.HostNode):
         if (self._roi.ymax - self._roi.ymin) > 6:
             self._roi.ymin += 1
             self._roi.ymax -= 1
+
+
+class ROIGridDisplay(dai.node.HostNode):
+    """Draws the ROIs of the multi-ROI mode with the depth measured in each of them."""
+
+    def __init__(self):
+        super().__init__()
+
+        self.passthrough = self.createOutput(
+            possibleDatatypes=[
+                dai.Node.DatatypeHierarchy(dai.DatatypeEnum.ImgFrame, True)
+            ]
+        )
+        self.annotation_output = self.createOutput(
+            possibleDatatypes=[
+                dai.Node.DatatypeHierarchy(dai.DatatypeEnum.ImgAnnotations, True)
+            ]
+        )
+
+    def build(
+        self,
+        disparity_frames: dai.Node.Output,
+        measured_depth: dai.Node.Output,
+    ) -> "ROIGridDisplay":
+        self.link_args(disparity_frames, measured_depth)
+        return self
+
+    def process(self, disparity: dai.ImgFrame, depth: dai.Buffer) -> None:
+        assert isinstance(depth, SpatialDistances)
+
+        annotations_builder = AnnotationHelper()
+        size = np.array([disparity.getWidth(), disparity.getHeight()] * 2)
+        rel_rois = depth.rois / size
+
+        for (rel_xmin, rel_ymin, rel_xmax, rel_ymax), z in zip(
+            rel_rois.tolist(), depth.spatials[:, 2].tolist()
+        ):
+            annotations_builder.draw_rectangle(
+                top_left=(rel_xmin, rel_ymin),
+                bottom_right=(rel_xmax, rel_ymax),
+                outline_color=(1, 1, 1, 1),
+                thickness=1,
+            )
+            annotations_builder.draw_text(
+                text=f"{z / 1000:.1f}" if not math.isnan(z) else "--",
+                position=(rel_xmin, rel_ymax),
+                color=(1, 1, 1, 1),
+                size=3,
+            )
+
+        annotations = annotations_builder.build(
+            disparity.getTimestamp(), disparity.getSequenceNum()
+        )
+        self.annotation_output.send(annotations)
+        self.passthrough.send(disparity)
@@ -43,6 +43,7 @@ with dai.Pipeline(device) as pipeline:
     stereoSGBM.inputs["monoLeft"].setMaxSize(2)
     stereoSGBM.inputs["monoRight"].setBlocking(False)
     stereoSGBM.inputs["monoRight"].setMaxSize(2)
+    stereoSGBM.setNumStrips(args.strips)
 
     stereo = pipeline.create(dai.node.StereoDepth).build(
         left=left, right=right, presetMode=dai.node.StereoDepth.PresetMode.FAST_DENSITY
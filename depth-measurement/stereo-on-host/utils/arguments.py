@@ -17,6 +17,15 @@ def initialize_argparser():
         type=str,
     )
 
+    parser.add_argument(
+        "-s",
+        "--strips",
+        help="Number of overlapping horizontal strips the host SGBM disparity is computed in on a thread pool. 1 computes the whole frame at once.",
+        required=False,
+        default=1,
+        type=int,
+    )
+
     args = parser.parse_args()
 
     return parser, args
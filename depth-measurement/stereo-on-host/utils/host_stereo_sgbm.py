@@ -1,24 +1,45 @@
 import cv2
 import numpy as np
 import depthai as dai
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+# Rows shared by neighbouring strips in strip-parallel mode, so the cost aggregation
+# of SGBM has context beyond the strip borders
+STRIP_OVERLAP = 32
 
 
 class StereoSGBM(dai.node.HostNode):
+    """Rectifies mono frames and computes their disparity on the host with cv2.StereoSGBM.
+
+    Rectification maps for the build resolution are computed once and applied with
+    `cv2.remap`. The rectified frames are written straight into reused buffers padded by
+    `max_disparity` zero columns, as OpenCV skips the first `max_disparity` columns.
+    With `setNumStrips(n)`, the disparity is computed on a thread pool in `n`
+    horizontal strips that overlap by STRIP_OVERLAP rows.
+    """
+
     def __init__(self):
         self.max_disparity = 96
         self.blockSize = 5
-        self.stereoProcessor = cv2.StereoSGBM_create(
-            minDisparity=1,
-            numDisparities=96,
-            blockSize=self.blockSize,
-            P1=80,
-            P2=800,
-            disp12MaxDiff=5,
-            mode=cv2.STEREO_SGBM_MODE_SGBM_3WAY,
-        )
+        self.stereoProcessor = self._create_processor()
         super().__init__()
 
+        # Fixed-point (map1, map2) remap tables of the left and right camera
+        self.left_maps: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self.right_maps: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._left_pad: Optional[np.ndarray] = None
+        self._right_pad: Optional[np.ndarray] = None
+        self._disparity: Optional[np.ndarray] = None
+        # Scales integer disparities to the 0..255 input of the colormap
+        self._colormap_lut = (np.arange(256) * (256.0 / self.max_disparity)).astype(
+            np.uint8
+        )
+
+        self._num_strips = 1
+        self._strip_processors = []
+        self._pool: Optional[ThreadPoolExecutor] = None
+
         self.disparity_out = self.createOutput(
             possibleDatatypes=[
                 dai.Node.DatatypeHierarchy(dai.DatatypeEnum.ImgFrame, True)
@@ -66,8 +87,39 @@ class StereoSGBM(dai.node.HostNode):
             calibObj, device, resolution
         )  # for left, right camera
 
+        self.left_maps, self.right_maps = self.count_rectification_maps(
+            self.H1, self.H2, resolution
+        )
+
         return self
 
+    def setNumStrips(self, num_strips: int) -> None:
+        """Computes the disparity in `num_strips` horizontal strips in parallel, 1 disables it."""
+        if num_strips < 1:
+            raise ValueError("Number of strips must be a positive integer.")
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        self._num_strips = num_strips
+        self._strip_processors = []
+        if num_strips > 1:
+            # StereoSGBM keeps internal buffers, every strip needs its own instance
+            self._strip_processors = [
+                self._create_processor() for _ in range(num_strips)
+            ]
+            self._pool = ThreadPoolExecutor(max_workers=num_strips)
+
+    def _create_processor(self) -> cv2.StereoSGBM:
+        return cv2.StereoSGBM_create(
+            minDisparity=1,
+            numDisparities=self.max_disparity,
+            blockSize=self.blockSize,
+            P1=80,
+            P2=800,
+            disp12MaxDiff=5,
+            mode=cv2.STEREO_SGBM_MODE_SGBM_3WAY,
+        )
+
     def process(self, monoLeft: dai.ImgFrame, monoRight: dai.ImgFrame) -> None:
         monoLeftFrame = monoLeft.getCvFrame()
         self.mono_left.send(
@@ -126,48 +178,69 @@ class StereoSGBM(dai.node.HostNode):
         focalLength = M_right[0][0]
         return focalLength
 
-    def rectification(self, left_img, right_img):
-        # warp right image
-        img_l = cv2.warpPerspective(
-            left_img,
-            self.H1,
-            left_img.shape[:2][::-1],
-            cv2.INTER_CUBIC + cv2.WARP_FILL_OUTLIERS + cv2.WARP_INVERSE_MAP,
-        )
+    def count_rectification_maps(
+        self, H_left: np.ndarray, H_right: np.ndarray, resolution: Tuple[int, int]
+    ):
+        """Remap tables that warp the left and right frame like warpPerspective with
+        H_left and H_right and WARP_INVERSE_MAP, i.e. sample the source at H * p.
 
-        img_r = cv2.warpPerspective(
-            right_img,
-            self.H2,
-            right_img.shape[:2][::-1],
-            cv2.INTER_CUBIC + cv2.WARP_FILL_OUTLIERS + cv2.WARP_INVERSE_MAP,
-        )
+        initUndistortRectifyMap samples the source at K * R^-1 * newK^-1 * p for every
+        output pixel p, which equals H * p for K = I, R = H^-1 and newK = I.
+        """
+        maps = []
+        for H in (H_left, H_right):
+            maps.append(
+                cv2.initUndistortRectifyMap(
+                    np.eye(3),
+                    None,
+                    np.linalg.inv(H),
+                    np.eye(3),
+                    tuple(resolution),
+                    cv2.CV_16SC2,
+                )
+            )
+        return tuple(maps)
+
+    def _get_padded_buffers(self, shape: Tuple[int, ...]):
+        pad_shape = (shape[0], shape[1] + self.max_disparity, *shape[2:])
+        if self._left_pad is None or self._left_pad.shape != pad_shape:
+            self._left_pad = np.zeros(pad_shape, dtype=np.uint8)
+            self._right_pad = np.zeros(pad_shape, dtype=np.uint8)
+            self._disparity = np.empty(pad_shape[:2], dtype=np.int16)
+        return self._left_pad, self._right_pad
+
+    def rectification(self, left_img, right_img, left_dst=None, right_dst=None):
+        img_l = cv2.remap(left_img, *self.left_maps, cv2.INTER_CUBIC, dst=left_dst)
+        img_r = cv2.remap(right_img, *self.right_maps, cv2.INTER_CUBIC, dst=right_dst)
         return img_l, img_r
 
     def create_disparity_map(self, left_img, right_img, is_rectify_enabled=True):
+        # opencv skips disparity calculation for the first max_disparity pixels,
+        # so the rectified frames are written next to max_disparity zero columns
+        left_img_rect_pad, right_img_rect_pad = self._get_padded_buffers(left_img.shape)
+        left_img_rect = left_img_rect_pad[:, self.max_disparity :]
+        right_img_rect = right_img_rect_pad[:, self.max_disparity :]
         if is_rectify_enabled:
-            left_img_rect, right_img_rect = self.rectification(
-                left_img, right_img
+            self.rectification(
+                left_img, right_img, left_img_rect, right_img_rect
             )  # Rectification using Homography
         else:
-            left_img_rect = left_img
-            right_img_rect = right_img
-
-        # opencv skips disparity calculation for the first max_disparity pixels
-        pad_img_shape = [*left_img.shape]
-        pad_img_shape[1] = self.max_disparity
-        pad_img = np.zeros(shape=pad_img_shape, dtype=np.uint8)
-        left_img_rect_pad = cv2.hconcat([pad_img, left_img_rect])
-        right_img_rect_pad = cv2.hconcat([pad_img, right_img_rect])
-        disparity = self.stereoProcessor.compute(left_img_rect_pad, right_img_rect_pad)
-        disparity = disparity[
-            0 : disparity.shape[0], self.max_disparity : disparity.shape[1]
-        ]
+            left_img_rect[:] = left_img
+            right_img_rect[:] = right_img
+
+        if self._num_strips > 1:
+            self._compute_strips(left_img_rect_pad, right_img_rect_pad)
+        else:
+            self.stereoProcessor.compute(
+                left_img_rect_pad, right_img_rect_pad, disparity=self._disparity
+            )
+        disparity = self._disparity[:, self.max_disparity :]
 
         # scale back to integer disparities, opencv has 4 subpixel bits
-        disparity_scaled = (disparity / 16.0).astype(np.uint8)
+        disparity = np.clip(disparity, 0, self.max_disparity * 16) >> 4
 
         disparity_colour_mapped = cv2.applyColorMap(
-            (disparity_scaled * (256.0 / self.max_disparity)).astype(np.uint8),
+            cv2.LUT(disparity.astype(np.uint8), self._colormap_lut),
             cv2.COLORMAP_JET,
         )
 
@@ -175,9 +248,8 @@ class StereoSGBM(dai.node.HostNode):
             self._create_img_frame(disparity_colour_mapped, dai.ImgFrame.Type.BGR888i)
         )
 
-        disparity = np.clip(disparity / 16, 0, self.max_disparity).astype(np.uint16)
         self.raw_disparity_out.send(
-            self._create_img_frame(disparity, dai.ImgFrame.Type.RAW16)
+            self._create_img_frame(disparity.astype(np.uint16), dai.ImgFrame.Type.RAW16)
         )
         self.rectified_left.send(
             self._create_img_frame(left_img_rect, dai.ImgFrame.Type.NV12)
@@ -186,6 +258,23 @@ class StereoSGBM(dai.node.HostNode):
             self._create_img_frame(right_img_rect, dai.ImgFrame.Type.NV12)
         )
 
+    def _compute_strips(self, left_pad: np.ndarray, right_pad: np.ndarray) -> None:
+        """Computes the disparity of overlapping horizontal strips on the thread pool."""
+        height = left_pad.shape[0]
+        bounds = np.linspace(0, height, self._num_strips + 1).astype(int)
+
+        def compute(index: int) -> None:
+            start, stop = bounds[index], bounds[index + 1]
+            top = max(start - STRIP_OVERLAP, 0)
+            bottom = min(stop + STRIP_OVERLAP, height)
+            strip = self._strip_processors[index].compute(
+                left_pad[top:bottom], right_pad[top:bottom]
+            )
+            self._disparity[start:stop] = strip[start - top : stop - top]
+
+        # list() waits for all strips and re-raises errors of the workers
+        list(self._pool.map(compute, range(self._num_strips)))
+
     def _create_img_frame(
         self, frame: np.ndarray, type: dai.ImgFrame.Type
     ) -> dai.ImgFrame:
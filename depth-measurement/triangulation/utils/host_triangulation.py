@@ -135,78 +135,67 @@ class Triangulation(dai.node.HostNode):
         keypoints_left_helper = AnnotationHelper()
         keypoint_rights_helper = AnnotationHelper()
         if nn_face_left.detections and nn_face_right.detections:
-            spatials = []
-            keypoints = zip(
-                nn_face_left.detections[0].keypoints,
-                nn_face_right.detections[0].keypoints,
+            size = np.array([x_dimension, y_dimension])
+            face_keypoints_left = self._keypoint_coords(nn_face_left.detections, size)
+            face_keypoints_right = self._keypoint_coords(nn_face_right.detections, size)
+            pairs = self._stereoInference.pair_faces(
+                face_keypoints_left, face_keypoints_right
             )
 
-            for i, (keypoint_left, keypoint_right) in enumerate(keypoints):
-                coords_left = (
-                    int(keypoint_left.x * x_dimension),
-                    int(keypoint_left.y * y_dimension),
-                )
-                coords_right = (
-                    int(keypoint_right.x * x_dimension),
-                    int(keypoint_right.y * y_dimension),
-                )
-
-                rel_coords_left = (
-                    coords_left[0] / x_dimension,
-                    coords_left[1] / y_dimension,
-                )
-                rel_coords_right = (
-                    coords_right[0] / x_dimension,
-                    coords_right[1] / y_dimension,
-                )
+            y = 0.05
+            y_delta = 0.02
+            for left_index, right_index in pairs:
+                coords_left = face_keypoints_left[left_index]
+                coords_right = face_keypoints_right[right_index]
 
-                # Visualize keypoints
-                keypoints_left_helper.draw_circle(
-                    center=rel_coords_left,
-                    radius=3 / x_dimension,
-                    outline_color=self._leftColor,
-                    thickness=1,
-                )
-                keypoint_rights_helper.draw_circle(
-                    center=rel_coords_right,
-                    radius=3 / x_dimension,
-                    outline_color=self._rightColor,
-                    thickness=1,
-                )
-                # Visualize disparity line
-                disparity_line_helper.draw_line(
-                    pt1=rel_coords_left,
-                    pt2=rel_coords_right,
-                    color=self._combinedColor,
-                    thickness=1,
-                )
-
-                # Calculate spatial data
-                disparity = self._stereoInference.calculate_distance(
+                # Calculate spatial data of all keypoints of the face at once
+                disparities = self._stereoInference.calculate_disparities(
                     coords_left, coords_right
                 )
-                depth = self._stereoInference.calculate_depth(disparity)
-                spatial = self._stereoInference.calc_spatials(coords_right, depth)
-                spatials.append(spatial)
-
-                if i == 0:
-                    strings = [
-                        "Disparity: {:.0f} pixels".format(disparity),
-                        "X: {:.2f} m".format(spatial[0] / 1000),
-                        "Y: {:.2f} m".format(spatial[1] / 1000),
-                        "Z: {:.2f} m".format(spatial[2] / 1000),
-                    ]
-                    y = 0.05
-                    y_delta = 0.02
-                    for s in strings:
-                        text_helper.draw_text(
-                            text=s,
-                            position=(0.05, y),
-                            color=(1.0, 1.0, 1.0, 1.0),
-                            background_color=(0.0, 0.0, 0.0, 0.7),
-                            size=4,
-                        )
-                        y += y_delta
+                spatials = self._stereoInference.triangulate(coords_left, coords_right)
+
+                rel_coords_left = (coords_left / size).tolist()
+                rel_coords_right = (coords_right / size).tolist()
+                for rel_left, rel_right in zip(rel_coords_left, rel_coords_right):
+                    # Visualize keypoints
+                    keypoints_left_helper.draw_circle(
+                        center=tuple(rel_left),
+                        radius=3 / x_dimension,
+                        outline_color=self._leftColor,
+                        thickness=1,
+                    )
+                    keypoint_rights_helper.draw_circle(
+                        center=tuple(rel_right),
+                        radius=3 / x_dimension,
+                        outline_color=self._rightColor,
+                        thickness=1,
+                    )
+                    # Visualize disparity line
+                    disparity_line_helper.draw_line(
+                        pt1=tuple(rel_left),
+                        pt2=tuple(rel_right),
+                        color=self._combinedColor,
+                        thickness=1,
+                    )
+
+                # Measurements of the first keypoint of every face
+                spatial = spatials[0]
+                strings = [
+                    "Disparity: {:.0f} pixels".format(disparities[0]),
+                    "X: {:.2f} m".format(spatial[0] / 1000),
+                    "Y: {:.2f} m".format(spatial[1] / 1000),
+                    "Z: {:.2f} m".format(spatial[2] / 1000),
+                ]
+                for s in strings:
+                    text_helper.draw_text(
+                        text=s,
+                        position=(0.05, y),
+                        color=(1.0, 1.0, 1.0, 1.0),
+                        background_color=(0.0, 0.0, 0.0, 0.7),
+                        size=4,
+                    )
+                    y += y_delta
+                y += y_delta
 
         keypoints_left_helper_msg = keypoints_left_helper.build(
             timestamp=face_left.getTimestamp(), sequence_num=face_left.getSequenceNum()
@@ -229,6 +218,14 @@ class Triangulation(dai.node.HostNode):
         )
         self.measurements_info.send(text_helper_msg)
 
+    def _keypoint_coords(self, detections, size: np.ndarray) -> np.ndarray:
+        """(N, K, 2) pixel coordinates of the K keypoints of N detections."""
+        keypoints = np.array(
+            [[(kp.x, kp.y) for kp in detection.keypoints] for detection in detections],
+            dtype=np.float64,
+        ).reshape(len(detections), -1, 2)
+        return (keypoints * size).astype(np.int64)
+
     def _create_output_frame(
         self, msg: dai.ImgFrame, frame: np.ndarray
     ) -> dai.ImgFrame:
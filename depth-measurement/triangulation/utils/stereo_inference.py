@@ -1,7 +1,14 @@
 import math
 import depthai as dai
 import numpy as np
-from typing import Tuple
+from scipy.optimize import linear_sum_assignment
+from typing import List, Tuple
+
+# Largest mean vertical offset (relative to the frame height) of the keypoints of a
+# face in the left and right view that are still paired
+MAX_VERTICAL_OFFSET = 0.1
+# Negative disparities (pixels) tolerated when pairing faces, for keypoint noise
+MIN_DISPARITY = -2
 
 
 class StereoInference:
@@ -15,6 +22,10 @@ class StereoInference:
 
         focalLength = self.get_focal_length_pixels(self.width, self.hfov)
         self.dispScaleFactor = baseline * focalLength
+        # tan of the angle per pixel offset from the image center, hfov is in degrees
+        self._tan_per_pixel = math.tan(math.radians(self.hfov) / 2.0) / (
+            self.width / 2.0
+        )
 
     def get_focal_length_pixels(self, pixel_width, hfov):
         return pixel_width * 0.5 / math.tan(hfov * 0.5 * math.pi / 180)
@@ -34,7 +45,7 @@ class StereoInference:
         return math.sqrt(x_delta**2 + y_delta**2)
 
     def calc_angle(self, offset):
-        return math.atan(math.tan(self.hfov / 2.0) * offset / (self.width / 2.0))
+        return math.atan(self._tan_per_pixel * offset)
 
     def calc_spatials(self, coords, depth):
         x, y = coords
@@ -48,3 +59,61 @@ class StereoInference:
         x = z * math.tan(angle_x)
         y = -z * math.tan(angle_y)
         return [x, y, z]
+
+    def calculate_disparities(
+        self, keypoints_left: np.ndarray, keypoints_right: np.ndarray
+    ) -> np.ndarray:
+        """Disparities (pixels) of the (N, 2) pixel coordinates of N keypoints seen in
+        the left and in the right view."""
+        keypoints_left = np.asarray(keypoints_left, dtype=np.float64).reshape(-1, 2)
+        keypoints_right = np.asarray(keypoints_right, dtype=np.float64).reshape(-1, 2)
+        return np.linalg.norm(keypoints_left - keypoints_right, axis=1)
+
+    def triangulate(
+        self, keypoints_left: np.ndarray, keypoints_right: np.ndarray
+    ) -> np.ndarray:
+        """Spatial coordinates (x, y, z) in mm of N keypoints, as an (N, 3) array.
+
+        Batched version of calculate_distance, calculate_depth and calc_spatials: takes
+        the (N, 2) pixel coordinates of the keypoints in the left and in the right view
+        and locates them at their right view coordinates. Keypoints without disparity
+        get depth 0.
+        """
+        disparities = self.calculate_disparities(keypoints_left, keypoints_right)
+        depths = np.zeros_like(disparities)
+        np.divide(self.dispScaleFactor, disparities, out=depths, where=disparities > 0)
+
+        keypoints_right = np.asarray(keypoints_right, dtype=np.float64).reshape(-1, 2)
+        offsets = keypoints_right - np.array([self.width / 2, self.heigth / 2])
+        tan_angles = offsets * self._tan_per_pixel
+        return np.stack(
+            [depths * tan_angles[:, 0], -depths * tan_angles[:, 1], depths], axis=1
+        )
+
+    def pair_faces(
+        self, keypoints_left: np.ndarray, keypoints_right: np.ndarray
+    ) -> List[Tuple[int, int]]:
+        """Pairs the faces detected in the left and in the right view.
+
+        Takes the (N, K, 2) and (M, K, 2) pixel coordinates of the K keypoints of every
+        face and returns (left index, right index) pairs. The cost of a pair is the mean
+        vertical offset of its keypoints, as the views are horizontally aligned, and
+        pairs are assigned to minimize the total cost. Pairs that are vertically too far
+        apart or have a negative disparity are rejected.
+        """
+        keypoints_left = np.asarray(keypoints_left, dtype=np.float64)
+        keypoints_right = np.asarray(keypoints_right, dtype=np.float64)
+        if not len(keypoints_left) or not len(keypoints_right):
+            return []
+
+        # (N, M, K, 2) offsets of all keypoints of all pairs
+        offsets = keypoints_left[:, None] - keypoints_right[None, :]
+        vertical = np.abs(offsets[..., 1]).mean(axis=2)
+        disparity = offsets[..., 0].mean(axis=2)
+
+        max_vertical = MAX_VERTICAL_OFFSET * self.heigth
+        invalid = (vertical > max_vertical) | (disparity < MIN_DISPARITY)
+        cost = np.where(invalid, max_vertical * 10, vertical)
+
+        rows, cols = linear_sum_assignment(cost)
+        return [(int(r), int(c)) for r, c in zip(rows, cols) if not invalid[r, c]]
@@ -7,6 +7,8 @@ from utils.arguments import initialize_argparser
 _, args = initialize_argparser()
 
 LR_CHECK = False  # Better handling for occlusions
+# Confidence threshold with region filtering, disparities scoring above it are invalidated
+REGION_CONFIDENCE_THRESHOLD = 200
 
 visualizer = dai.RemoteConnection(httpPort=8082)
 device = dai.Device(dai.DeviceInfo(args.device)) if args.device else dai.Device()
@@ -20,7 +22,9 @@ with dai.Pipeline(device) as pipeline:
     right_out = right.requestOutput(size=(640, 400), type=dai.ImgFrame.Type.NV12)
 
     stereo = pipeline.create(dai.node.StereoDepth).build(left=left_out, right=right_out)
-    stereo.initialConfig.setConfidenceThreshold(255)
+    stereo.initialConfig.setConfidenceThreshold(
+        REGION_CONFIDENCE_THRESHOLD if args.region_filtering else 255
+    )
     stereo.initialConfig.setMedianFilter(dai.StereoDepthConfig.MedianFilter.KERNEL_5x5)
     stereo.setRectifyEdgeFillColor(
         0
@@ -38,6 +42,7 @@ with dai.Pipeline(device) as pipeline:
         max_disparity=stereo.initialConfig.getMaxDisparity(),
         baseline=baseline,
     )
+    wls_filter.setRegionFiltering(args.region_filtering)
 
     disp_colored = pipeline.create(ApplyColormap).build(stereo.disparity)
     disp_colored.setMaxValue(int(stereo.initialConfig.getMaxDisparity()))
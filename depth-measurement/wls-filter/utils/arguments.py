@@ -17,6 +17,15 @@ def initialize_argparser():
         type=str,
     )
 
+    parser.add_argument(
+        "-r",
+        "--region_filtering",
+        help="Invalidate low-confidence disparities on the device and WLS-filter only the regions around them. Faster, but the rest of the disparity stays unfiltered.",
+        required=False,
+        default=False,
+        action="store_true",
+    )
+
     args = parser.parse_args()
 
     return parser, args
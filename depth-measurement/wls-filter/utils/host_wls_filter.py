@@ -2,15 +2,27 @@ import cv2
 import depthai as dai
 import numpy as np
 import math
-from typing import Tuple
+from typing import List, Optional, Tuple
 from depthai_nodes.utils import AnnotationHelper
 
+# Region-limited mode: the disparity is split into tiles of TILE_SIZE pixels, and only
+# tiles with more than MIN_INVALID_FRACTION of invalid (zero, low confidence)
+# disparities are filtered, together with a margin of one tile
+TILE_SIZE = 32
+MIN_INVALID_FRACTION = 0.02
+
 
 class Filter:
     def __init__(self, _lambda, _sigma) -> None:
         self._lambda = _lambda
         self._sigma = _sigma
         self.wlsFilter = cv2.ximgproc.createDisparityWLSFilterGeneric(False)
+        self._applied_params: Optional[Tuple[float, float]] = None
+
+        # Depth of every disparity level, disparities are 8 bit (no subpixel)
+        self._depth_lut: Optional[np.ndarray] = None
+        self._depth_scale_factor: Optional[float] = None
+        self._depth_frame: Optional[np.ndarray] = None
 
     def increase_lambda(self) -> None:
         if self._lambda < 255 * 100:
@@ -31,22 +43,80 @@ class Filter:
             self._sigma = round(self._sigma, 2)
 
     def filter(
-        self, disparity, right, depthScaleFactor
+        self,
+        disparity,
+        right,
+        depthScaleFactor,
+        regions: Optional[List[Tuple[int, int, int, int]]] = None,
     ) -> Tuple[np.ndarray, np.ndarray]:
+        """Filters the disparity and computes the depth from it.
+
+        If `regions` is given, only these (x, y, width, height) regions are filtered
+        and the rest of the disparity is kept. The returned depth frame is reused by
+        the next call.
+        """
+        self._push_params()
+        if regions is None:
+            filteredDisp = self.wlsFilter.filter(disparity, right)
+        else:
+            filteredDisp = disparity.copy()
+            for x, y, w, h in regions:
+                filteredDisp[y : y + h, x : x + w] = self.wlsFilter.filter(
+                    disparity[y : y + h, x : x + w], right[y : y + h, x : x + w]
+                )
+
+        if self._depth_frame is None or self._depth_frame.shape != filteredDisp.shape:
+            self._depth_frame = np.empty(filteredDisp.shape, dtype=np.uint16)
+        np.take(
+            self._get_depth_lut(depthScaleFactor), filteredDisp, out=self._depth_frame
+        )
+
+        return filteredDisp, self._depth_frame
+
+    def _push_params(self) -> None:
+        params = (self._lambda, self._sigma)
+        if params == self._applied_params:
+            return
         # https://github.com/opencv/opencv_contrib/blob/master/modules/ximgproc/include/opencv2/ximgproc/disparity_filter.hpp#L92
         self.wlsFilter.setLambda(self._lambda)
         # https://github.com/opencv/opencv_contrib/blob/master/modules/ximgproc/include/opencv2/ximgproc/disparity_filter.hpp#L99
         self.wlsFilter.setSigmaColor(self._sigma)
-        filteredDisp = self.wlsFilter.filter(disparity, right)
+        self._applied_params = params
 
-        # Compute depth from disparity (32 levels)
-        with np.errstate(divide="ignore"):  # Should be safe to ignore div by zero here
-            # raw depth values
-            depth = depthScaleFactor / filteredDisp
-        depth = np.nan_to_num(depth, nan=0.0, posinf=0.0, neginf=0.0)
-        depthFrame = depth.astype(np.uint16)
+    def _get_depth_lut(self, depthScaleFactor) -> np.ndarray:
+        if depthScaleFactor != self._depth_scale_factor:
+            # Compute depth from disparity (256 levels)
+            with np.errstate(divide="ignore"):  # disparity 0 has no depth
+                # raw depth values
+                depth = depthScaleFactor / np.arange(256, dtype=np.float64)
+            depth = np.nan_to_num(depth, nan=0.0, posinf=0.0, neginf=0.0)
+            self._depth_lut = depth.astype(np.uint16)
+            self._depth_scale_factor = depthScaleFactor
+        return self._depth_lut
 
-        return filteredDisp, depthFrame
+
+def low_confidence_regions(
+    disparity: np.ndarray,
+) -> List[Tuple[int, int, int, int]]:
+    """(x, y, width, height) regions around the tiles of the disparity with invalid
+    (zero) disparities, the areas where WLS filtering makes the largest difference."""
+    height, width = disparity.shape[:2]
+    rows, cols = -(-height // TILE_SIZE), -(-width // TILE_SIZE)
+    invalid = np.zeros((rows * TILE_SIZE, cols * TILE_SIZE), dtype=np.float32)
+    invalid[:height, :width] = disparity == 0
+    fraction = invalid.reshape(rows, TILE_SIZE, cols, TILE_SIZE).mean(axis=(1, 3))
+
+    tiles = (fraction > MIN_INVALID_FRACTION).astype(np.uint8)
+    tiles = cv2.dilate(tiles, np.ones((3, 3), dtype=np.uint8))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(tiles, connectivity=8)
+
+    regions = []
+    for x, y, w, h, _ in stats[1:count]:
+        x0, y0 = x * TILE_SIZE, y * TILE_SIZE
+        x1 = min((x + w) * TILE_SIZE, width)
+        y1 = min((y + h) * TILE_SIZE, height)
+        regions.append((int(x0), int(y0), int(x1 - x0), int(y1 - y0)))
+    return regions
 
 
 class WLSFilter(dai.node.HostNode):
@@ -56,6 +126,12 @@ class WLSFilter(dai.node.HostNode):
         self._baseline = 75  # mm
         self._disp_levels = 96
         self._fov = 71.86
+        self._region_filtering = False
+
+        self._focal_width: Optional[int] = None
+        self._focal: Optional[float] = None
+        self._disp_lut: Optional[np.ndarray] = None
+        self._color_frame: Optional[np.ndarray] = None
 
         self.depth_frame = self.createOutput(
             possibleDatatypes=[
@@ -82,30 +158,49 @@ class WLSFilter(dai.node.HostNode):
     ) -> "WLSFilter":
         self.link_args(disparity, rectified_right)
         self._disp_multiplier = 255 / max_disparity
+        self._disp_lut = (np.arange(256) * self._disp_multiplier).astype(np.uint8)
         self._baseline = baseline * 10  # mm
         return self
 
+    def setRegionFiltering(self, enabled: bool) -> None:
+        """Filters only the regions around low-confidence (invalid) disparities,
+        which is faster but leaves the rest of the disparity unfiltered."""
+        self._region_filtering = enabled
+
     def process(self, disparity: dai.ImgFrame, right: dai.ImgFrame) -> None:
         disparity_frame = disparity.getFrame()
         right_frame = right.getFrame()
-        focal = disparity_frame.shape[1] / (2.0 * math.tan(math.radians(self._fov / 2)))
-        depthScaleFactor = self._baseline * focal
+        width = disparity_frame.shape[1]
+        if width != self._focal_width:
+            self._focal = width / (2.0 * math.tan(math.radians(self._fov / 2)))
+            self._focal_width = width
+        depthScaleFactor = self._baseline * self._focal
+        regions = (
+            low_confidence_regions(disparity_frame) if self._region_filtering else None
+        )
         filteredDisp, depthFrame = self._filter_window.filter(
-            disparity_frame, right_frame, depthScaleFactor
+            disparity_frame, right_frame, depthScaleFactor, regions
         )
-        filteredDisp = (filteredDisp * self._disp_multiplier).astype(np.uint8)
 
+        # Both outputs only depend on the 8 bit filtered disparity, so they are
+        # looked up per disparity level instead of computed per pixel
+        color_shape = (*depthFrame.shape, 3)
+        if self._color_frame is None or self._color_frame.shape != color_shape:
+            self._color_frame = np.empty(color_shape, dtype=np.uint8)
         max_value = depthFrame.max()
         if max_value == 0:
-            color_arr = np.zeros(
-                (depthFrame.shape[0], depthFrame.shape[1], 3),
-                dtype=np.uint8,
-            )
+            self._color_frame[:] = 0
         else:
-            color_arr = cv2.cvtColor(
-                ((depthFrame / max_value) * 255).astype(np.uint8),
+            gray_lut = ((self._filter_window._depth_lut / max_value) * 255).astype(
+                np.uint8
+            )
+            cv2.cvtColor(
+                cv2.LUT(filteredDisp, gray_lut),
                 cv2.COLOR_GRAY2BGR,
+                dst=self._color_frame,
             )
+        color_arr = self._color_frame
+        filteredDisp = cv2.LUT(filteredDisp, self._disp_lut)
 
         depth_fr = dai.ImgFrame()
         depth_fr.setCvFrame(color_arr, dai.ImgFrame.Type.BGR888i)
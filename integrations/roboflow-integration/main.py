@@ -5,6 +5,7 @@ from depthai_nodes.node.parsing_neural_network import ParsingNeuralNetwork
 from utils.arguments import initialize_argparser
 from utils.roboflow_node import RoboflowNode
 from utils.roboflow_uploader import RoboflowUploader
+from utils.upload_transport import RoboflowTransport
 
 _, args = initialize_argparser()
 
@@ -40,9 +41,15 @@ with dai.Pipeline(device) as pipeline:
         input_node, nn_archive, fps=args.fps_limit
     )
 
-    uploader = RoboflowUploader(
+    transport = RoboflowTransport(
         api_key=args.api_key, workspace_name=args.workspace, dataset_name=args.dataset
     )
+    uploader = RoboflowUploader(
+        transport,
+        spool_dir=args.spool_dir,
+        num_workers=args.upload_workers,
+        max_pending=args.max_pending,
+    )
 
     roboflow = pipeline.create(RoboflowNode).build(
         preview=nn_with_parser.passthrough,
@@ -69,3 +76,6 @@ with dai.Pipeline(device) as pipeline:
             break
         else:
             roboflow.handle_key(key)
+
+# Unfinished uploads stay in the spool directory and are resumed on the next run
+uploader.close(timeout=5.0)
@@ -87,6 +87,30 @@ def initialize_argparser():
         type=range_limited_float_type(0, 1),
     )
 
+    parser.add_argument(
+        "--spool-dir",
+        help="Directory where frames are kept until they are uploaded. Pending uploads are resumed on restart.",
+        required=False,
+        default="roboflow_spool",
+        type=str,
+    )
+
+    parser.add_argument(
+        "--upload-workers",
+        help="Number of concurrent uploads",
+        required=False,
+        default=4,
+        type=int,
+    )
+
+    parser.add_argument(
+        "--max-pending",
+        help="Maximum number of frames waiting for upload. New frames are skipped while the queue is full.",
+        required=False,
+        default=1000,
+        type=int,
+    )
+
     args = parser.parse_args()
 
     return parser, args
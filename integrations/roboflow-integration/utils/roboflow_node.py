@@ -1,5 +1,4 @@
 import time
-from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Tuple
 
 import depthai as dai
@@ -11,9 +10,6 @@ from utils.roboflow_uploader import RoboflowUploader
 class RoboflowNode(dai.node.HostNode):
     def __init__(self) -> None:
         super().__init__()
-        # Executor to handle uploads asynchronously
-        # For real-time uploads at ~10Hz we spawn 40 threads
-        self.executor = ThreadPoolExecutor(max_workers=40)
         self.last_upload_time = time.monotonic()
         self.current_dets: Optional[dai.ImgDetections] = None
         self.current_frame: Optional[np.ndarray] = None
@@ -109,5 +105,5 @@ class RoboflowNode(dai.node.HostNode):
         labels: List[str],
         bboxes: List[Tuple[int, int, int, int]],
     ):
-        future = self.executor.submit(self.uploader.upload, frame, labels, bboxes)
-        future.add_done_callback(lambda _: print("Upload finished!"))
+        # Queued on disk and uploaded by the uploader's workers
+        self.uploader.upload(frame, labels, bboxes)
@@ -1,35 +1,147 @@
-import tempfile
-from typing import List, Tuple
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Tuple
 
 import cv2
 import numpy as np
-import roboflow
+
+from utils.upload_spool import UploadSpool
+from utils.upload_transport import UploadTransport
+
+NUM_UPLOAD_WORKERS = 4
+MAX_PENDING_UPLOADS = 1000  # frames kept in the spool directory
+MAX_UPLOAD_ATTEMPTS = 8  # failed uploads are moved aside after this many attempts
+BACKOFF_INITIAL = 1.0  # in seconds, pause of all uploads after a failed upload
+BACKOFF_MAX = 60.0  # in seconds
+DEDUPE_DISTANCE = 4  # frames within this Hamming distance of a recent frame are skipped
+RECENT_HASHES = 64  # number of recent frames checked for duplicates
+
+
+def perceptual_hash(frame: np.ndarray) -> int:
+    """64-bit difference hash (dHash) of a BGR frame.
+
+    Near-identical frames have hashes with a small Hamming distance.
+    """
+    small = cv2.resize(frame, (9, 8), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+    bits = gray[:, 1:] > gray[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
 
 
 class RoboflowUploader:
+    """Queues annotated frames for upload and uploads them in the background.
+
+    Frames are JPEG encoded in memory and stored with their VOC annotation in an
+    `UploadSpool` directory, so pending uploads survive restarts and memory use does
+    not grow with the backlog. Frames nearly identical to a recently queued frame are
+    skipped. `num_workers` threads upload the spooled frames through `transport`. A
+    failed upload pauses all workers, for twice as long after every further failure
+    and up to BACKOFF_MAX, until an upload succeeds.
+    """
+
     def __init__(
-        self, workspace_name: str, dataset_name: str, api_key: str
-    ) -> "RoboflowUploader":
-        rf = roboflow.Roboflow(api_key=api_key)
-        self.project = rf.workspace(workspace_name).project(dataset_name)
+        self,
+        transport: UploadTransport,
+        spool_dir: str,
+        num_workers: int = NUM_UPLOAD_WORKERS,
+        max_pending: int = MAX_PENDING_UPLOADS,
+        dedupe_distance: int = DEDUPE_DISTANCE,
+    ) -> None:
+        self.transport = transport
+        self.spool = UploadSpool(spool_dir, max_pending)
+        self.dedupe_distance = dedupe_distance
+        self._recent_hashes = deque(maxlen=RECENT_HASHES)
+
+        if len(self.spool):
+            print(f"Resuming {len(self.spool)} pending uploads from {spool_dir}")
+
+        self._backoff_lock = threading.Lock()
+        self._backoff_delay = 0.0
+        self._backoff_until = 0.0
+
+        self._stop = threading.Event()
+        self._workers = [
+            threading.Thread(target=self._upload_loop, daemon=True)
+            for _ in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
 
     def upload(
         self,
         frame: np.ndarray,
         class_names: List[str],
         bboxes: List[Tuple[int, int, int, int]],
-    ):
-        img_file = tempfile.NamedTemporaryFile(suffix=".jpg")
-        cv2.imwrite(img_file.name, frame)
+    ) -> Optional[str]:
+        """Queues a frame for upload, returns its spool name or None if it was skipped."""
+        frame_hash = perceptual_hash(frame)
+        if any(
+            bin(frame_hash ^ recent).count("1") <= self.dedupe_distance
+            for recent in self._recent_hashes
+        ):
+            print("Skipping upload of a frame nearly identical to a recent one.")
+            return None
+
+        success, image = cv2.imencode(".jpg", frame)
+        if not success:
+            print("Failed to encode the frame for upload.")
+            return None
 
         annotation = make_voc_annotations(
             class_names, bboxes, frame.shape[1], frame.shape[0]
         )
-        ann_file = tempfile.NamedTemporaryFile(suffix=".xml", delete=False)
-        with open(ann_file.name, "w") as f:
-            f.write(annotation)
-
-        self.project.upload(image_path=img_file.name, annotation_path=ann_file.name)
+        name = self.spool.put(image.tobytes(), annotation)
+        if name is None:
+            print(f"Upload queue is full ({self.spool.max_items} frames), skipping.")
+            return None
+
+        self._recent_hashes.append(frame_hash)
+        return name
+
+    def _wait_for_backoff(self) -> None:
+        while not self._stop.is_set():
+            with self._backoff_lock:
+                remaining = self._backoff_until - time.monotonic()
+            if remaining <= 0:
+                return
+            self._stop.wait(remaining)
+
+    def _back_off(self) -> None:
+        with self._backoff_lock:
+            now = time.monotonic()
+            # Uploads failing together during one pause only extend it once
+            if now >= self._backoff_until:
+                self._backoff_delay = min(
+                    max(2 * self._backoff_delay, BACKOFF_INITIAL), BACKOFF_MAX
+                )
+                self._backoff_until = now + self._backoff_delay
+
+    def _upload_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wait_for_backoff()
+            name = self.spool.get(timeout=0.5)
+            if name is None:
+                continue
+
+            try:
+                self.transport.upload(*self.spool.paths(name))
+            except Exception as e:
+                if not self.spool.retry(name, MAX_UPLOAD_ATTEMPTS):
+                    print(f"Giving up on upload {name}: {e}")
+                self._back_off()
+                continue
+
+            self.spool.done(name)
+            with self._backoff_lock:
+                self._backoff_delay = 0.0
+            print("Upload finished!")
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stops the upload workers, pending uploads stay in the spool."""
+        self._stop.set()
+        for worker in self._workers:
+            worker.join(timeout)
 
 
 def make_voc_annotations(
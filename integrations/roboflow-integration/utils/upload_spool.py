@@ -0,0 +1,117 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+IMAGE_SUFFIX = ".jpg"
+ANNOTATION_SUFFIX = ".xml"
+TMP_SUFFIX = ".tmp"
+
+
+class UploadSpool:
+    """Durable FIFO queue of pending uploads, stored in a directory.
+
+    Every item is an image and its annotation, stored as `<name>.jpg` and `<name>.xml`.
+    Both files are written to temporary files first and renamed into place, the image
+    last, so an item exists only once it is complete. Items left in the directory by a
+    previous run are queued again on start. Only item names are kept in memory, and at
+    most `max_items` items are pending at a time.
+    """
+
+    def __init__(self, directory: str, max_items: int) -> None:
+        self.directory = Path(directory)
+        self.failed_directory = self.directory / "failed"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_items = max_items
+
+        # Remove leftovers of writes interrupted by a restart
+        for path in self.directory.glob(f"*{TMP_SUFFIX}"):
+            path.unlink()
+        for path in self.directory.glob(f"*{ANNOTATION_SUFFIX}"):
+            if not path.with_suffix(IMAGE_SUFFIX).exists():
+                path.unlink()
+
+        self._pending = deque(
+            sorted(path.stem for path in self.directory.glob(f"*{IMAGE_SUFFIX}"))
+        )
+        self._in_flight = set()
+        self._attempts: Dict[str, int] = {}
+        self._condition = threading.Condition()
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._pending) + len(self._in_flight)
+
+    def paths(self, name: str) -> Tuple[str, str]:
+        """Image and annotation paths of an item."""
+        path = self.directory / name
+        return (
+            str(path.with_suffix(IMAGE_SUFFIX)),
+            str(path.with_suffix(ANNOTATION_SUFFIX)),
+        )
+
+    def _write(self, path: str, data: bytes) -> None:
+        tmp_path = path + TMP_SUFFIX
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put(self, image: bytes, annotation: str) -> Optional[str]:
+        """Stores an item, returns its name or None if the spool is full."""
+        if len(self) >= self.max_items:
+            return None
+
+        # Names sort in the order items were added, also across restarts
+        name = f"{time.time_ns():020d}-{next(self._counter) % 1000000:06d}"
+        image_path, annotation_path = self.paths(name)
+        self._write(annotation_path, annotation.encode())
+        self._write(image_path, image)
+
+        with self._condition:
+            self._pending.append(name)
+            self._condition.notify()
+        return name
+
+    def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Takes the oldest pending item, waiting up to `timeout` seconds for one."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._pending, timeout):
+                return None
+            name = self._pending.popleft()
+            self._in_flight.add(name)
+            return name
+
+    def done(self, name: str) -> None:
+        """Removes an uploaded item."""
+        for path in self.paths(name):
+            Path(path).unlink(missing_ok=True)
+        with self._condition:
+            self._in_flight.discard(name)
+            self._attempts.pop(name, None)
+
+    def retry(self, name: str, max_attempts: int) -> bool:
+        """Queues an item that failed to upload again, at the front of the queue.
+
+        After `max_attempts` failed attempts the item is moved to the `failed`
+        subdirectory instead and False is returned.
+        """
+        with self._condition:
+            attempts = self._attempts.get(name, 0) + 1
+            if attempts < max_attempts:
+                self._attempts[name] = attempts
+                self._in_flight.discard(name)
+                self._pending.appendleft(name)
+                self._condition.notify()
+                return True
+
+        self.failed_directory.mkdir(exist_ok=True)
+        for path in self.paths(name):
+            os.replace(path, self.failed_directory / Path(path).name)
+        with self._condition:
+            self._in_flight.discard(name)
+            self._attempts.pop(name, None)
+        return False
@@ -0,0 +1,49 @@
+import shutil
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import roboflow
+
+
+class UploadTransport(ABC):
+    """Sends one spooled upload (a JPEG image and its VOC XML annotation) to its destination.
+
+    `upload` is called from several worker threads at once and must raise on failure, so
+    the upload is retried later.
+    """
+
+    @abstractmethod
+    def upload(self, image_path: str, annotation_path: str) -> None:
+        pass
+
+
+class RoboflowTransport(UploadTransport):
+    """Uploads to a Roboflow dataset."""
+
+    def __init__(self, workspace_name: str, dataset_name: str, api_key: str) -> None:
+        rf = roboflow.Roboflow(api_key=api_key)
+        self.project = rf.workspace(workspace_name).project(dataset_name)
+
+    def upload(self, image_path: str, annotation_path: str) -> None:
+        # Project.upload only prints errors, single_upload returns them
+        result = self.project.single_upload(
+            image_path=image_path, annotation_path=annotation_path
+        )
+        for part in ("image", "annotation"):
+            response = result.get(part)
+            if isinstance(response, dict) and "error" in response:
+                raise RuntimeError(
+                    f"Roboflow {part} upload failed: {response['error']}"
+                )
+
+
+class DirectoryTransport(UploadTransport):
+    """Local stand-in for Roboflow that copies uploads into a directory."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def upload(self, image_path: str, annotation_path: str) -> None:
+        shutil.copy(annotation_path, self.directory)
+        shutil.copy(image_path, self.directory)
@@ -1,9 +1,67 @@
+from collections import deque
+from functools import lru_cache
+from typing import Optional
+
 import cv2
 import depthai as dai
 import numpy as np
 
+BLUR_KERNEL = 80  # box blur size in frame pixels
+BLUR_DOWNSCALE = 8  # ROIs are blurred at 1/BLUR_DOWNSCALE of their resolution
+MAX_PENDING_FRAMES = 30  # frames kept while waiting for their detections
+
+
+@lru_cache(maxsize=256)
+def ellipse_mask(width: int, height: int) -> np.ndarray:
+    """Mask of the ellipse inscribed in a ROI of the given size, cached by size."""
+    mask = np.zeros((height, width), np.uint8)
+    polygon = cv2.ellipse2Poly(
+        (int(width / 2), int(height / 2)),
+        (int(width / 2), int(height / 2)),
+        0,
+        0,
+        360,
+        delta=1,
+    )
+    cv2.fillConvexPoly(mask, polygon, 255)
+    mask.flags.writeable = False
+    return mask
+
+
+def blur_roi(roi: np.ndarray, rounded: bool = False) -> None:
+    """Blurs a ROI of a frame in place.
+
+    The ROI is downscaled, box blurred with a kernel of BLUR_KERNEL / BLUR_DOWNSCALE and
+    upscaled back, which approximates a BLUR_KERNEL box blur at a fraction of the cost.
+    With `rounded`, only the ellipse inscribed in the ROI is replaced.
+    """
+    height, width = roi.shape[:2]
+    if width == 0 or height == 0:
+        return
+
+    small_size = (
+        max(width // BLUR_DOWNSCALE, 1),
+        max(height // BLUR_DOWNSCALE, 1),
+    )
+    kernel = max(BLUR_KERNEL // BLUR_DOWNSCALE, 1)
+    small = cv2.resize(roi, small_size, interpolation=cv2.INTER_AREA)
+    small = cv2.blur(small, (kernel, kernel))
+    blurred = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+    if rounded:
+        cv2.copyTo(blurred, ellipse_mask(width, height), roi)
+    else:
+        roi[...] = blurred
+
 
 class BlurBboxes(dai.node.ThreadedHostNode):
+    """Blurs the detected regions of frames.
+
+    Detections are matched to their frame by sequence number. Frames wait in a queue of
+    at most MAX_PENDING_FRAMES until their detections arrive, frames without detections
+    are dropped and detections whose frame was already dropped are skipped.
+    """
+
     def __init__(self) -> None:
         super().__init__()
 
@@ -13,56 +71,46 @@ class BlurBboxes(dai.node.ThreadedHostNode):
 
         self.out = self.createOutput()
 
+        self._pending_frames = deque(maxlen=MAX_PENDING_FRAMES)
+
+    def _matching_frame(self, sequence_num: int) -> Optional[dai.ImgFrame]:
+        """Returns the frame with `sequence_num`, or None if it was dropped."""
+        while self.isRunning():
+            while self._pending_frames:
+                frame = self._pending_frames[0]
+                if frame.getSequenceNum() > sequence_num:
+                    return None
+                self._pending_frames.popleft()
+                if frame.getSequenceNum() == sequence_num:
+                    return frame
+            self._pending_frames.append(self.input_frame.get())
+        return None
+
     def run(self) -> None:
         while self.isRunning():
-            frame = self.input_frame.get()
+            detections_msg = self.input_detections.get()
+            frame = self._matching_frame(detections_msg.getSequenceNum())
+            if frame is None:
+                continue
+
             frame_copy = frame.getCvFrame()
-            detections = self.input_detections.get().detections
 
             h, w = frame_copy.shape[:2]
-            for detection in detections:
-                rect: dai.RotatedRect = detection.rotated_rect
-                rect = rect.denormalize(w, h)
-                detection = rect.getOuterRect()
-                bbox = [int(d) for d in detection]
-                bbox[0] = np.clip(bbox[0], 0, w)
-                bbox[1] = np.clip(bbox[1], 0, h)
-                bbox[2] = np.clip(bbox[2], 0, w)
-                bbox[3] = np.clip(bbox[3], 0, h)
-
-                roi = frame_copy[bbox[1] : bbox[3], bbox[0] : bbox[2]]
-
-                roi_width = bbox[2] - bbox[0]
-                roi_height = bbox[3] - bbox[1]
-
-                if self.rounded_blur:
-                    mask = np.zeros((roi_height, roi_width), np.uint8)
-                    polygon = cv2.ellipse2Poly(
-                        (int(roi_width / 2), int(roi_height / 2)),
-                        (int(roi_width / 2), int(roi_height / 2)),
-                        0,
-                        0,
-                        360,
-                        delta=1,
-                    )
-                    cv2.fillConvexPoly(mask, polygon, 255)
-                else:
-                    mask = np.full((roi_height, roi_width), 255, np.uint8)
-
-                blurred_roi = cv2.blur(roi, (80, 80))
-
-                blurred_ellipse = cv2.bitwise_and(blurred_roi, blurred_roi, mask=mask)
-                inverse_mask = cv2.bitwise_not(mask)
-                original_background = cv2.bitwise_and(roi, roi, mask=inverse_mask)
-                combined = cv2.add(blurred_ellipse, original_background)
-
-                frame_copy[bbox[1] : bbox[3], bbox[0] : bbox[2]] = combined
-
-            ts = frame.getTimestamp()
-            frame_type = frame.getType()
+            detections = detections_msg.detections
+            if detections:
+                bboxes = np.array(
+                    [
+                        detection.rotated_rect.denormalize(w, h).getOuterRect()
+                        for detection in detections
+                    ]
+                )
+                bboxes = np.clip(bboxes.astype(int), 0, [w, h, w, h]).tolist()
+                for x1, y1, x2, y2 in bboxes:
+                    blur_roi(frame_copy[y1:y2, x1:x2], self.rounded_blur)
+
             img = dai.ImgFrame()
-            img.setCvFrame(frame_copy, frame_type)
-            img.setTimestamp(ts)
+            img.setCvFrame(frame_copy, frame.getType())
+            img.setTimestamp(frame.getTimestamp())
             img.setSequenceNum(frame.getSequenceNum())
 
             self.out.send(img)
@@ -1,17 +1,17 @@
 from typing import List
-from collections import deque
 import depthai as dai
+import numpy as np
 from depthai_nodes.utils import AnnotationHelper
 from depthai_nodes import ImgDetectionsExtended, Keypoints
 
 from utils.face_landmarks import determine_fatigue
+from utils.face_tracker import FaceTracker
 
 
 class AnnotationNode(dai.node.HostNode):
     def __init__(self) -> None:
         super().__init__()
-        self._closed_eye_duration = deque(maxlen=30)
-        self._head_tilted_duration = deque(maxlen=30)
+        self._tracker = FaceTracker()
 
     def build(self, gather_data_msg) -> "AnnotationNode":
         self.link_args(gather_data_msg)
@@ -29,29 +29,30 @@ class AnnotationNode(dai.node.HostNode):
 
         annotations = AnnotationHelper()
 
-        for detection, landmarks in zip(detections_msg.detections, landmarks_msg_list):
-            pitch, eyes_closed = determine_fatigue((src_h, src_w), landmarks)
-
-            self._head_tilted_duration.append(pitch)
-            self._closed_eye_duration.append(eyes_closed)
+        # Every face keeps its own fatigue history
+        boxes = np.array(
+            [
+                detection.rotated_rect.getOuterRect()
+                for detection in detections_msg.detections
+            ]
+        )
+        tracks = self._tracker.update(boxes)
 
-            percent_closed_eyes = sum(self._closed_eye_duration) / len(
-                self._closed_eye_duration
-            )
-            percent_tilted = sum(self._head_tilted_duration) / len(
-                self._head_tilted_duration
-            )
+        for track, landmarks in zip(tracks, landmarks_msg_list):
+            pitch, eyes_closed = determine_fatigue((src_h, src_w), landmarks)
+            track.update(pitch, eyes_closed)
 
-            if percent_tilted >= 0.75:
+            x_min, y_min = np.clip(track.box[:2], 0.0, 1.0)
+            if track.percent_tilted >= 0.75:
                 annotations.draw_text(
                     text="Head Tilted!",
-                    position=(0.1, 0.1),
+                    position=(x_min, max(y_min - 0.1, 0.0)),
                 )
 
-            if percent_closed_eyes >= 0.75:
+            if track.percent_closed_eyes >= 0.75:
                 annotations.draw_text(
                     text="Eyes Closed!",
-                    position=(0.1, 0.2),
+                    position=(x_min, max(y_min - 0.05, 0.0)),
                 )
 
         annotations_msg = annotations.build(
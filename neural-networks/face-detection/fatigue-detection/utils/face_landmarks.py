@@ -1,26 +1,57 @@
+from functools import lru_cache
+from itertools import chain
 from typing import Tuple
 import cv2
 import math
 import numpy as np
 from depthai_nodes import Keypoints
 
+LEFT_EYE_INDICES = [33, 160, 158, 133, 144, 153]
+RIGHT_EYE_INDICES = [263, 387, 385, 362, 373, 380]
+POSE_INDICES = [199, 4, 33, 263, 61, 291]
+# Landmarks used by determine_fatigue, in the order above
+LANDMARK_INDICES = LEFT_EYE_INDICES + RIGHT_EYE_INDICES + POSE_INDICES
+
+# 3D model points corresponding to the POSE_INDICES landmarks.
+MODEL_POINTS = np.array(
+    [
+        (0.0, -7.9422, 5.1812),  # Chin
+        (0.0, -0.4632, 7.5866),  # Nose tip
+        (-4.4459, 2.6640, 3.1734),  # Left eye corner
+        (4.4459, 2.6640, 3.1734),  # Right eye corner
+        (-2.4562, -4.3426, 4.2839),  # Left mouth corner
+        (2.4562, -4.3426, 4.2839),  # Right mouth corner
+    ],
+    dtype="double",
+)
+
+# Assuming no lens distortion
+DIST_COEFFS = np.zeros((4, 1))
+
+
+def landmarks_to_array(
+    shape: Tuple[int, int], face_keypoints: Keypoints, indices=LANDMARK_INDICES
+) -> np.ndarray:
+    """Pixel coordinates of the selected landmarks as an (N, 2) int array."""
+    h, w = shape
+    keypoints = face_keypoints.keypoints
+    coordinates = np.fromiter(
+        chain.from_iterable((keypoints[i].x, keypoints[i].y) for i in indices),
+        dtype=np.float64,
+        count=2 * len(indices),
+    ).reshape(-1, 2)
+    coordinates *= (w, h)
+    return coordinates.astype(int)
+
 
 def determine_fatigue(
     shape: Tuple[int, int], face_keypoints: Keypoints, pitch_angle: int = 20
 ):
-    h, w = shape  # frame.shape[:2]
-    face_points_2d = np.array(
-        [[int(kp.x * w), int(kp.y * h)] for kp in face_keypoints.keypoints]
-    )
-
-    left_eye_idx = [33, 160, 158, 133, 144, 153]
-    right_eye_idx = [263, 387, 385, 362, 373, 380]
+    face_points_2d = landmarks_to_array(shape, face_keypoints)
 
-    left_eye = face_points_2d[left_eye_idx]
-    right_eye = face_points_2d[right_eye_idx]
-
-    pose_indices = [199, 4, 33, 263, 61, 291]
-    image_points = face_points_2d[pose_indices].astype("double")
+    left_eye = face_points_2d[:6]
+    right_eye = face_points_2d[6:12]
+    image_points = face_points_2d[12:].astype("double")
 
     success, rotation_vector, translation_vector, camera_matrix, dist_coeffs = (
         get_pose_estimation(shape, image_points)
@@ -47,29 +78,23 @@ def calc_eye_aspect_ratio(eye_points):
     return (A + B) / (2.0 * C)
 
 
-def get_pose_estimation(shape, image_points):
-    # 3D model points corresponding to the landmarks above.
-    model_points = np.array(
-        [
-            (0.0, -7.9422, 5.1812),  # Chin
-            (0.0, -0.4632, 7.5866),  # Nose tip
-            (-4.4459, 2.6640, 3.1734),  # Left eye corner
-            (4.4459, 2.6640, 3.1734),  # Right eye corner
-            (-2.4562, -4.3426, 4.2839),  # Left mouth corner
-            (2.4562, -4.3426, 4.2839),  # Right mouth corner
-        ],
-        dtype="double",
-    )
-
+@lru_cache(maxsize=8)
+def get_camera_matrix(shape: Tuple[int, int]) -> np.ndarray:
+    """Approximate camera matrix of a frame of the given (height, width), cached per resolution."""
     focal_length = shape[1]
     center = (shape[1] / 2, shape[0] / 2)
     camera_matrix = np.array(
         [[focal_length, 0, center[0]], [0, focal_length, center[1]], [0, 0, 1]],
         dtype="double",
     )
+    camera_matrix.flags.writeable = False
+    return camera_matrix
 
-    # Assuming no lens distortion
-    dist_coeffs = np.zeros((4, 1))
+
+def get_pose_estimation(shape, image_points):
+    model_points = MODEL_POINTS
+    camera_matrix = get_camera_matrix(tuple(shape))
+    dist_coeffs = DIST_COEFFS
 
     # Solve for pose
     success, rotation_vector, translation_vector = cv2.solvePnP(
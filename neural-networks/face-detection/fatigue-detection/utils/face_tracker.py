@@ -0,0 +1,104 @@
+from collections import deque
+from typing import List
+
+import numpy as np
+
+IOU_THRESHOLD = 0.3  # minimum overlap of a face with its box in the previous frame
+MAX_MISSED_FRAMES = 10  # frames a face can be missing before its state is dropped
+HISTORY_LENGTH = 30  # frames of fatigue history kept per face
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """IoU matrix of shape (len(boxes_a), len(boxes_b)) for boxes in
+    (x_min, y_min, x_max, y_max) format."""
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+
+    w = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2]) - np.maximum(
+        boxes_a[:, None, 0], boxes_b[None, :, 0]
+    )
+    h = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3]) - np.maximum(
+        boxes_a[:, None, 1], boxes_b[None, :, 1]
+    )
+    inter = np.maximum(w, 0.0) * np.maximum(h, 0.0)
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-9)
+
+
+class FaceTrack:
+    """Fatigue history of one face."""
+
+    def __init__(self, track_id: int, box: np.ndarray) -> None:
+        self.id = track_id
+        self.box = box
+        self.missed = 0
+        self.closed_eye_duration = deque(maxlen=HISTORY_LENGTH)
+        self.head_tilted_duration = deque(maxlen=HISTORY_LENGTH)
+
+    def update(self, head_tilted: bool, eyes_closed: bool) -> None:
+        self.head_tilted_duration.append(head_tilted)
+        self.closed_eye_duration.append(eyes_closed)
+
+    @property
+    def percent_tilted(self) -> float:
+        return sum(self.head_tilted_duration) / max(len(self.head_tilted_duration), 1)
+
+    @property
+    def percent_closed_eyes(self) -> float:
+        return sum(self.closed_eye_duration) / max(len(self.closed_eye_duration), 1)
+
+
+class FaceTracker:
+    """Assigns face detections to tracks by their overlap with the previous frame.
+
+    Detections are matched greedily to the track with the highest IoU above
+    `iou_threshold`. Unmatched detections start new tracks, tracks that stay
+    unmatched for more than `max_missed` frames are dropped.
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = IOU_THRESHOLD,
+        max_missed: int = MAX_MISSED_FRAMES,
+    ) -> None:
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks: List[FaceTrack] = []
+        self._next_id = 0
+
+    def update(self, boxes: np.ndarray) -> List[FaceTrack]:
+        """Returns the track of each of the (N, 4) `boxes`, in order."""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        assigned: List[FaceTrack] = [None] * len(boxes)
+        matched = set()
+
+        if self.tracks and len(boxes):
+            track_boxes = np.array([track.box for track in self.tracks])
+            iou = box_iou(boxes, track_boxes)
+            # Best pairs first, each detection and track matched at most once
+            det_indices, track_indices = np.unravel_index(
+                np.argsort(-iou, axis=None), iou.shape
+            )
+            for det_idx, track_idx in zip(det_indices.tolist(), track_indices.tolist()):
+                if iou[det_idx, track_idx] < self.iou_threshold:
+                    break
+                if assigned[det_idx] is not None or track_idx in matched:
+                    continue
+                track = self.tracks[track_idx]
+                track.box = boxes[det_idx]
+                assigned[det_idx] = track
+                matched.add(track_idx)
+
+        for track_idx, track in enumerate(self.tracks):
+            track.missed = 0 if track_idx in matched else track.missed + 1
+        self.tracks = [
+            track for track in self.tracks if track.missed <= self.max_missed
+        ]
+
+        for det_idx, box in enumerate(boxes):
+            if assigned[det_idx] is None:
+                assigned[det_idx] = FaceTrack(self._next_id, box)
+                self._next_id += 1
+                self.tracks.append(assigned[det_idx])
+
+        return assigned
@@ -1,4 +1,5 @@
 import depthai as dai
+import numpy as np
 from utils.measure_object_distance import ObjectDistances
 from datetime import timedelta
 from typing import List
@@ -33,20 +34,15 @@ class ShowAlert(dai.node.HostNode):
 
     def process(self, distances: dai.Buffer):
         assert isinstance(distances, ObjectDistances)
-        found_close_dets = False
-        for distance in distances.distances:
-            if (
-                (
-                    distance.detection1.label == self.palm_label
-                    and distance.detection2.label in self.dangerous_objects
-                )
-                or (
-                    distance.detection2.label == self.palm_label
-                    and distance.detection1.label in self.dangerous_objects
-                )
-            ) and distance.distance < DISTANCE_THRESHOLD:
-                found_close_dets = True
-                break
+        labels = distances.labels[distances.pairs]
+        is_palm = labels == self.palm_label
+        is_dangerous = np.isin(labels, self.dangerous_objects)
+        palm_near_danger = (is_palm[:, 0] & is_dangerous[:, 1]) | (
+            is_palm[:, 1] & is_dangerous[:, 0]
+        )
+        found_close_dets = bool(
+            np.any(palm_near_danger & (distances.distances < DISTANCE_THRESHOLD))
+        )
         self._state_queue.append(found_close_dets)
 
         if len(self._state_queue) > STATE_QUEUE_LENGTH:
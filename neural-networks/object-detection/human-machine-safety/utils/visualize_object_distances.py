@@ -1,4 +1,5 @@
 import depthai as dai
+import numpy as np
 from .measure_object_distance import ObjectDistances
 from depthai_nodes.utils import AnnotationHelper
 from depthai_nodes import SECONDARY_COLOR
@@ -26,18 +27,15 @@ class VisualizeObjectDistances(dai.node.HostNode):
 
     def _draw_overlay(self, distances: ObjectDistances):
         annotation_helper = AnnotationHelper()
-        for distance in distances.distances:
-            det1 = distance.detection1
-            det2 = distance.detection2
-            if not (det1.label == 80 and det2.label in [39, 41]) and not (
-                det2.label == 80 and det1.label in [39, 41]
-            ):
-                continue
-
-            x_start = (det1.xmin + det1.xmax) / 2
-            y_start = (det1.ymin + det1.ymax) / 2
-            x_end = (det2.xmin + det2.xmax) / 2
-            y_end = (det2.ymin + det2.ymax) / 2
+        labels = distances.labels[distances.pairs]
+        is_palm = labels == 80
+        is_dangerous = np.isin(labels, [39, 41])
+        shown = (is_palm[:, 0] & is_dangerous[:, 1]) | (
+            is_palm[:, 1] & is_dangerous[:, 0]
+        )
+        for (i, j), distance in zip(distances.pairs[shown], distances.distances[shown]):
+            x_start, y_start = distances.centers[i].tolist()
+            x_end, y_end = distances.centers[j].tolist()
 
             annotation_helper.draw_line(
                 pt1=(x_start, y_start),
@@ -45,7 +43,7 @@ class VisualizeObjectDistances(dai.node.HostNode):
                 thickness=2,
             )
 
-            text = f"{round(distance.distance / 1000, 1)} m"
+            text = f"{round(float(distance) / 1000, 1)} m"
             label_x = (x_start + x_end) / 2
             label_y = (y_start + y_end) / 2 - 0.02
             annotation_helper.draw_text(
@@ -6,6 +6,8 @@ from utils.measure_object_distance import MeasureObjectDistance
 from utils.host_social_distancing import SocialDistancing
 from utils.arguments import initialize_argparser
 
+ALERT_DISTANCE = 1500  # mm
+
 _, args = initialize_argparser()
 
 visualizer = dai.RemoteConnection(httpPort=8082)
@@ -89,9 +91,11 @@ with dai.Pipeline(device) as pipeline:
 
     # annotation
     bird_eye_view = pipeline.create(BirdsEyeView).build(depth_merger.output)
-    measure_obj_dist = pipeline.create(MeasureObjectDistance).build(depth_merger.output)
+    measure_obj_dist = pipeline.create(MeasureObjectDistance).build(
+        depth_merger.output, max_distance=ALERT_DISTANCE
+    )
     social_distancing = pipeline.create(SocialDistancing).build(
-        distances=measure_obj_dist.output
+        distances=measure_obj_dist.output, alert_distance=ALERT_DISTANCE
     )
 
     # visualization
@@ -1,6 +1,6 @@
 import depthai as dai
-from typing import List, Tuple
-from .measure_object_distance import ObjectDistances, DetectionDistance
+import numpy as np
+from .measure_object_distance import ObjectDistances
 from depthai_nodes.utils import AnnotationHelper
 from depthai_nodes import PRIMARY_COLOR, SECONDARY_COLOR
 
@@ -45,8 +45,10 @@ class SocialDistancing(dai.node.HostNode):
         if self._should_alert:
             self._add_alert_annotation(annotation_helper)
 
-        for distance in distances.distances:
-            self._add_distance_annotation(annotation_helper, distance)
+        for (i, j), distance in zip(distances.pairs, distances.distances):
+            self._add_distance_annotation(
+                annotation_helper, distances.centers[i], distances.centers[j], distance
+            )
 
         annotations = annotation_helper.build(
             timestamp=distances.getTimestamp(), sequence_num=distances.getSequenceNum()
@@ -70,14 +72,14 @@ class SocialDistancing(dai.node.HostNode):
         )
 
     def _add_distance_annotation(
-        self, annotation_helper: AnnotationHelper, distance: DetectionDistance
+        self,
+        annotation_helper: AnnotationHelper,
+        start: np.ndarray,
+        end: np.ndarray,
+        distance: float,
     ):
-        det1 = distance.detection1
-        det2 = distance.detection2
-        x_start = (det1.xmin + det1.xmax) / 2
-        y_start = (det1.ymin + det1.ymax) / 2
-        x_end = (det2.xmin + det2.xmax) / 2
-        y_end = (det2.ymin + det2.ymax) / 2
+        x_start, y_start = float(start[0]), float(start[1])
+        x_end, y_end = float(end[0]), float(end[1])
         annotation_helper.draw_line(
             pt1=(x_start, y_start),
             pt2=(x_end, y_end),
@@ -85,7 +87,7 @@ class SocialDistancing(dai.node.HostNode):
             thickness=2,
         )
 
-        text = f"{round(distance.distance / 1000, 1)} m"
+        text = f"{round(float(distance) / 1000, 1)} m"
         label_x = (x_start + x_end) / 2
         label_y = (y_start + y_end) / 2 - 0.02
         annotation_helper.draw_text(
@@ -107,30 +109,7 @@ class SocialDistancing(dai.node.HostNode):
         if len(self._state_queue) > STATE_QUEUE_LENGTH:
             self._state_queue.pop(0)
 
-    def _get_all_close_detections(
-        self, distances: ObjectDistances
-    ) -> List[dai.SpatialImgDetection]:
-        close_detections: List[dai.SpatialImgDetection] = []
-        close_bboxes: List[Tuple[float, float, float, float]] = []
-        for distance in distances.distances:
-            if distance.distance < self.alert_distance:
-                det1_bbox = (
-                    distance.detection1.xmin,
-                    distance.detection1.ymin,
-                    distance.detection1.xmax,
-                    distance.detection1.ymax,
-                )
-                det2_bbox = (
-                    distance.detection2.xmin,
-                    distance.detection2.ymin,
-                    distance.detection2.xmax,
-                    distance.detection2.ymax,
-                )
-                if det1_bbox not in close_bboxes:
-                    close_detections.append(distance.detection1)
-                    close_bboxes.append(det1_bbox)
-                if det2_bbox not in close_bboxes:
-                    close_detections.append(distance.detection2)
-                    close_bboxes.append(det2_bbox)
-
-        return close_detections
+    def _get_all_close_detections(self, distances: ObjectDistances) -> np.ndarray:
+        """Indices of all detections closer than the alert distance to another one."""
+        close = distances.distances < self.alert_distance
+        return np.unique(distances.pairs[close])
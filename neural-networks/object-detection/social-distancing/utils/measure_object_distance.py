@@ -1,61 +1,76 @@
-import itertools
+from typing import List, Optional, Tuple
 
 import depthai as dai
+import numpy as np
 
-from typing import List
+GRID_MIN_POINTS = 256  # above this number of points, close pairs are searched on a grid
 
 
-class DetectionDistance:
-    def __init__(
-        self,
-        det1: dai.SpatialImgDetection,
-        det2: dai.SpatialImgDetections,
-        distance: float,
-    ) -> None:
-        self._detection1 = det1
-        self._detection2 = det2
-        self._distance = distance
+class ObjectDistances(dai.Buffer):
+    """Pairwise distances between the spatial detections of one frame.
 
-    @property
-    def detection1(self) -> dai.SpatialImgDetection:
-        return self._detection1
+    Pairs are stored as arrays instead of one Python object per pair: `pairs`
+    holds the (K, 2) indices into `detections` and `distances` the (K,) distances
+    in millimeters. `labels` and `centers` hold the labels and the normalized
+    bounding box centers of the detections, so consumers can filter and draw
+    pairs without touching the detection objects.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(0)
+        self._detections: List[dai.SpatialImgDetection] = []
+        self._labels = np.empty(0, dtype=np.int64)
+        self._centers = np.empty((0, 2), dtype=np.float32)
+        self._pairs = np.empty((0, 2), dtype=np.int64)
+        self._distances = np.empty(0, dtype=np.float32)
 
     @property
-    def detection2(self) -> dai.SpatialImgDetections:
-        return self._detection2
+    def detections(self) -> List[dai.SpatialImgDetection]:
+        return self._detections
+
+    @detections.setter
+    def detections(self, value: List[dai.SpatialImgDetection]) -> None:
+        self._detections = value
 
     @property
-    def distance(self) -> float:
-        return self._distance
+    def labels(self) -> np.ndarray:
+        return self._labels
 
-    @distance.setter
-    def distance(self, value: float) -> None:
-        self._distance = value
+    @labels.setter
+    def labels(self, value: np.ndarray) -> None:
+        self._labels = value
 
-    @detection1.setter
-    def detection1(self, value: dai.SpatialImgDetection) -> None:
-        self._detection1 = value
+    @property
+    def centers(self) -> np.ndarray:
+        return self._centers
 
-    @detection2.setter
-    def detection2(self, value: dai.SpatialImgDetections) -> None:
-        self._detection2 = value
+    @centers.setter
+    def centers(self, value: np.ndarray) -> None:
+        self._centers = value
 
+    @property
+    def pairs(self) -> np.ndarray:
+        return self._pairs
 
-class ObjectDistances(dai.Buffer):
-    def __init__(self) -> None:
-        super().__init__(0)
-        self._distances: List[DetectionDistance] = []
+    @pairs.setter
+    def pairs(self, value: np.ndarray) -> None:
+        self._pairs = value
 
     @property
-    def distances(self) -> List[DetectionDistance]:
+    def distances(self) -> np.ndarray:
         return self._distances
 
     @distances.setter
-    def distances(self, value: List[DetectionDistance]) -> None:
+    def distances(self, value: np.ndarray) -> None:
         self._distances = value
 
 
 class MeasureObjectDistance(dai.node.HostNode):
+    """Measures the distances between all pairs of spatial detections.
+
+    If `max_distance` is set, only pairs closer than `max_distance` (mm) are sent.
+    """
+
     def __init__(self):
         super().__init__()
 
@@ -64,27 +79,119 @@ class MeasureObjectDistance(dai.node.HostNode):
                 dai.Node.DatatypeHierarchy(dai.DatatypeEnum.Buffer, True)
             ]
         )
+        self._max_distance: Optional[float] = None
 
-    def build(self, nn: dai.Node.Output) -> "MeasureObjectDistance":
+    def build(
+        self, nn: dai.Node.Output, max_distance: Optional[float] = None
+    ) -> "MeasureObjectDistance":
         self.link_args(nn)
+        self._max_distance = max_distance
         return self
 
     def process(self, detections: dai.Buffer):
         assert isinstance(detections, dai.SpatialImgDetections)
-        distances = []
-        for det1, det2 in itertools.combinations(detections.detections, 2):
-            dist = DetectionDistance(
-                det1,
-                det2,
-                self._calc_distance(det1.spatialCoordinates, det2.spatialCoordinates),
-            )
-            distances.append(dist)
+        dets = detections.detections
+        values = np.array(
+            [
+                (
+                    det.spatialCoordinates.x,
+                    det.spatialCoordinates.y,
+                    det.spatialCoordinates.z,
+                    det.xmin,
+                    det.ymin,
+                    det.xmax,
+                    det.ymax,
+                    det.label,
+                )
+                for det in dets
+            ],
+            dtype=np.float64,
+        ).reshape(-1, 8)
+        pairs, distances = find_close_pairs(values[:, :3], self._max_distance)
 
         obj_distances = ObjectDistances()
+        obj_distances.detections = dets
+        obj_distances.labels = values[:, 7].astype(np.int64)
+        obj_distances.centers = ((values[:, 3:5] + values[:, 5:7]) / 2).astype(
+            np.float32
+        )
+        obj_distances.pairs = pairs
         obj_distances.distances = distances
         obj_distances.setTimestamp(detections.getTimestamp())
         obj_distances.setSequenceNum(detections.getSequenceNum())
         self.output.send(obj_distances)
 
-    def _calc_distance(self, p1: dai.Point3f, p2: dai.Point3f) -> float:
-        return ((p1.x - p2.x) ** 2 + (p1.y - p2.y) ** 2 + (p1.z - p2.z) ** 2) ** 0.5
+
+def find_close_pairs(
+    points: np.ndarray, max_distance: Optional[float] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Finds all pairs of points closer than `max_distance`.
+
+    Returns the (K, 2) indices (i < j) of the pairs in ascending order and their
+    (K,) Euclidean distances. Without `max_distance`, all pairs are returned.
+    Large point sets with a `max_distance` are searched on a uniform grid, so only
+    points in neighbouring cells are compared.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if max_distance is not None and max_distance > 0 and len(points) > GRID_MIN_POINTS:
+        pairs = _grid_candidate_pairs(points, max_distance)
+    else:
+        pairs = np.stack(np.triu_indices(len(points), k=1), axis=1)
+
+    distances = np.linalg.norm(points[pairs[:, 0]] - points[pairs[:, 1]], axis=1)
+    if max_distance is not None:
+        close = distances < max_distance
+        pairs, distances = pairs[close], distances[close]
+    return pairs.astype(np.int64), distances.astype(np.float32)
+
+
+def _grid_candidate_pairs(points: np.ndarray, cell_size: float) -> np.ndarray:
+    """All pairs of points in the same or in neighbouring cells of a grid with
+    `cell_size` spacing, i.e. a superset of the pairs closer than `cell_size`."""
+    cells = np.floor(points / max(cell_size, 1e-9)).astype(np.int64)
+    cells -= cells.min(axis=0)
+    dims = cells.max(axis=0) + 3  # padding so neighbour offsets never wrap
+    cells += 1
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    unique_keys, starts, counts = np.unique(
+        sorted_keys, return_index=True, return_counts=True
+    )
+
+    # Cell of every point, as an index into the unique cells
+    point_cells = np.searchsorted(unique_keys, keys)
+
+    candidates = []
+    offsets = np.stack(
+        np.meshgrid([-1, 0, 1], [-1, 0, 1], [-1, 0, 1], indexing="ij"), axis=-1
+    ).reshape(-1, 3)
+    for offset in offsets:
+        offset_key = (offset[0] * dims[1] + offset[1]) * dims[2] + offset[2]
+        if offset_key < 0:
+            continue  # every pair of cells is visited once, from its lower key
+        neighbour_keys = unique_keys + offset_key
+        position = np.searchsorted(unique_keys, neighbour_keys)
+        position = np.minimum(position, len(unique_keys) - 1)
+        neighbour = np.where(unique_keys[position] == neighbour_keys, position, -1)
+
+        # Pair every point with all points of its neighbour cell
+        point_neighbour = neighbour[point_cells]
+        has_neighbour = point_neighbour >= 0
+        i = np.flatnonzero(has_neighbour)
+        num = counts[point_neighbour[has_neighbour]]
+        first = starts[point_neighbour[has_neighbour]]
+        i = np.repeat(i, num)
+        within = np.arange(len(i)) - np.repeat(np.cumsum(num) - num, num)
+        j = order[np.repeat(first, num) + within]
+        if offset_key == 0:
+            keep = i < j
+            i, j = i[keep], j[keep]
+        candidates.append(np.stack([i, j], axis=1))
+
+    if not candidates:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.concatenate(candidates)
+    pairs = np.sort(pairs, axis=1)
+    return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
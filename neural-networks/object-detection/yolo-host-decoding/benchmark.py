@@ -0,0 +1,212 @@
+"""Benchmark of the host YOLO decoding hot path on synthetic head tensors.
+
+Runs without a device, so regressions in `utils/yolo_decode.py` can be caught in CI.
+
+    python3 benchmark.py                  # print results
+    python3 benchmark.py --save           # store results as the new baseline
+    python3 benchmark.py --check          # fail if slower than the baseline
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple
+
+import numpy as np
+
+from utils.yolo_decode import (
+    decode_yolo_output,
+    non_max_suppression,
+    parse_yolo_output,
+    parse_yolo_outputs,
+)
+
+STRIDES = [8, 16, 32]
+CONF_THRESH = 0.5
+IOU_THRESH = 0.45
+BASELINE_PATH = Path(__file__).parent / "benchmark_baseline.json"
+
+
+class Scenario(NamedTuple):
+    name: str
+    input_size: int
+    num_classes: int
+    num_candidates: int
+
+
+SCENARIOS = [
+    Scenario("640_1cls_10cand", 640, 1, 10),
+    Scenario("640_80cls_100cand", 640, 80, 100),
+    Scenario("640_80cls_1000cand", 640, 80, 1000),
+    Scenario("640_80cls_8400cand", 640, 80, 8400),
+    Scenario("1280_80cls_30000cand", 1280, 80, 30000),
+]
+
+
+def make_heads(scenario: Scenario, seed: int = 0) -> List[np.ndarray]:
+    """Synthetic NCHW head tensors with exactly `num_candidates` cells above the
+    confidence threshold, spread randomly over all heads."""
+    rng = np.random.default_rng(seed)
+    num_outputs = scenario.num_classes + 5
+    shapes = [(scenario.input_size // s, scenario.input_size // s) for s in STRIDES]
+    num_cells = sum(ny * nx for ny, nx in shapes)
+    if scenario.num_candidates > num_cells:
+        raise ValueError(
+            f"{scenario.name}: {scenario.num_candidates} candidates do not fit into {num_cells} cells."
+        )
+
+    # Flat (cells, outputs) layout, split into heads at the end
+    flat = np.empty((num_cells, num_outputs), dtype=np.float32)
+    flat[:, 0:4] = rng.uniform(0.5, 6.0, (num_cells, 4))  # distances to cell center
+    flat[:, 4] = rng.uniform(0.0, CONF_THRESH * 0.9, num_cells)
+    flat[:, 5:] = rng.uniform(0.0, CONF_THRESH * 0.9, (num_cells, scenario.num_classes))
+
+    candidates = rng.choice(num_cells, scenario.num_candidates, replace=False)
+    flat[candidates, 4] = rng.uniform(CONF_THRESH, 1.0, scenario.num_candidates)
+    classes = rng.integers(0, scenario.num_classes, scenario.num_candidates)
+    flat[candidates, 5 + classes] = rng.uniform(
+        CONF_THRESH, 1.0, scenario.num_candidates
+    )
+
+    heads = []
+    offset = 0
+    for ny, nx in shapes:
+        cells = ny * nx
+        head = flat[offset : offset + cells].T.reshape(1, num_outputs, ny, nx)
+        heads.append(np.ascontiguousarray(head))
+        offset += cells
+    return heads
+
+
+def time_call(fn: Callable[[], object], repeats: int, warmup: int) -> np.ndarray:
+    for _ in range(warmup):
+        fn()
+    latencies = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies[i] = time.perf_counter() - start
+    return latencies * 1000.0  # ms
+
+
+def run_scenario(scenario: Scenario, repeats: int, warmup: int) -> Dict[str, Dict]:
+    heads = make_heads(scenario)
+    num_outputs = scenario.num_classes + 5
+    parsed = parse_yolo_outputs(heads, STRIDES, num_outputs)
+
+    cases = {
+        # Every head, so the throughput counts the candidates of all heads
+        "parse_yolo_output": lambda: [
+            parse_yolo_output(head, stride, num_outputs)
+            for head, stride in zip(heads, STRIDES)
+        ],
+        "non_max_suppression": lambda: non_max_suppression(
+            parsed,
+            conf_thres=CONF_THRESH,
+            iou_thres=IOU_THRESH,
+            num_classes=scenario.num_classes,
+        ),
+        "decode_yolo_output": lambda: decode_yolo_output(
+            heads, STRIDES, CONF_THRESH, IOU_THRESH, scenario.num_classes
+        ),
+    }
+
+    results = {}
+    for case_name, fn in cases.items():
+        latencies = time_call(fn, repeats, warmup)
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        results[case_name] = {
+            "p50_ms": round(float(p50), 4),
+            "p90_ms": round(float(p90), 4),
+            "p99_ms": round(float(p99), 4),
+            "candidates_per_s": round(
+                scenario.num_candidates / (float(latencies.mean()) / 1000.0)
+            ),
+        }
+    return results
+
+
+def check_against_baseline(
+    results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float
+) -> List[str]:
+    """Returns descriptions of all cases whose p50 is more than `tolerance` times
+    slower than the baseline."""
+    regressions = []
+    for scenario_name, cases in results.items():
+        for case_name, stats in cases.items():
+            reference = baseline.get(scenario_name, {}).get(case_name)
+            if reference is None:
+                continue
+            if stats["p50_ms"] > reference["p50_ms"] * tolerance:
+                regressions.append(
+                    f"{scenario_name}/{case_name}: p50 {stats['p50_ms']:.3f} ms > "
+                    f"{tolerance:.1f} x baseline {reference['p50_ms']:.3f} ms"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "-n", "--repeats", type=int, default=50, help="Timed runs per case."
+    )
+    parser.add_argument(
+        "-w", "--warmup", type=int, default=5, help="Untimed runs per case."
+    )
+    parser.add_argument(
+        "--save", action="store_true", help="Store the results as the new baseline."
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with an error if any case regressed against the baseline.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=2.0,
+        help="Allowed slowdown factor of p50 latency before --check fails.",
+    )
+    parser.add_argument(
+        "--baseline", type=Path, default=BASELINE_PATH, help="Baseline JSON file."
+    )
+    args = parser.parse_args()
+
+    results = {}
+    print(
+        f"{'scenario':<24}{'case':<22}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'cand/s':>14}"
+    )
+    for scenario in SCENARIOS:
+        results[scenario.name] = run_scenario(scenario, args.repeats, args.warmup)
+        for case_name, stats in results[scenario.name].items():
+            print(
+                f"{scenario.name:<24}{case_name:<22}{stats['p50_ms']:>10.3f}"
+                f"{stats['p90_ms']:>10.3f}{stats['p99_ms']:>10.3f}{stats['candidates_per_s']:>14,}"
+            )
+
+    if args.save:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.check:
+        if not args.baseline.exists():
+            print(f"No baseline found at {args.baseline}")
+            return 1
+        baseline = json.loads(args.baseline.read_text())
+        regressions = check_against_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against baseline.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 import depthai as dai
-from .yolo_decode import decode_yolo_output
+from .yolo_decode import YoloDecoder
 
 from typing import Tuple
 
@@ -9,6 +9,7 @@ class HostDecoding(dai.node.HostNode):
         self._conf_thresh = 0.3
         self._iou_thresh = 0.4
         self._nn_size = (512, 288)
+        self._decoder = YoloDecoder(strides=[8, 16, 32], num_classes=80)
         super().__init__()
 
         self.output = self.createOutput(
@@ -38,8 +39,7 @@ class HostDecoding(dai.node.HostNode):
             )
             for tn in tensor_names
         ]
-        strides = [8, 16, 32]
-        decoded = decode_yolo_output(tensors, strides, 0.5, 0.45, 80)
+        decoded = self._decoder.decode(tensors, self._conf_thresh, self._iou_thresh)[0]
         dets = []
         for d in decoded:
             xmin, ymin, xmax, ymax, conf, cls = d
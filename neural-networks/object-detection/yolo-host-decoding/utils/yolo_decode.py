@@ -1,43 +1,224 @@
-from typing import List
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
 
 import numpy as np
 
+NMS_TILE_SIZE = 1024
+
 
 def sigmoid(x: np.ndarray) -> np.ndarray:
     """Sigmoid function."""
     return 1 / (1 + np.exp(-x))
 
 
-def nms(dets: np.ndarray, nms_thresh: float = 0.5) -> List[int]:
-    """Non-maximum suppression."""
-    thresh = nms_thresh
-    x1 = dets[:, 0]
-    y1 = dets[:, 1]
-    x2 = dets[:, 2]
-    y2 = dets[:, 3]
-    scores = dets[:, 4]
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """IoU matrix of shape (len(boxes_a), len(boxes_b)) for boxes in
+    (x_min, y_min, x_max, y_max) format, using the +1 pixel area convention."""
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0] + 1) * (boxes_a[:, 3] - boxes_a[:, 1] + 1)
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0] + 1) * (boxes_b[:, 3] - boxes_b[:, 1] + 1)
 
-    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-    order = scores.argsort()[::-1]
+    xx1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    yy1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    xx2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    yy2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
 
-    keep = []
-    while order.size > 0:
-        i = order[0]
-        keep.append(i)
-        xx1 = np.maximum(x1[i], x1[order[1:]])
-        yy1 = np.maximum(y1[i], y1[order[1:]])
-        xx2 = np.minimum(x2[i], x2[order[1:]])
-        yy2 = np.minimum(y2[i], y2[order[1:]])
+    w = np.maximum(0.0, xx2 - xx1 + 1)
+    h = np.maximum(0.0, yy2 - yy1 + 1)
+    inter = w * h
+    return inter / (area_a[:, None] + area_b[None, :] - inter)
 
-        w = np.maximum(0.0, xx2 - xx1 + 1)
-        h = np.maximum(0.0, yy2 - yy1 + 1)
-        inter = w * h
-        ovr = inter / (areas[i] + areas[order[1:]] - inter)
 
-        inds = np.where(ovr <= thresh)[0]
-        order = order[inds + 1]
+def _iou_above(
+    boxes_a: np.ndarray, boxes_b: np.ndarray, iou_thres: float
+) -> np.ndarray:
+    """Boolean matrix of `box_iou(boxes_a, boxes_b) > iou_thres`.
+
+    Works in place on the (len(boxes_a), len(boxes_b)) matrices and compares
+    `inter * (1 + t) > t * (area_a + area_b)` instead of dividing by the union.
+    """
+    ax1, ay1, ax2, ay2 = (
+        np.ascontiguousarray(boxes_a[:, i])[:, None] for i in range(4)
+    )
+    bx1, by1, bx2, by2 = (
+        np.ascontiguousarray(boxes_b[:, i])[None, :] for i in range(4)
+    )
+
+    inter = np.minimum(ax2, bx2)
+    inter -= np.maximum(ax1, bx1)
+    inter += 1
+    np.maximum(inter, 0, out=inter)
+    h = np.minimum(ay2, by2)
+    h -= np.maximum(ay1, by1)
+    h += 1
+    np.maximum(h, 0, out=h)
+    inter *= h
+    inter *= 1 + iou_thres
+
+    areas = (ax2 - ax1 + 1) * (ay2 - ay1 + 1) + (bx2 - bx1 + 1) * (by2 - by1 + 1)
+    areas *= iou_thres
+    return inter > areas
+
+
+def _pairwise_iou_above(
+    boxes_a: np.ndarray, boxes_b: np.ndarray, iou_thres: float
+) -> np.ndarray:
+    """Element-wise `IoU(boxes_a[k], boxes_b[k]) > iou_thres` for two (N, 4) arrays."""
+    w = np.maximum(
+        0.0,
+        np.minimum(boxes_a[:, 2], boxes_b[:, 2])
+        - np.maximum(boxes_a[:, 0], boxes_b[:, 0])
+        + 1,
+    )
+    h = np.maximum(
+        0.0,
+        np.minimum(boxes_a[:, 3], boxes_b[:, 3])
+        - np.maximum(boxes_a[:, 1], boxes_b[:, 1])
+        + 1,
+    )
+    inter = w * h
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0] + 1) * (boxes_a[:, 3] - boxes_a[:, 1] + 1)
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0] + 1) * (boxes_b[:, 3] - boxes_b[:, 1] + 1)
+    return inter * (1 + iou_thres) > (area_a + area_b) * iou_thres
+
+
+def _same_group_pairs(groups: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """All index pairs (i, j), i < j, of boxes sharing a group."""
+    by_group = np.argsort(groups, kind="stable")
+    sorted_groups = groups[by_group]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    sizes = np.diff(np.r_[starts, groups.shape[0]])
+
+    # Every box pairs with the boxes after it in its group
+    position = np.arange(groups.shape[0]) - np.repeat(starts, sizes)
+    partners = np.repeat(sizes, sizes) - 1 - position
+    first = np.repeat(np.arange(groups.shape[0]), partners)
+    second = (
+        first
+        + 1
+        + np.arange(first.shape[0])
+        - np.repeat(np.cumsum(partners) - partners, partners)
+    )
+    # Stable sort keeps the score order inside a group, so by_group[first] < by_group[second]
+    return by_group[first], by_group[second]
+
+
+def _greedy_keep(candidates: np.ndarray, suppresses: np.ndarray) -> np.ndarray:
+    """Resolves greedy NMS on a suppression matrix (i suppresses j, i < j) by
+    iterating the greedy rule until it reaches its fixed point."""
+    keep = candidates
+    while True:
+        new_keep = candidates & ~suppresses[keep].any(0)
+        if np.array_equal(new_keep, keep):
+            return keep
+        keep = new_keep
+
+
+def _greedy_keep_pairs(
+    candidates: np.ndarray, first: np.ndarray, second: np.ndarray
+) -> np.ndarray:
+    """Same as `_greedy_keep` for a sparse list of suppressing pairs
+    (first[k] suppresses second[k], first[k] < second[k])."""
+    keep = candidates
+    while True:
+        suppressed = np.zeros_like(candidates)
+        suppressed[second[keep[first]]] = True
+        new_keep = candidates & ~suppressed
+        if np.array_equal(new_keep, keep):
+            return keep
+        keep = new_keep
+
+
+def _limit_per_image(
+    kept: np.ndarray, images: np.ndarray, max_det: int, num_images: int
+) -> np.ndarray:
+    """Drops kept indices (in score order) past the first `max_det` of each image."""
+    kept_images = images[kept]
+    by_image = np.argsort(kept_images, kind="stable")
+    counts = np.bincount(kept_images, minlength=num_images)
+    ranks = np.empty_like(by_image)
+    ranks[by_image] = np.arange(kept.size) - np.repeat(
+        np.cumsum(counts) - counts, counts
+    )
+    return kept[ranks < max_det]
+
+
+def batched_nms(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    groups: np.ndarray = None,
+    iou_thres: float = 0.5,
+    max_det: int = None,
+    images: np.ndarray = None,
+    tile_size: int = NMS_TILE_SIZE,
+) -> np.ndarray:
+    """Greedy non-maximum suppression over all groups (classes, images) at once.
+
+    Boxes only suppress boxes of the same group. Candidates are processed in
+    score order in tiles: each tile is first suppressed by the boxes kept in the
+    previous tiles with one IoU matrix, then resolved internally on the IoU of
+    its same-group pairs (or the full tile IoU matrix without groups) by
+    iterating the greedy rule until it reaches its fixed point. The result is
+    identical to the sequential greedy algorithm.
+
+    If `max_det` is set, at most `max_det` boxes are kept per image (`images`
+    holds the image index of every box, all boxes belong to one image if None)
+    and the tiled path stops processing candidates of full images.
+
+    Returns indices of the kept boxes sorted by descending score.
+    """
+    order = np.argsort(-scores, kind="stable")
+    boxes = boxes[order]
+    groups = groups[order] if groups is not None else None
+    n = order.shape[0]
+    if max_det is not None:
+        images = images[order] if images is not None else np.zeros(n, np.intp)
+        num_images = int(images.max()) + 1 if n else 0
+
+    keep = np.ones(n, dtype=bool)
+    for start in range(0, n, tile_size):
+        end = min(start + tile_size, n)
+        tile_boxes = boxes[start:end]
+        tile_groups = groups[start:end] if groups is not None else None
+
+        kept_before = np.flatnonzero(keep[:start])
+        if kept_before.size:
+            suppressed = _iou_above(tile_boxes, boxes[kept_before], iou_thres)
+            if groups is not None:
+                suppressed &= tile_groups[:, None] == groups[kept_before][None, :]
+            keep[start:end] &= ~suppressed.any(1)
+
+        candidates = keep[start:end].copy()
+        if groups is not None:
+            # Only boxes of the same group can suppress each other
+            first, second = _same_group_pairs(tile_groups)
+            overlapping = _pairwise_iou_above(
+                tile_boxes[first], tile_boxes[second], iou_thres
+            )
+            keep[start:end] = _greedy_keep_pairs(
+                candidates, first[overlapping], second[overlapping]
+            )
+        else:
+            # suppresses[i, j] - box i suppresses box j if i is kept (i < j)
+            suppresses = np.triu(_iou_above(tile_boxes, tile_boxes, iou_thres), k=1)
+            keep[start:end] = _greedy_keep(candidates, suppresses)
+
+        if max_det is not None and end < n:
+            kept_per_image = np.bincount(images[:end][keep[:end]], minlength=num_images)
+            full = kept_per_image >= max_det
+            if full.any():
+                keep[end:] &= ~full[images[end:]]
+            if full.all():
+                break
+
+    kept = np.flatnonzero(keep)
+    if max_det is not None and kept.size:
+        kept = _limit_per_image(kept, images, max_det, num_images)
+    return order[kept]
+
 
-    return keep
+def nms(dets: np.ndarray, nms_thresh: float = 0.5) -> List[int]:
+    """Non-maximum suppression."""
+    return batched_nms(dets[:, :4], dets[:, 4], iou_thres=nms_thresh).tolist()
 
 
 def xywh_to_xyxy(bboxes: np.ndarray) -> np.ndarray:
@@ -72,16 +253,17 @@ def non_max_suppression(
     agnostic: bool = False,
     max_det: int = 300,
     max_nms: int = 30000,
-    max_wh: int = 7680,
 ) -> List[np.ndarray]:
-    """Performs Non-Maximum Suppression (NMS) on inference results."""
+    """Performs Non-Maximum Suppression (NMS) on inference results.
+
+    All images of the batch and all classes are suppressed in one `batched_nms`
+    call, boxes only suppress boxes of the same image and (unless `agnostic`)
+    the same class.
+    """
 
     # Detection: 4 (bbox) + 1 (objectness) = 5
     num_classes_check = prediction.shape[2] - 5
 
-    nm = prediction.shape[2] - num_classes - 5
-    pred_candidates = prediction[..., 4] > conf_thres  # candidates
-
     # Check the parameters.
     assert (
         num_classes == num_classes_check
@@ -93,51 +275,73 @@ def non_max_suppression(
         0 <= iou_thres <= 1
     ), f"Invalid IoU {iou_thres}, valid values are between 0.0 and 1.0"
 
-    output = [np.zeros((0, 6 + nm))] * prediction.shape[0]
-
-    for img_idx, x in enumerate(prediction):  # image index, image inference
-        x = x[pred_candidates[img_idx]]  # confidence
-
-        # If no box remains, skip the next process.
-        if not x.shape[0]:
-            continue
+    img_idx, box_idx = np.nonzero(prediction[..., 4] > conf_thres)  # candidates
+    return _suppress_candidates(
+        prediction[img_idx, box_idx],
+        img_idx,
+        prediction.shape[0],
+        conf_thres,
+        iou_thres,
+        classes,
+        num_classes,
+        agnostic,
+        max_det,
+        max_nms,
+    )
+
+
+def _suppress_candidates(
+    x: np.ndarray,
+    img_idx: np.ndarray,
+    batch_size: int,
+    conf_thres: float,
+    iou_thres: float,
+    classes: List,
+    num_classes: int,
+    agnostic: bool,
+    max_det: int,
+    max_nms: int,
+) -> List[np.ndarray]:
+    """NMS over candidate rows `x` (xywh, objectness, classes, ...) gathered from
+    all images of a batch, `img_idx` holds the image index of every row."""
+    nm = x.shape[1] - num_classes - 5
+    output = [np.zeros((0, 6 + nm), dtype=x.dtype)] * batch_size
 
-        # (center x, center y, width, height) to (x1, y1, x2, y2)
-        box = xywh_to_xyxy(x[:, :4])
-        cls = x[:, 5 : 5 + num_classes]
-        other = x[:, 5 + num_classes :]  # Either kpts or pos
+    # If no box remains, skip the next process.
+    if not x.shape[0]:
+        return output
 
-        class_idx = np.expand_dims(cls.argmax(1), 1)
-        conf = cls.max(1, keepdims=True)
-        x = np.concatenate((box, conf, class_idx, other), 1)[
-            conf.flatten() > conf_thres
-        ]
+    cls = x[:, 5 : 5 + num_classes]
+    class_idx = cls.argmax(1)
+    conf = cls[np.arange(cls.shape[0]), class_idx]
 
+    mask = conf > conf_thres
+    if classes is not None:
         # Filter by class, only keep boxes whose category is in classes.
-        if classes is not None:
-            x = x[(x[:, 5:6] == np.array(classes)).any(1)]
-
-        # Check shape
-        num_box = x.shape[0]  # number of boxes
-        if not num_box:  # no boxes kept.
-            continue
-        elif num_box > max_nms:  # excess max boxes' number.
-            x = x[x[:, 4].argsort()[:max_nms]]  # sort by confidence
-
-        # Batched NMS
-        class_offset = x[:, 5:6] * (0 if agnostic else max_wh)  # classes
-        boxes, scores = (
-            x[:, :4] + class_offset,
-            x[:, 4][..., np.newaxis],
-        )  # boxes (offset by class), scores
-        keep_box_idx = np.array(
-            nms(np.hstack((boxes, scores)).astype(np.float32, copy=False), iou_thres)
-        )
-
-        if keep_box_idx.shape[0] > max_det:  # limit detections
-            keep_box_idx = keep_box_idx[:max_det]
-
-        output[img_idx] = x[keep_box_idx]
+        mask &= np.isin(class_idx, classes)
+    x, img_idx, class_idx, conf = x[mask], img_idx[mask], class_idx[mask], conf[mask]
+
+    # Check shape
+    if not x.shape[0]:  # no boxes kept.
+        return output
+    if x.shape[0] > max_nms * batch_size:  # excess max boxes' number.
+        top = np.argsort(-conf, kind="stable")[: max_nms * batch_size]
+        x, img_idx, class_idx, conf = x[top], img_idx[top], class_idx[top], conf[top]
+
+    # (center x, center y, width, height) to (x1, y1, x2, y2)
+    box = xywh_to_xyxy(x[:, :4])
+    other = x[:, 5 + num_classes :]  # Either kpts or pos
+    x = np.concatenate(
+        (box, conf[:, None], class_idx[:, None].astype(x.dtype), other), 1
+    )
+
+    # Batched NMS, groups are (image, class) pairs
+    groups = img_idx * num_classes + (0 if agnostic else class_idx)
+    keep = batched_nms(box, conf, groups, iou_thres, max_det, img_idx)
+
+    kept_img_idx = img_idx[keep]
+    for i in np.unique(kept_img_idx):
+        output[i] = x[keep[kept_img_idx == i]]
 
     return output
 
@@ -148,45 +352,152 @@ def make_grid_numpy(ny: int, nx: int, na: int) -> np.ndarray:
     return np.stack((xv, yv), 2).reshape(1, na, ny, nx, 2)
 
 
+class YoloDecoder:
+    """Host decoder for anchor-free YOLO (v6r2 style) detection heads.
+
+    Grids and per-cell strides are precomputed once per set of head shapes and
+    all heads are written into one preallocated (batch, cells, outputs) buffer,
+    so repeated calls with the same input shape do not allocate new grids or
+    grow the output with `np.concatenate`. The batch dimension of the head
+    tensors is decoded in one call, so frames from several cameras can be
+    stacked along axis 0 and decoded together.
+    """
+
+    def __init__(
+        self,
+        strides: Sequence[int],
+        num_classes: int,
+        conf_thres: float = 0.5,
+        iou_thres: float = 0.45,
+        max_det: int = 300,
+        max_nms: int = 30000,
+        agnostic: bool = False,
+    ) -> None:
+        self.strides = tuple(strides)
+        self.num_classes = num_classes
+        self.num_outputs = num_classes + 5
+        self.conf_thres = conf_thres
+        self.iou_thres = iou_thres
+        self.max_det = max_det
+        self.max_nms = max_nms
+        self.agnostic = agnostic
+        self._layouts: Dict[Tuple, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def _layout(
+        self, outputs: Sequence[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the cached (grid, stride, buffer) for the shapes of `outputs`."""
+        key = tuple(out.shape for out in outputs)
+        layout = self._layouts.get(key)
+        if layout is None:
+            grids, cell_strides = [], []
+            for out, stride in zip(outputs, self.strides):
+                _, _, ny, nx = out.shape
+                grids.append(make_grid_numpy(ny, nx, 1).reshape(-1, 2))
+                cell_strides.append(np.full((ny * nx, 1), stride))
+            grid = np.concatenate(grids).astype(np.float32) + 0.5
+            stride = np.concatenate(cell_strides).astype(np.float32)
+            buffer = np.empty(
+                (outputs[0].shape[0], grid.shape[0], self.num_outputs),
+                dtype=np.float32,
+            )
+            layout = (grid, stride, buffer)
+            self._layouts[key] = layout
+        return layout
+
+    def _fill(
+        self, outputs: Sequence[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Copies raw heads into the shared buffer, returns (buffer, grid, stride)."""
+        if len(outputs) != len(self.strides):
+            raise ValueError(
+                f"Expected {len(self.strides)} head outputs, got {len(outputs)}."
+            )
+        grid, stride, buffer = self._layout(outputs)
+        offset = 0
+        for out in outputs:
+            bs, _, ny, nx = out.shape
+            cells = ny * nx
+            buffer[:, offset : offset + cells] = out.reshape(
+                bs, self.num_outputs, cells
+            ).transpose(0, 2, 1)
+            offset += cells
+        return buffer, grid, stride
+
+    @staticmethod
+    def _decode_boxes(
+        raw: np.ndarray, grid: np.ndarray, stride: np.ndarray
+    ) -> np.ndarray:
+        """Distances to the cell center -> (x_center, y_center, width, height)."""
+        x1y1 = grid - raw[..., 0:2]
+        x2y2 = grid + raw[..., 2:4]
+        return np.concatenate(((x1y1 + x2y2) / 2 * stride, (x2y2 - x1y1) * stride), -1)
+
+    def parse(self, outputs: Sequence[np.ndarray]) -> np.ndarray:
+        """Decodes all cells into a (batch, cells, outputs) array of xywh boxes.
+
+        The returned array is the decoder's internal buffer and is overwritten by
+        the next call.
+        """
+        buffer, grid, stride = self._fill(outputs)
+        buffer[..., :4] = self._decode_boxes(buffer[..., :4], grid, stride)
+        return buffer
+
+    def decode(
+        self,
+        outputs: Sequence[np.ndarray],
+        conf_thres: float = None,
+        iou_thres: float = None,
+    ) -> List[np.ndarray]:
+        """Decodes the heads and runs NMS, returns one array per batch item with
+        rows (x_min, y_min, x_max, y_max, confidence, class).
+
+        `conf_thres` and `iou_thres` override the decoder's thresholds for this call.
+        """
+        conf_thres = self.conf_thres if conf_thres is None else conf_thres
+        iou_thres = self.iou_thres if iou_thres is None else iou_thres
+
+        buffer, grid, stride = self._fill(outputs)
+        # Only decode the boxes of cells above the objectness threshold
+        img_idx, cell_idx = np.nonzero(buffer[..., 4] > conf_thres)
+        candidates = buffer[img_idx, cell_idx]
+        candidates[:, :4] = self._decode_boxes(
+            candidates[:, :4], grid[cell_idx], stride[cell_idx]
+        )
+
+        return _suppress_candidates(
+            candidates,
+            img_idx,
+            buffer.shape[0],
+            conf_thres,
+            iou_thres,
+            None,
+            self.num_classes,
+            self.agnostic,
+            self.max_det,
+            self.max_nms,
+        )
+
+
+@lru_cache(maxsize=8)
+def _get_decoder(strides: Tuple[int, ...], num_outputs: int) -> YoloDecoder:
+    return YoloDecoder(strides, num_outputs - 5)
+
+
 def parse_yolo_output(
     out: np.ndarray,
     stride: int,
     num_outputs: int,
 ) -> np.ndarray:
     """Parse a single channel output of an YOLO model."""
-    bs, _, ny, nx = out.shape  # bs - batch size, ny|nx - y and x of grid cells
-
-    grid = make_grid_numpy(ny, nx, 1)
-
-    out = out.reshape(bs, 1, num_outputs, ny, nx).transpose((0, 1, 3, 4, 2))
-
-    x1y1 = grid - out[..., 0:2] + 0.5
-    x2y2 = grid + out[..., 2:4] + 0.5
-    c_xy = (x1y1 + x2y2) / 2
-    wh = x2y2 - x1y1
-    out[..., 0:2] = c_xy * stride
-    out[..., 2:4] = wh * stride
-
-    out = out.reshape(bs, -1, num_outputs)
-
-    return out
+    return _get_decoder((stride,), num_outputs).parse([out]).copy()
 
 
 def parse_yolo_outputs(
     outputs: List[np.ndarray], strides: List[int], num_outputs: int
 ) -> np.ndarray:
     """Parse all outputs of an YOLO model (all channels)."""
-    output = None
-
-    for out_head, stride in zip(outputs, strides):
-        out = parse_yolo_output(
-            out_head,
-            stride,
-            num_outputs,
-        )
-        output = out if output is None else np.concatenate((output, out), axis=1)
-
-    return output
+    return _get_decoder(tuple(strides), num_outputs).parse(outputs).copy()
 
 
 def decode_yolo_output(
@@ -197,13 +508,5 @@ def decode_yolo_output(
     num_classes: int = 1,
 ) -> np.ndarray:
     """Decode the output of an YOLO instance segmentation or pose estimation model."""
-    num_outputs = num_classes + 5
-    output = parse_yolo_outputs(yolo_outputs, strides, num_outputs)
-    output_nms = non_max_suppression(
-        output,
-        conf_thres=conf_thres,
-        iou_thres=iou_thres,
-        num_classes=num_classes,
-    )[0]
-
-    return output_nms
+    decoder = _get_decoder(tuple(strides), num_classes + 5)
+    return decoder.decode(yolo_outputs, conf_thres, iou_thres)[0]
@@ -7,6 +7,8 @@ from depthai_nodes import SECONDARY_COLOR
 import math
 import cv2
 
+from .track_store import TrackStore
+
 MAX_X = 5000  # mm
 MAX_Z = 15000
 
@@ -14,7 +16,7 @@ MAX_Z = 15000
 class CollisionAvoidanceNode(dai.node.HostNode):
     def __init__(self):
         super().__init__()
-        self.object_coordinates = {}
+        self.object_coordinates = TrackStore()
         self.out_direction = self.createOutput()
 
     def build(
@@ -26,20 +28,17 @@ class CollisionAvoidanceNode(dai.node.HostNode):
         return self
 
     def moving_forward(self, tracklet_id, moving_threshold=100):
-        z_values = self.object_coordinates[tracklet_id]["z"]
-        if len(z_values) < 2:
+        track = self.object_coordinates.get(tracklet_id)
+        if track is None or track.count < 2:
             return False
-        if z_values[-1] < z_values[0] - moving_threshold:
+        if track.newest()[1] < track.oldest()[1] - moving_threshold:
             return True
         return False
 
     def calculate_metrics(self, tracklet_id):
-        x1 = self.object_coordinates[tracklet_id]["x"][0]
-        z1 = self.object_coordinates[tracklet_id]["z"][0]
-        x2 = self.object_coordinates[tracklet_id]["x"][-1]
-        z2 = self.object_coordinates[tracklet_id]["z"][-1]
-        timestamp1 = self.object_coordinates[tracklet_id]["timestamp"][0]
-        timestamp2 = self.object_coordinates[tracklet_id]["timestamp"][-1]
+        track = self.object_coordinates.get(tracklet_id)
+        x1, z1, timestamp1 = track.oldest()
+        x2, z2, timestamp2 = track.newest()
         lf_distance = math.sqrt(math.pow(x1 - x2, 2) + math.pow(z1 - z2, 2))
         if lf_distance == 0:
             return 0, 0, 0
@@ -86,6 +85,8 @@ class CollisionAvoidanceNode(dai.node.HostNode):
         annotation_helper = AnnotationHelper()
 
         mbs = []
+        removed_ids = []
+        timestamp = tracklets.getTimestamp().total_seconds()
 
         for tracklet in tracklets.tracklets:
             xmin = tracklet.roi.topLeft().x
@@ -93,33 +94,25 @@ class CollisionAvoidanceNode(dai.node.HostNode):
             xmax = tracklet.roi.bottomRight().x
             ymax = tracklet.roi.bottomRight().y
 
-            if tracklet.id not in self.object_coordinates:
-                self.object_coordinates[tracklet.id] = {
-                    "x": [tracklet.spatialCoordinates.x],
-                    "z": [tracklet.spatialCoordinates.z],
-                    "timestamp": [tracklets.getTimestamp().total_seconds()],
-                }
+            if tracklet.status in (
+                dai.Tracklet.TrackingStatus.REMOVED,
+                dai.Tracklet.TrackingStatus.LOST,
+            ):
+                removed_ids.append(tracklet.id)
+                track = None
             else:
-                self.object_coordinates[tracklet.id]["x"].append(
-                    tracklet.spatialCoordinates.x
-                )
-                self.object_coordinates[tracklet.id]["z"].append(
-                    tracklet.spatialCoordinates.z
-                )
-                self.object_coordinates[tracklet.id]["timestamp"].append(
-                    tracklets.getTimestamp().total_seconds()
+                track = self.object_coordinates.update(
+                    tracklet.id,
+                    tracklet.spatialCoordinates.x,
+                    tracklet.spatialCoordinates.z,
+                    timestamp,
                 )
 
-            if len(self.object_coordinates[tracklet.id]["x"]) > 10:
+            if track is not None and track.full:
                 # we have enough data to fit a line
-                self.object_coordinates[tracklet.id]["x"].pop(0)
-                self.object_coordinates[tracklet.id]["z"].pop(0)
-                try:
-                    m, b = np.polyfit(
-                        self.object_coordinates[tracklet.id]["x"],
-                        self.object_coordinates[tracklet.id]["z"],
-                        1,
-                    )
+                line = track.fit_line()
+                if line is not None:
+                    m, b = line
                     distance = abs(b) / math.sqrt(math.pow(m, 2) + 1)
                     mbs.append((m, b))
 
@@ -138,8 +131,6 @@ class CollisionAvoidanceNode(dai.node.HostNode):
                             color=(1, 0, 0, 1),
                             size=64,
                         )
-                except np.linalg.LinAlgError:
-                    pass
 
             annotation_helper.draw_rectangle(
                 top_left=(xmin, ymin),
@@ -154,6 +145,8 @@ class CollisionAvoidanceNode(dai.node.HostNode):
                 size=8,
             )
 
+        self.object_coordinates.evict(timestamp, removed_ids)
+
         annotations = annotation_helper.build(
             timestamp=tracklets.getTimestamp(), sequence_num=tracklets.getSequenceNum()
         )
@@ -0,0 +1,118 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+HISTORY_SIZE = 10  # samples per track used for the line fit
+TRACK_TIMEOUT = 2.0  # seconds without an update before a track is evicted
+
+
+class TrackHistory:
+    """Fixed-size ring buffer of (x, z, timestamp) samples of one track.
+
+    Keeps running sums of the buffered samples so the least-squares line
+    z = m * x + b can be refit in O(1) per new sample.
+    """
+
+    def __init__(self, size: int = HISTORY_SIZE) -> None:
+        self.size = size
+        self._samples = np.zeros((size, 3), dtype=np.float64)  # x, z, timestamp
+        self._head = 0  # index of the oldest sample
+        self.count = 0
+        self.last_seen = 0.0
+        # Running sums of x, z, x * x and x * z over the buffered samples
+        self._sum_x = self._sum_z = self._sum_xx = self._sum_xz = 0.0
+
+    @property
+    def full(self) -> bool:
+        return self.count == self.size
+
+    def _add_to_sums(self, x: float, z: float, sign: float = 1.0) -> None:
+        self._sum_x += sign * x
+        self._sum_z += sign * z
+        self._sum_xx += sign * x * x
+        self._sum_xz += sign * x * z
+
+    def append(self, x: float, z: float, timestamp: float) -> None:
+        if self.full:
+            old_x, old_z, _ = self._samples[self._head]
+            self._samples[self._head] = (x, z, timestamp)
+            self._head = (self._head + 1) % self.size
+            if self._head == 0:
+                # Recompute once per buffer cycle so rounding errors do not accumulate
+                x_values, z_values = self._samples[:, 0], self._samples[:, 1]
+                self._sum_x = float(x_values.sum())
+                self._sum_z = float(z_values.sum())
+                self._sum_xx = float(x_values @ x_values)
+                self._sum_xz = float(x_values @ z_values)
+            else:
+                self._add_to_sums(float(old_x), float(old_z), -1.0)
+                self._add_to_sums(x, z)
+        else:
+            self._samples[(self._head + self.count) % self.size] = (x, z, timestamp)
+            self.count += 1
+            self._add_to_sums(x, z)
+        self.last_seen = timestamp
+
+    def oldest(self) -> np.ndarray:
+        """(x, z, timestamp) of the oldest buffered sample."""
+        return self._samples[self._head]
+
+    def newest(self) -> np.ndarray:
+        """(x, z, timestamp) of the newest buffered sample."""
+        return self._samples[(self._head + self.count - 1) % self.size]
+
+    def fit_line(self) -> Optional[Tuple[float, float]]:
+        """Least-squares (m, b) of z = m * x + b, None if x does not vary."""
+        sum_x, sum_z = self._sum_x, self._sum_z
+        sum_xx, sum_xz = self._sum_xx, self._sum_xz
+        n = self.count
+        denominator = n * sum_xx - sum_x * sum_x
+        if n < 2 or abs(denominator) <= 1e-9 * max(1.0, n * sum_xx):
+            return None
+        m = (n * sum_xz - sum_x * sum_z) / denominator
+        b = (sum_z - m * sum_x) / n
+        return m, b
+
+
+class TrackStore:
+    """Bounded per-track history, keyed by tracklet ID.
+
+    Tracks are evicted when the tracker reports them as REMOVED or LOST, or
+    when they have not been updated for `timeout` seconds, so memory stays
+    bounded by the number of currently active tracks.
+    """
+
+    def __init__(
+        self, history_size: int = HISTORY_SIZE, timeout: float = TRACK_TIMEOUT
+    ) -> None:
+        self.history_size = history_size
+        self.timeout = timeout
+        self._tracks: Dict[int, TrackHistory] = {}
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def get(self, track_id: int) -> Optional[TrackHistory]:
+        return self._tracks.get(track_id)
+
+    def update(
+        self, track_id: int, x: float, z: float, timestamp: float
+    ) -> TrackHistory:
+        track = self._tracks.get(track_id)
+        if track is None:
+            track = TrackHistory(self.history_size)
+            self._tracks[track_id] = track
+        track.append(x, z, timestamp)
+        return track
+
+    def evict(self, timestamp: float, removed_ids: Iterable[int] = ()) -> None:
+        """Drops `removed_ids` and all tracks not updated within the timeout."""
+        for track_id in removed_ids:
+            self._tracks.pop(track_id, None)
+        stale = [
+            track_id
+            for track_id, track in self._tracks.items()
+            if timestamp - track.last_seen > self.timeout
+        ]
+        for track_id in stale:
+            del self._tracks[track_id]
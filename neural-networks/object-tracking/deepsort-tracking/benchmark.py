@@ -0,0 +1,99 @@
+"""Benchmark of DeepSORT appearance matching over a long synthetic sequence.
+
+Feeds `NearestNeighborDistanceMetric` the way `Tracker.update` does: every frame
+each confirmed track adds its newest feature and all detections are matched
+against all tracks. Tracks leave and enter the scene over time. Runs without a
+device and prints the cost per frame for consecutive windows of the sequence,
+which stays flat as long as the feature budget is bounded.
+
+    python3 benchmark.py                          # 1 hour at 30 FPS, budget 100
+    python3 benchmark.py --minutes 5 --budget 0   # without budget, for comparison
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from deep_sort_realtime.deep_sort.nn_matching import NearestNeighborDistanceMetric
+
+FEATURE_DIM = 512
+NN_BUDGET = 100  # as in utils/deepsort_tracking.py
+MAX_COSINE_DISTANCE = 0.2
+
+
+def run(minutes: float, fps: int, num_tracks: int, budget, windows: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    metric = NearestNeighborDistanceMetric("cosine", MAX_COSINE_DISTANCE, budget)
+
+    num_frames = int(minutes * 60 * fps)
+    window_size = max(num_frames // windows, 1)
+    appearances = rng.normal(size=(num_tracks, FEATURE_DIM)).astype(np.float32)
+    track_ids = np.arange(num_tracks)
+    next_id = num_tracks
+    mean_lifetime = 60 * fps  # tracks stay in the scene for a minute on average
+
+    window_times = []
+    frame_times = []
+    for frame in range(num_frames):
+        # Replace tracks that left the scene with new ones
+        leaving = np.flatnonzero(rng.random(num_tracks) < 1 / mean_lifetime)
+        for index in leaving:
+            track_ids[index] = next_id
+            appearances[index] = rng.normal(size=FEATURE_DIM)
+            next_id += 1
+
+        features = appearances + rng.normal(0, 0.1, (num_tracks, FEATURE_DIM)).astype(
+            np.float32
+        )
+
+        start = time.perf_counter()
+        metric.partial_fit(features, track_ids, track_ids.tolist())
+        metric.distance(features, track_ids)
+        frame_times.append(time.perf_counter() - start)
+
+        if len(frame_times) == window_size or frame == num_frames - 1:
+            window_times.append(np.array(frame_times) * 1000.0)
+            frame_times = []
+
+    return window_times, window_size / fps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "-m", "--minutes", type=float, default=60, help="Length of the sequence."
+    )
+    parser.add_argument("--fps", type=int, default=30, help="Frames per second.")
+    parser.add_argument(
+        "-t", "--tracks", type=int, default=20, help="Tracks in the scene."
+    )
+    parser.add_argument(
+        "-b",
+        "--budget",
+        type=int,
+        default=NN_BUDGET,
+        help="Features kept per track, 0 for no budget.",
+    )
+    parser.add_argument(
+        "-w", "--windows", type=int, default=12, help="Number of reported windows."
+    )
+    args = parser.parse_args()
+
+    budget = args.budget or None
+    window_times, window_seconds = run(
+        args.minutes, args.fps, args.tracks, budget, args.windows
+    )
+    print(
+        f"{args.tracks} tracks, budget {budget}, {args.fps} FPS, "
+        f"windows of {window_seconds / 60:.1f} min"
+    )
+    print(f"{'window':>8}{'mean ms/frame':>16}{'p99 ms/frame':>16}")
+    for index, times in enumerate(window_times):
+        print(f"{index:>8}{times.mean():>16.3f}{np.percentile(times, 99):>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,105 +2,16 @@
 import numpy as np
 
 
-def _pdist(a, b):
-    """Compute pair-wise squared distance between points in `a` and `b`.
-
-    Parameters
-    ----------
-    a : array_like
-        An NxM matrix of N samples of dimensionality M.
-    b : array_like
-        An LxM matrix of L samples of dimensionality M.
-
-    Returns
-    -------
-    ndarray
-        Returns a matrix of size len(a), len(b) such that eleement (i, j)
-        contains the squared distance between `a[i]` and `b[j]`.
-
-    """
-    a, b = np.asarray(a), np.asarray(b)
-    if len(a) == 0 or len(b) == 0:
-        return np.zeros((len(a), len(b)))
-    a2, b2 = np.square(a).sum(axis=1), np.square(b).sum(axis=1)
-    r2 = -2.0 * np.dot(a, b.T) + a2[:, None] + b2[None, :]
-    r2 = np.clip(r2, 0.0, float(np.inf))
-    return r2
-
-
-def _cosine_distance(a, b, data_is_normalized=False):
-    """Compute pair-wise cosine distance between points in `a` and `b`.
-
-    Parameters
-    ----------
-    a : array_like
-        An NxM matrix of N samples of dimensionality M.
-    b : array_like
-        An LxM matrix of L samples of dimensionality M.
-    data_is_normalized : Optional[bool]
-        If True, assumes rows in a and b are unit length vectors.
-        Otherwise, a and b are explicitly normalized to lenght 1.
-
-    Returns
-    -------
-    ndarray
-        Returns a matrix of size len(a), len(b) such that eleement (i, j)
-        contains the squared distance between `a[i]` and `b[j]`.
-
-    """
-    if not data_is_normalized:
-        a = np.asarray(a) / np.linalg.norm(a, axis=1, keepdims=True)
-        b = np.asarray(b) / np.linalg.norm(b, axis=1, keepdims=True)
-    return 1.0 - np.dot(a, b.T)
-
-
-def _nn_euclidean_distance(x, y):
-    """Helper function for nearest neighbor distance metric (Euclidean).
-
-    Parameters
-    ----------
-    x : ndarray
-        A matrix of N row-vectors (sample points).
-    y : ndarray
-        A matrix of M row-vectors (query points).
-
-    Returns
-    -------
-    ndarray
-        A vector of length M that contains for each entry in `y` the
-        smallest Euclidean distance to a sample in `x`.
-
-    """
-    distances = _pdist(x, y)
-    return np.maximum(0.0, distances.min(axis=0))
-
-
-def _nn_cosine_distance(x, y):
-    """Helper function for nearest neighbor distance metric (cosine).
-
-    Parameters
-    ----------
-    x : ndarray
-        A matrix of N row-vectors (sample points).
-    y : ndarray
-        A matrix of M row-vectors (query points).
-
-    Returns
-    -------
-    ndarray
-        A vector of length M that contains for each entry in `y` the
-        smallest cosine distance to a sample in `x`.
-
-    """
-    distances = _cosine_distance(x, y)
-    return distances.min(axis=0)
-
-
 class NearestNeighborDistanceMetric(object):
     """
     A nearest neighbor distance metric that, for each target, returns
     the closest distance to any sample that has been observed so far.
 
+    The samples of all targets are kept in one preallocated array of shape
+    (num_target_slots, samples_per_target, M). Each target owns one slot that
+    acts as a ring buffer of its most recent samples, so `distance` computes the
+    cost matrix of all targets with one batched matrix product.
+
     Parameters
     ----------
     metric : str
@@ -114,22 +25,83 @@ class NearestNeighborDistanceMetric(object):
 
     Attributes
     ----------
-    samples : Dict[int -> List[ndarray]]
-        A dictionary that maps from target identities to the list of samples
-        that have been observed so far.
+    samples : Dict[int -> ndarray]
+        A dictionary that maps from target identities to the samples that are
+        currently stored, oldest first.
 
     """
 
+    _INITIAL_SLOTS = 16
+    _INITIAL_SAMPLES = 16  # samples per target while no budget is set
+
     def __init__(self, metric, matching_threshold, budget=None):
-        if metric == "euclidean":
-            self._metric = _nn_euclidean_distance
-        elif metric == "cosine":
-            self._metric = _nn_cosine_distance
-        else:
+        if metric not in ("euclidean", "cosine"):
             raise ValueError("Invalid metric; must be either 'euclidean' or 'cosine'")
+        if budget is not None and budget < 1:
+            raise ValueError("Invalid budget; must be None or a positive integer")
+        self._cosine = metric == "cosine"
         self.matching_threshold = matching_threshold
         self.budget = budget
-        self.samples = {}
+
+        self._slots = {}  # target -> slot
+        self._free_slots = []
+        self._features = None  # (slots, samples, M), allocated on first partial_fit
+        self._sq_norms = None  # (slots, samples), squared norms for "euclidean"
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._heads = np.zeros(0, dtype=np.int64)  # next write position
+
+    @property
+    def samples(self):
+        samples = {}
+        for target, slot in self._slots.items():
+            count, head = self._counts[slot], self._heads[slot]
+            order = (head - count + np.arange(count)) % self._features.shape[1]
+            samples[target] = self._features[slot, order]
+        return samples
+
+    def _allocate(self, num_slots, num_samples, dim, dtype):
+        features = np.zeros((num_slots, num_samples, dim), dtype=dtype)
+        sq_norms = np.zeros((num_slots, num_samples), dtype=dtype)
+        counts = np.zeros(num_slots, dtype=np.int64)
+        heads = np.zeros(num_slots, dtype=np.int64)
+        if self._features is not None:
+            # Buffers only grow without a budget, when they never wrap around
+            old_slots, old_samples = self._features.shape[:2]
+            features[:old_slots, :old_samples] = self._features
+            sq_norms[:old_slots, :old_samples] = self._sq_norms
+            counts[:old_slots] = self._counts
+            heads[:old_slots] = self._heads
+            self._free_slots.extend(range(num_slots - 1, old_slots - 1, -1))
+        else:
+            self._free_slots = list(range(num_slots - 1, -1, -1))
+        self._features, self._sq_norms = features, sq_norms
+        self._counts, self._heads = counts, heads
+
+    def _slot(self, target):
+        slot = self._slots.get(target)
+        if slot is None:
+            if not self._free_slots:
+                num_slots, num_samples, dim = self._features.shape
+                self._allocate(2 * num_slots, num_samples, dim, self._features.dtype)
+            slot = self._free_slots.pop()
+            self._counts[slot] = 0
+            self._heads[slot] = 0
+            self._slots[target] = slot
+        return slot
+
+    def _append(self, slot, feature, sq_norm):
+        num_slots, num_samples, dim = self._features.shape
+        head = self._heads[slot]
+        if self.budget is None:
+            # Without a budget, buffers grow instead of wrapping around
+            if head == num_samples:
+                self._allocate(num_slots, 2 * num_samples, dim, self._features.dtype)
+            self._heads[slot] = head + 1
+        else:
+            self._heads[slot] = (head + 1) % num_samples
+        self._features[slot, head] = feature
+        self._sq_norms[slot, head] = sq_norm
+        self._counts[slot] = min(self._counts[slot] + 1, self._features.shape[1])
 
     def partial_fit(self, features, targets, active_targets):
         """Update the distance metric with new data.
@@ -144,11 +116,26 @@ class NearestNeighborDistanceMetric(object):
             A list of targets that are currently present in the scene.
 
         """
-        for feature, target in zip(features, targets):
-            self.samples.setdefault(target, []).append(feature)
-            if self.budget is not None:
-                self.samples[target] = self.samples[target][-self.budget :]
-        self.samples = {k: self.samples[k] for k in active_targets}
+        features = np.asarray(features)
+        if len(features):
+            features = features.reshape(len(features), -1)
+            if self._features is None:
+                num_samples = (
+                    self.budget if self.budget is not None else self._INITIAL_SAMPLES
+                )
+                dtype = np.result_type(features.dtype, np.float32)
+                self._allocate(
+                    self._INITIAL_SLOTS, num_samples, features.shape[1], dtype
+                )
+            if self._cosine:
+                features = features / np.linalg.norm(features, axis=1, keepdims=True)
+            sq_norms = np.square(features).sum(axis=1)
+            for feature, sq_norm, target in zip(features, sq_norms, targets):
+                self._append(self._slot(target), feature, sq_norm)
+
+        active_targets = set(active_targets)
+        for target in [t for t in self._slots if t not in active_targets]:
+            self._free_slots.append(self._slots.pop(target))
 
     def distance(self, features, targets):
         """Compute distance between features and targets.
@@ -168,7 +155,32 @@ class NearestNeighborDistanceMetric(object):
             `targets[i]` and `features[j]`.
 
         """
-        cost_matrix = np.zeros((len(targets), len(features)))
-        for i, target in enumerate(targets):
-            cost_matrix[i, :] = self._metric(self.samples[target], features)
-        return cost_matrix
+        features = np.asarray(features)
+        if len(targets) == 0 or len(features) == 0:
+            return np.zeros((len(targets), len(features)))
+        features = features.reshape(len(features), -1).astype(
+            self._features.dtype, copy=False
+        )
+        slots = np.array([self._slots[target] for target in targets])
+        samples = self._features[slots]  # (T, S, M)
+        num_samples = samples.shape[1]
+
+        # (T, S, N) similarity of every stored sample to every feature
+        products = samples.reshape(-1, samples.shape[2]) @ features.T
+        products = products.reshape(len(slots), num_samples, len(features))
+        if self._cosine:
+            norms = np.linalg.norm(features, axis=1)
+            distances = 1.0 - products / norms
+        else:
+            feature_sq_norms = np.square(features).sum(axis=1)
+            distances = (
+                -2.0 * products
+                + self._sq_norms[slots][:, :, None]
+                + feature_sq_norms[None, None, :]
+            )
+            distances = np.clip(distances, 0.0, float(np.inf))
+
+        # Ignore the unused entries of ring buffers that are not full yet
+        unused = np.arange(num_samples)[None, :] >= self._counts[slots][:, None]
+        distances[unused] = np.inf
+        return distances.min(axis=1).astype(np.float64)
@@ -289,3 +289,9 @@ class DeepSort(object):
 
     def delete_all_tracks(self):
         self.tracker.delete_all_tracks()
+
+    def close(self):
+        """Releases the resources of the embedder, if any."""
+        embedder = getattr(self, "embedder", None)
+        if embedder is not None:
+            embedder.close()
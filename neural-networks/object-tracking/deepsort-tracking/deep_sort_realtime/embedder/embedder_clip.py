@@ -5,15 +5,10 @@ import clip
 import cv2
 import numpy as np
 import torch
-from PIL import Image
-
-logger = logging.getLogger(__name__)
 
+from .preprocess import CLIP_MEAN, CLIP_STD, BatchPreprocessor
 
-def _batch(iterable, bs=1):
-    l = len(iterable)
-    for ndx in range(0, l, bs):
-        yield iterable[ndx : min(ndx + bs, l)]
+logger = logging.getLogger(__name__)
 
 
 class Clip_Embedder(object):
@@ -55,6 +50,19 @@ class Clip_Embedder(object):
 
         self.max_batch_size = max_batch_size
         self.bgr = bgr
+        # Same steps as self.img_preprocess (bicubic resize of the shorter side, center
+        # crop, normalise), done a whole batch at a time. INTER_AREA stands in for the
+        # antialiasing of PIL's bicubic resize when shrinking crops
+        self.preprocessor = BatchPreprocessor(
+            self.model.visual.input_resolution,
+            max_batch_size,
+            bgr=bgr,
+            mean=CLIP_MEAN,
+            std=CLIP_STD,
+            center_crop=True,
+            interpolation=cv2.INTER_CUBIC,
+            downscale_interpolation=cv2.INTER_AREA,
+        )
 
         logger.info("Clip Embedder for Deep Sort initialised")
         logger.info(f"- gpu enabled: {gpu}")
@@ -79,21 +87,14 @@ class Clip_Embedder(object):
         list of features (np.array with dim = 1024)
 
         """
-        if not np_images:
-            return []
-
-        if self.bgr:
-            np_images = [cv2.cvtColor(img, cv2.COLOR_BGR2RGB) for img in np_images]
-
-        pil_images = [
-            self.img_preprocess(Image.fromarray(rgb)).to(self.device)
-            for rgb in np_images
-        ]
-
         all_feats = []
-        for this_batch in _batch(pil_images, bs=self.max_batch_size):
-            batch = torch.stack(this_batch, 0)
+        for this_batch in self.preprocessor.batches(np_images):
+            batch = torch.from_numpy(this_batch).to(self.device)
             with torch.no_grad():
                 feats = self.model.encode_image(batch)
             all_feats.extend(feats.cpu().data.numpy())
         return all_feats
+
+    def close(self):
+        """Shuts down the preprocessing thread pool."""
+        self.preprocessor.close()
@@ -1,24 +1,17 @@
 import logging
 
-import cv2
 import numpy as np
 
 # import pkg_resources
 import torch
 import torch.nn as nn
-from torchvision.transforms import transforms
 
+from .preprocess import BatchPreprocessor
 
 logger = logging.getLogger(__name__)
 INPUT_WIDTH = 224
 
 
-def batch(iterable, bs=1):
-    l = len(iterable)
-    for ndx in range(0, l, bs):
-        yield iterable[ndx : min(ndx + bs, l)]
-
-
 class Identity(nn.Module):
     def __init__(self):
         super(Identity, self).__init__()
@@ -67,6 +60,7 @@ class MobileNetv2_Embedder(object):
 
         self.max_batch_size = max_batch_size
         self.bgr = bgr
+        self.preprocessor = BatchPreprocessor(INPUT_WIDTH, max_batch_size, bgr=bgr)
 
         logger.info("MobileNetV2 Embedder for Deep Sort initialised")
         logger.info(f"- gpu enabled: {self.gpu}")
@@ -91,33 +85,15 @@ class MobileNetv2_Embedder(object):
         Torch Tensor
 
         """
-        if self.bgr:
-            np_image_rgb = np_image[..., ::-1]
-        else:
-            np_image_rgb = np_image
-
-        input_image = cv2.resize(np_image_rgb, (INPUT_WIDTH, INPUT_WIDTH))
-
-        input_image = torch.from_numpy(input_image)
-        input_image = input_image.float().permute(2, 0, 1) / 255.0
-
-        # logger.info(f'input_image: {input_image.shape}') #, min: {np.amin(input_image)}, max: {np.amax(input_image)}')
-        trans = transforms.Compose(
-            [
-                transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
-                ),
-            ]
-        )
-        input_image = trans(input_image)
-        input_image = input_image.view(1, 3, INPUT_WIDTH, INPUT_WIDTH)
-
-        return input_image
+        input_image = next(self.preprocessor.batches([np_image]))
+        return torch.from_numpy(input_image.copy())
 
     def predict(self, np_images):
         """
         batch inference
 
+        Crops are preprocessed a whole batch at a time into reused buffers, see BatchPreprocessor.
+
         Params
         ------
         np_images : list of ndarray
@@ -130,17 +106,19 @@ class MobileNetv2_Embedder(object):
         """
         all_feats = []
 
-        preproc_imgs = [self.preprocess(img) for img in np_images]
-
-        for this_batch in batch(preproc_imgs, bs=self.max_batch_size):
-            this_batch = torch.cat(this_batch, dim=0)
+        for this_batch in self.preprocessor.batches(np_images):
+            this_batch = torch.from_numpy(this_batch)
             if self.gpu:
                 this_batch = this_batch.cuda()
                 if self.half:
                     this_batch = this_batch.half()
-            # print(this_batch.shape)
-            output = self.model.forward(this_batch)
+            with torch.no_grad():
+                output = self.model.forward(this_batch)
 
             all_feats.extend(output.cpu().data.numpy())
 
         return all_feats
+
+    def close(self):
+        """Shuts down the preprocessing thread pool."""
+        self.preprocessor.close()
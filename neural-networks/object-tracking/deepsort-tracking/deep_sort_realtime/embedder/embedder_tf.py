@@ -2,11 +2,12 @@ import os
 import logging
 from pathlib import Path
 
-import cv2
 import numpy as np
 import pkg_resources
 import tensorflow as tf
 
+from .preprocess import BatchPreprocessor
+
 MOBILENETV2_BOTTLENECK_WTS = pkg_resources.resource_filename(
     "deep_sort_realtime",
     "embedder/weights/mobilenet_v2_weights_tf_dim_ordering_tf_kernels_1.0_224.h5",
@@ -23,12 +24,6 @@ if gpus:
 INPUT_WIDTH = 224
 
 
-def batch(iterable, bs=1):
-    l = len(iterable)
-    for ndx in range(0, l, bs):
-        yield iterable[ndx : min(ndx + bs, l)]
-
-
 def get_mobilenetv2_with_preproc(wts="imagenet"):
     i = tf.keras.layers.Input([None, None, 3], dtype=tf.uint8)
     x = tf.cast(i, tf.float32)
@@ -75,6 +70,10 @@ class MobileNetv2_Embedder(object):
 
         self.max_batch_size = max_batch_size
         self.bgr = bgr
+        # The model normalises its uint8 input itself
+        self.preprocessor = BatchPreprocessor(
+            INPUT_WIDTH, max_batch_size, bgr=bgr, mean=None
+        )
 
         logger.info("MobileNetV2 Embedder (tf) for Deep Sort initialised")
         logger.info(f"- max batch size: {self.max_batch_size}")
@@ -95,17 +94,15 @@ class MobileNetv2_Embedder(object):
         TF Tensor
 
         """
-        if self.bgr:
-            np_image_rgb = np_image[..., ::-1]
-        else:
-            np_image_rgb = np_image
-        np_image_rgb = cv2.resize(np_image_rgb, (INPUT_WIDTH, INPUT_WIDTH))
+        np_image_rgb = next(self.preprocessor.batches([np_image]))[0]
         return tf.convert_to_tensor(np_image_rgb)
 
     def predict(self, np_images):
         """
         batch inference
 
+        Crops are preprocessed a whole batch at a time into reused buffers, see BatchPreprocessor.
+
         Params
         ------
         np_images : list of ndarray
@@ -118,11 +115,12 @@ class MobileNetv2_Embedder(object):
         """
         all_feats = []
 
-        preproc_imgs = [self.preprocess(img) for img in np_images]
-
-        for this_batch in batch(preproc_imgs, bs=self.max_batch_size):
-            this_batch = tf.stack(this_batch, axis=0)
-            output = self.model(this_batch)
+        for this_batch in self.preprocessor.batches(np_images):
+            output = self.model(tf.convert_to_tensor(this_batch))
             all_feats.extend(output.numpy())
 
         return all_feats
+
+    def close(self):
+        """Shuts down the preprocessing thread pool."""
+        self.preprocessor.close()
@@ -0,0 +1,158 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+# Below this number of crops, resizing on the calling thread is faster than
+# dispatching to the pool
+MIN_PARALLEL_CROPS = 4
+# Crops shrunk below this scale are resized with downscale_interpolation. Closer to 1,
+# the plain interpolation is the closer match of PIL's antialiased resize
+DOWNSCALE_THRESHOLD = 0.75
+
+
+class BatchPreprocessor(object):
+    """
+    Shared preprocessing stage of the embedders: resizes crops into preallocated batch buffers.
+
+    Crops are resized and flipped to RGB on a CPU thread pool (OpenCV releases the GIL)
+    straight into one reused (max_batch_size x H x W x 3) uint8 buffer. Scaling,
+    normalisation and the NCHW transpose are then done for the whole batch in one
+    vectorised operation into a second reused float32 buffer, so no per-crop tensors or
+    transforms are created.
+
+    Params
+    ------
+    - size (int or (int, int)) : output (width, height) of every crop
+    - max_batch_size (optional, int) : number of crops per batch, defaults to 16
+    - bgr (optional, Bool) : boolean flag indicating if input crops are bgr or not, defaults to True
+    - mean, std (optional, tuple of 3 floats) : per-channel (RGB) normalisation applied after scaling to [0, 1]. If None, batches are returned as uint8 NHWC RGB without normalisation.
+    - center_crop (optional, Bool) : if True, crops are resized to cover the output size with their aspect ratio kept and then cut to the output size around their center (like torchvision Resize + CenterCrop) instead of being stretched
+    - interpolation (optional, int) : OpenCV interpolation flag, defaults to cv2.INTER_LINEAR
+    - downscale_interpolation (optional, int) : OpenCV interpolation flag used instead of interpolation for crops shrunk below DOWNSCALE_THRESHOLD, e.g. cv2.INTER_AREA to antialias like PIL. Defaults to None, always using interpolation
+    - num_workers (optional, int) : size of the thread pool, defaults to the number of CPUs (at most 8)
+    """
+
+    def __init__(
+        self,
+        size,
+        max_batch_size=16,
+        bgr=True,
+        mean=IMAGENET_MEAN,
+        std=IMAGENET_STD,
+        center_crop=False,
+        interpolation=cv2.INTER_LINEAR,
+        downscale_interpolation=None,
+        num_workers=None,
+    ):
+        if isinstance(size, int):
+            size = (size, size)
+        self.width, self.height = size
+        self.max_batch_size = max_batch_size
+        self.bgr = bgr
+        self.center_crop = center_crop
+        self.interpolation = interpolation
+        self.downscale_interpolation = downscale_interpolation
+        self.normalize = mean is not None
+
+        self._resized = np.empty(
+            (max_batch_size, self.height, self.width, 3), dtype=np.uint8
+        )
+        if self.normalize:
+            # (x / 255 - mean) / std == x * scale + offset
+            std = np.asarray(std, dtype=np.float32)
+            self._scale = (1.0 / (255.0 * std)).reshape(1, 3, 1, 1)
+            self._offset = (-np.asarray(mean, dtype=np.float32) / std).reshape(
+                1, 3, 1, 1
+            )
+            self._normalized = np.empty(
+                (max_batch_size, 3, self.height, self.width), dtype=np.float32
+            )
+
+        if num_workers is None:
+            num_workers = min(os.cpu_count() or 1, 8)
+        self._pool = (
+            ThreadPoolExecutor(max_workers=num_workers) if num_workers > 1 else None
+        )
+
+    def _resize(self, crop, size, dst=None):
+        interpolation = self.interpolation
+        if self.downscale_interpolation is not None and (
+            size[0] < DOWNSCALE_THRESHOLD * crop.shape[1]
+            or size[1] < DOWNSCALE_THRESHOLD * crop.shape[0]
+        ):
+            interpolation = self.downscale_interpolation
+        return cv2.resize(crop, size, dst=dst, interpolation=interpolation)
+
+    def _resize_and_cut(self, crop, dst):
+        h, w = crop.shape[:2]
+        # Shorter side (relative to the output) to the output size, aspect ratio kept
+        scale = max(self.width / w, self.height / h)
+        new_w = max(int(w * scale), self.width)
+        new_h = max(int(h * scale), self.height)
+        resized = self._resize(crop, (new_w, new_h))
+        top = int(round((new_h - self.height) / 2.0))
+        left = int(round((new_w - self.width) / 2.0))
+        dst[:] = resized[top : top + self.height, left : left + self.width]
+
+    def _resize_into(self, index, crop):
+        resized = self._resized[index]
+        if self.center_crop:
+            self._resize_and_cut(crop, resized)
+        else:
+            self._resize(crop, (self.width, self.height), dst=resized)
+        if self.bgr:
+            cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=resized)
+
+    def _resize_batch(self, crops):
+        if self._pool is None or len(crops) < MIN_PARALLEL_CROPS:
+            for index, crop in enumerate(crops):
+                self._resize_into(index, crop)
+        else:
+            # list() waits for all crops and re-raises errors of the workers
+            list(self._pool.map(self._resize_into, range(len(crops)), crops))
+
+    def batches(self, crops):
+        """
+        Yields preprocessed batches of at most max_batch_size crops, in order.
+
+        The yielded arrays are views of buffers reused for the next batch, consume (or copy)
+        them before advancing the generator.
+
+        Params
+        ------
+        crops : list of ndarray
+            list of (H x W x 3) uint8 crops, bgr or rgb according to self.bgr
+
+        Yields
+        ------
+        ndarray
+            (N x 3 x H x W) float32 normalised RGB batch, or (N x H x W x 3) uint8 RGB batch
+            if no normalisation is set
+        """
+        for start in range(0, len(crops), self.max_batch_size):
+            chunk = crops[start : start + self.max_batch_size]
+            n = len(chunk)
+            self._resize_batch(chunk)
+
+            resized = self._resized[:n]
+            if not self.normalize:
+                yield resized
+                continue
+
+            normalized = self._normalized[:n]
+            np.multiply(resized.transpose(0, 3, 1, 2), self._scale, out=normalized)
+            normalized += self._offset
+            yield normalized
+
+    def close(self):
+        """Shuts down the thread pool, later batches are preprocessed serially."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
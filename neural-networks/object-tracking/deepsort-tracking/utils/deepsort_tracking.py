@@ -5,13 +5,17 @@ from typing import List
 from depthai_nodes import GatheredData
 from .visualized_tracklets import VisualizedTracklets
 
+# Appearance features kept per track. Without a budget, memory and matching cost
+#  grow with the lifetime of every track
+NN_BUDGET = 100
+
 
 class DeepsortTracking(dai.node.HostNode):
     def __init__(self) -> None:
         super().__init__()
         self._tracker = DeepSort(
             max_age=1000,
-            nn_budget=None,
+            nn_budget=NN_BUDGET,
             embedder=None,
             nms_max_overlap=1.0,
             max_cosine_distance=0.2,
@@ -83,3 +87,6 @@ class DeepsortTracking(dai.node.HostNode):
     @property
     def out(self) -> dai.Node.Output:
         return self._out
+
+    def onStop(self) -> None:
+        self._tracker.close()
@@ -0,0 +1,93 @@
+"""Micro-benchmark of per-track Kalman filters against the batched filter bank.
+
+Runs without a device on synthetic tracks, measuring one predict and update
+step of all tracks per frame, the way `KalmanFilterNode` uses the filters.
+
+    python3 benchmark.py
+    python3 benchmark.py --tracks 10 100 1000 --frames 200
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from utils.kalman_filter import KalmanFilter, KalmanFilterBank
+
+DIM_Z = 4  # bounding box filter: x, y, width, height
+ACC_STD = 0.1
+MEAS_STD = 0.05
+DT = 1 / 30
+MEASURED_FRACTION = 0.9  # share of tracks with a measurement in each frame
+
+
+def make_measurements(num_tracks: int, num_frames: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(0, 640, (num_tracks, DIM_Z))
+    velocity = rng.normal(0, 50, (num_tracks, DIM_Z))
+    steps = np.arange(num_frames)[:, None, None] * DT
+    measurements = (
+        start + velocity * steps + rng.normal(0, 2, steps.shape[:1] + start.shape)
+    )
+    measured = rng.random((num_frames, num_tracks)) < MEASURED_FRACTION
+    return start, measurements, measured
+
+
+def run_per_track(start, measurements, measured) -> float:
+    filters = [KalmanFilter(ACC_STD, MEAS_STD, z[:, None], 0.0) for z in start]
+    begin = time.perf_counter()
+    for frame_meas, frame_measured in zip(measurements, measured):
+        for kalman_filter, z, has_meas in zip(filters, frame_meas, frame_measured):
+            kalman_filter.predict(DT)
+            kalman_filter.update(z[:, None] if has_meas else None)
+    return time.perf_counter() - begin
+
+
+def run_batched(start, measurements, measured) -> float:
+    bank = KalmanFilterBank(DIM_Z)
+    slots = np.array(
+        [
+            bank.add(track_id, ACC_STD, MEAS_STD, z, 0.0)
+            for track_id, z in enumerate(start)
+        ]
+    )
+    dt = np.full(len(slots), DT)
+    begin = time.perf_counter()
+    for frame_meas, frame_measured in zip(measurements, measured):
+        bank.predict(slots, dt)
+        bank.update(slots[frame_measured], frame_meas[frame_measured])
+    return time.perf_counter() - begin
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "-t",
+        "--tracks",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000],
+        help="Numbers of simultaneous tracks to benchmark.",
+    )
+    parser.add_argument("-f", "--frames", type=int, default=100, help="Frames per run.")
+    args = parser.parse_args()
+
+    print(
+        f"{'tracks':>8}{'per-track ms/frame':>22}{'batched ms/frame':>20}"
+        f"{'per-track tracks/s':>22}{'batched tracks/s':>20}{'speedup':>10}"
+    )
+    for num_tracks in args.tracks:
+        data = make_measurements(num_tracks, args.frames)
+        per_track = run_per_track(*data) / args.frames
+        batched = run_batched(*data) / args.frames
+        print(
+            f"{num_tracks:>8}{per_track * 1000:>22.3f}{batched * 1000:>20.3f}"
+            f"{num_tracks / per_track:>22,.0f}{num_tracks / batched:>20,.0f}"
+            f"{per_track / batched:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
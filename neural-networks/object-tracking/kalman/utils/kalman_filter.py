@@ -45,3 +45,120 @@ class KalmanFilter:
         self.x = self.x + K @ (z - self.H @ self.x)
         I = np.eye(3 * self.dim_z)
         self.P = (I - K @ self.H) @ self.P @ (I - K @ self.H).T + K @ R @ K.T
+
+
+class KalmanFilterBank:
+    """Constant-acceleration Kalman filters for many tracks, stored as stacked arrays.
+
+    Every track occupies one slot of the state (N, 3 * dim_z) and covariance
+    (N, 3 * dim_z, 3 * dim_z) arrays. `predict` and `update` process all given
+    tracks with one batched numpy call instead of one small matrix product per
+    track. Slots of removed tracks are reused by new tracks and the arrays grow
+    by doubling when all slots are taken.
+    """
+
+    def __init__(self, dim_z, capacity=16):
+        self.dim_z = dim_z
+        self.dim_x = 3 * dim_z
+        self._slots = {}  # track id -> slot
+        self._free = []
+
+        # F = I + dt * F1 + dt**2 / 2 * F2, see KalmanFilter.predict
+        self._F1 = np.zeros((self.dim_x, self.dim_x))
+        np.fill_diagonal(self._F1[: 2 * dim_z, dim_z:], 1)
+        self._F2 = np.zeros((self.dim_x, self.dim_x))
+        np.fill_diagonal(self._F2[:dim_z, 2 * dim_z :], 1)
+
+        i, j = np.indices((self.dim_x, self.dim_x))
+        # initial vector is a guess -> high estimate uncertainty
+        self._P0 = np.where((i - j) % dim_z == 0, 1e5, 0.0)
+
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old_capacity = getattr(self, "capacity", 0)
+        x = np.zeros((capacity, self.dim_x))
+        P = np.zeros((capacity, self.dim_x, self.dim_x))
+        acc_std = np.zeros(capacity)
+        meas_std = np.zeros(capacity)
+        time = np.zeros(capacity)
+        if old_capacity:
+            x[:old_capacity] = self.x
+            P[:old_capacity] = self.P
+            acc_std[:old_capacity] = self.acc_std
+            meas_std[:old_capacity] = self.meas_std
+            time[:old_capacity] = self.time
+        self.x, self.P = x, P
+        self.acc_std, self.meas_std, self.time = acc_std, meas_std, time
+        self._free.extend(range(capacity - 1, old_capacity - 1, -1))
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, track_id):
+        return track_id in self._slots
+
+    def slot(self, track_id):
+        return self._slots[track_id]
+
+    def add(self, track_id, acc_std, meas_std, z, time):
+        """Starts a filter for the track at measurement `z` and returns its slot."""
+        if track_id in self._slots:
+            slot = self._slots[track_id]
+        else:
+            if not self._free:
+                self._allocate(2 * self.capacity)
+            slot = self._free.pop()
+            self._slots[track_id] = slot
+        self.x[slot] = 0
+        self.x[slot, : self.dim_z] = np.ravel(z)
+        self.P[slot] = self._P0
+        self.acc_std[slot] = acc_std
+        self.meas_std[slot] = meas_std
+        self.time[slot] = time
+        return slot
+
+    def remove(self, track_id):
+        slot = self._slots.pop(track_id, None)
+        if slot is not None:
+            self._free.append(slot)
+
+    def predict(self, slots, dt):
+        """Predicts the state of all `slots` forward by their `dt` (seconds)."""
+        slots = np.asarray(slots, dtype=np.intp)
+        dt = np.asarray(dt, dtype=np.float64)[:, None, None]
+        F = np.eye(self.dim_x) + dt * self._F1 + (dt**2 / 2) * self._F2
+        F_T = F.transpose(0, 2, 1)
+
+        # the process noise matrix Q = acc_std**2 * F @ A @ F.T where A selects
+        # the acceleration block, i.e. F[:, :, 2 * dim_z:] @ F[:, :, 2 * dim_z:].T
+        F_acc = F[:, :, 2 * self.dim_z :]
+        Q = self.acc_std[slots, None, None] ** 2 * (F_acc @ F_acc.transpose(0, 2, 1))
+
+        self.x[slots] = (F @ self.x[slots, :, None])[:, :, 0]
+        self.P[slots] = F @ self.P[slots] @ F_T + Q
+
+    def update(self, slots, z):
+        """Corrects the state of all `slots` with their (len(slots), dim_z) measurements."""
+        slots = np.asarray(slots, dtype=np.intp)
+        if slots.size == 0:
+            return
+        d = self.dim_z
+        x = self.x[slots]
+        P = self.P[slots]
+
+        # the measurement uncertainty
+        R = self.meas_std[slots, None, None] ** 2 * np.eye(d)
+
+        # the Kalman Gain, H selects the first dim_z state entries
+        S = P[:, :d, :d] + R
+        K = P[:, :, :d] @ np.linalg.inv(S)
+
+        x += (K @ (np.asarray(z, dtype=np.float64) - x[:, :d])[:, :, None])[:, :, 0]
+        I_KH = np.broadcast_to(np.eye(self.dim_x), P.shape).copy()
+        I_KH[:, :, :d] -= K
+        self.P[slots] = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ R @ K.transpose(
+            0, 2, 1
+        )
+        self.x[slots] = x
@@ -2,15 +2,21 @@ import numpy as np
 import depthai as dai
 from typing import List
 
-from .kalman_filter import KalmanFilter
+from .kalman_filter import KalmanFilterBank
 
 from depthai_nodes.utils import AnnotationHelper
 from depthai_nodes import PRIMARY_COLOR, SECONDARY_COLOR
 
+# Adjust these parameters
+ACC_STD_SPACE = 10
+ACC_STD_BBOX = 0.1
+MEAS_STD_BBOX = 0.05
+
 
 class KalmanFilterNode(dai.node.HostNode):
     def __init__(self):
-        self._kalman_filters = {}
+        self._bbox_filters = KalmanFilterBank(dim_z=4)
+        self._space_filters = KalmanFilterBank(dim_z=3)
         super().__init__()
 
     def build(
@@ -31,65 +37,71 @@ class KalmanFilterNode(dai.node.HostNode):
         assert isinstance(img_frame, dai.ImgFrame)
         assert isinstance(tracklets, dai.Tracklets)
         frame: np.ndarray = img_frame.getCvFrame()
-        current_time = tracklets.getTimestamp()
+        current_time = tracklets.getTimestamp().total_seconds()
 
         annotation_helper = AnnotationHelper()
 
+        # Collect the tracklets first so all filters are predicted and updated
+        #  with one batched call per filter bank
+        rois = []
+        filtered = []
+        bbox_updates, bbox_meas = [], []
+        space_updates, space_meas = [], []
+        removed_ids = []
         for t in tracklets.tracklets:
             roi = t.roi.denormalize(frame.shape[1], frame.shape[0])
             x1 = int(roi.topLeft().x)
             y1 = int(roi.topLeft().y)
             x2 = int(roi.bottomRight().x)
             y2 = int(roi.bottomRight().y)
+            rois.append((x1, y1, x2, y2))
 
-            x_space = t.spatialCoordinates.x
-            y_space = t.spatialCoordinates.y
             z_space = t.spatialCoordinates.z
-
-            meas_vec_bbox = np.array(
-                [[(x1 + x2) / 2], [(y1 + y2) / 2], [x2 - x1], [y2 - y1]]
-            )
-            meas_vec_space = np.array([[x_space], [y_space], [z_space]])
+            meas_vec_bbox = [(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1]
+            meas_vec_space = [t.spatialCoordinates.x, t.spatialCoordinates.y, z_space]
             meas_std_space = z_space**2 / (self._baseline * self._focal_length)
 
-            if t.status.name == "NEW":
-                # Adjust these parameters
-                acc_std_space = 10
-                acc_std_bbox = 0.1
-                meas_std_bbox = 0.05
-
-                self._kalman_filters[t.id] = {
-                    "bbox": KalmanFilter(
-                        meas_std_bbox, acc_std_bbox, meas_vec_bbox, current_time
-                    ),
-                    "space": KalmanFilter(
-                        meas_std_space, acc_std_space, meas_vec_space, current_time
-                    ),
-                }
-
-            else:
-                dt = current_time - self._kalman_filters[t.id]["bbox"].time
-                dt = dt.total_seconds()
-                self._kalman_filters[t.id]["space"].meas_std = meas_std_space
-
-                if t.status.name != "TRACKED":
-                    meas_vec_bbox = None
-                    meas_vec_space = None
-
-                if z_space == 0:
-                    meas_vec_space = None
-
-                self._kalman_filters[t.id]["bbox"].predict(dt)
-                self._kalman_filters[t.id]["bbox"].update(meas_vec_bbox)
-
-                self._kalman_filters[t.id]["space"].predict(dt)
-                self._kalman_filters[t.id]["space"].update(meas_vec_space)
-
-                self._kalman_filters[t.id]["bbox"].time = current_time
-                self._kalman_filters[t.id]["space"].time = current_time
-
-                vec_bbox = self._kalman_filters[t.id]["bbox"].x
-                vec_space = self._kalman_filters[t.id]["space"].x
+            if t.id not in self._bbox_filters and t.status.name == "REMOVED":
+                continue
+            if t.status.name == "NEW" or t.id not in self._bbox_filters:
+                # add() takes acc_std before meas_std. The values are passed in the
+                #  order this example has always used, which its filters are tuned for
+                self._bbox_filters.add(
+                    t.id, MEAS_STD_BBOX, ACC_STD_BBOX, meas_vec_bbox, current_time
+                )
+                self._space_filters.add(
+                    t.id, meas_std_space, ACC_STD_SPACE, meas_vec_space, current_time
+                )
+                continue
+
+            filtered.append(t.id)
+            space_slot = self._space_filters.slot(t.id)
+            self._space_filters.meas_std[space_slot] = meas_std_space
+
+            if t.status.name == "TRACKED":
+                bbox_updates.append(self._bbox_filters.slot(t.id))
+                bbox_meas.append(meas_vec_bbox)
+                if z_space != 0:
+                    space_updates.append(space_slot)
+                    space_meas.append(meas_vec_space)
+            elif t.status.name == "REMOVED":
+                removed_ids.append(t.id)
+
+        if filtered:
+            for filters, updates, meas in (
+                (self._bbox_filters, bbox_updates, bbox_meas),
+                (self._space_filters, space_updates, space_meas),
+            ):
+                slots = [filters.slot(track_id) for track_id in filtered]
+                filters.predict(slots, current_time - filters.time[slots])
+                filters.update(updates, meas)
+                filters.time[slots] = current_time
+
+        filtered = set(filtered)
+        for t, (x1, y1, x2, y2) in zip(tracklets.tracklets, rois):
+            if t.id in filtered:
+                vec_bbox = self._bbox_filters.x[self._bbox_filters.slot(t.id)]
+                vec_space = self._space_filters.x[self._space_filters.slot(t.id)]
 
                 x1_filter = (vec_bbox[0] - vec_bbox[2] / 2) / img_frame.getWidth()
                 x2_filter = (vec_bbox[0] + vec_bbox[2] / 2) / img_frame.getWidth()
@@ -133,7 +145,7 @@ class KalmanFilterNode(dai.node.HostNode):
             )
 
             annotation_helper.draw_text(
-                text=f"X: {int(x_space)} mm, Y: {int(y_space)} mm, Z: {int(z_space)} mm",
+                text=f"X: {int(t.spatialCoordinates.x)} mm, Y: {int(t.spatialCoordinates.y)} mm, Z: {int(t.spatialCoordinates.z)} mm",
                 position=(
                     x1 / img_frame.getWidth() + 0.02,
                     y1 / img_frame.getHeight() + 0.1,
@@ -146,3 +158,8 @@ class KalmanFilterNode(dai.node.HostNode):
             timestamp=tracklets.getTimestamp(), sequence_num=tracklets.getSequenceNum()
         )
         self.out.send(annotations)
+
+        # Free the slots of tracklets the tracker dropped
+        for track_id in removed_ids:
+            self._bbox_filters.remove(track_id)
+            self._space_filters.remove(track_id)
@@ -123,7 +123,13 @@ with dai.Pipeline(device) as pipeline:
     det_nn.out.link(gather_data_node.input_reference)
 
     # idenfication
-    id_node = pipeline.create(IdentificationNode).build(gather_data_node.out, csim=CSIM)
+    id_node = pipeline.create(IdentificationNode).build(
+        gather_data_node.out,
+        csim=CSIM,
+        gallery_capacity=args.gallery_size,
+        eviction=args.eviction,
+        gallery_path=args.gallery_path,
+    )
 
     # Visualizer
     visualizer.addTopic("Video", det_nn.passthrough, "images")
@@ -53,6 +53,34 @@ def initialize_argparser():
         type=float,
     )
 
+    parser.add_argument(
+        "-gs",
+        "--gallery_size",
+        help="Maximum number of identities remembered. When exceeded, an identity is forgotten according to --eviction.",
+        required=False,
+        default=1000,
+        type=int,
+    )
+
+    parser.add_argument(
+        "-ev",
+        "--eviction",
+        help="Which identity to forget when the gallery is full: the least recently seen (lru) or the oldest (age).",
+        required=False,
+        default="lru",
+        choices=["lru", "age"],
+        type=str,
+    )
+
+    parser.add_argument(
+        "-gp",
+        "--gallery_path",
+        help="Base path of memory-mapped files storing the identity gallery. If set, identities survive restarts.",
+        required=False,
+        default=None,
+        type=str,
+    )
+
     args = parser.parse_args()
 
     return parser, args
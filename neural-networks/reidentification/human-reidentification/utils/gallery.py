@@ -0,0 +1,199 @@
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+EVICTION_POLICIES = ("lru", "age")
+
+
+class EmbeddingGallery:
+    """A bounded gallery of L2-normalized identity embeddings.
+
+    All embeddings are kept in one contiguous (capacity, dim) matrix, so the
+    detections of a frame are compared to the whole gallery with a single matrix
+    multiply and assigned to identities with the Hungarian algorithm. When the
+    gallery is full, the least recently seen ("lru") or the oldest ("age")
+    identity is evicted to make room for a new one.
+
+    If `path` is set, the gallery is backed by memory-mapped files
+    (`<path>.embeddings.npy` and `<path>.meta.npy`), so identities survive
+    restarts. The first row of the meta array holds the next identity number and
+    the frame counter, the other rows hold (identity, last seen, created) of the
+    gallery slots, with identity -1 marking an empty slot.
+
+    Attributes
+    ----------
+    capacity : int
+        The maximum number of identities kept in the gallery.
+    eviction : str
+        The eviction policy, "lru" or "age".
+    path : Optional[Path]
+        The base path of the memory-mapped gallery files.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1000,
+        eviction: str = "lru",
+        path: Optional[Union[str, Path]] = None,
+    ) -> None:
+        if capacity < 1:
+            raise ValueError("Gallery capacity must be a positive integer.")
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Eviction policy must be one of {EVICTION_POLICIES}.")
+        self.capacity = capacity
+        self.eviction = eviction
+        self.path = Path(path) if path is not None else None
+
+        self._embeddings: Optional[np.ndarray] = None  # allocated on first use
+        self._meta = np.zeros((capacity + 1, 3), dtype=np.int64)
+        self._meta[1:, 0] = -1
+        if self.path is not None and self._embeddings_path.exists():
+            self._load()
+
+    @property
+    def _embeddings_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".embeddings.npy")
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".meta.npy")
+
+    @property
+    def _identities(self) -> np.ndarray:
+        return self._meta[1:, 0]
+
+    @property
+    def _last_seen(self) -> np.ndarray:
+        return self._meta[1:, 1]
+
+    @property
+    def _created(self) -> np.ndarray:
+        return self._meta[1:, 2]
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._identities >= 0))
+
+    def _load(self) -> None:
+        if not self._meta_path.exists():
+            raise FileNotFoundError(
+                f"Gallery metadata {self._meta_path} is missing, remove "
+                f"{self._embeddings_path} to start with an empty gallery."
+            )
+        embeddings = np.load(self._embeddings_path, mmap_mode="r+")
+        meta = np.load(self._meta_path, mmap_mode="r+")
+        if len(embeddings) != self.capacity:
+            raise ValueError(
+                f"Gallery at {self.path} has capacity {len(embeddings)}, "
+                f"but capacity {self.capacity} was requested."
+            )
+        if meta.shape != self._meta.shape:
+            raise ValueError(
+                f"Gallery metadata {self._meta_path} has shape {meta.shape}, "
+                f"expected {self._meta.shape}."
+            )
+        self._embeddings = embeddings
+        self._meta = meta
+
+    def _allocate(self, dim: int) -> None:
+        if self.path is None:
+            self._embeddings = np.zeros((self.capacity, dim), dtype=np.float32)
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._embeddings = np.lib.format.open_memmap(
+            self._embeddings_path,
+            mode="w+",
+            dtype=np.float32,
+            shape=(self.capacity, dim),
+        )
+        meta = np.lib.format.open_memmap(
+            self._meta_path, mode="w+", dtype=np.int64, shape=self._meta.shape
+        )
+        meta[:] = self._meta
+        self._meta = meta
+
+    def _free_slot(self, reserved: np.ndarray) -> int:
+        empty = np.flatnonzero(self._identities < 0)
+        if empty.size:
+            return int(empty[0])
+        order = self._last_seen if self.eviction == "lru" else self._created
+        order = order.astype(np.float64)
+        # Never evict an identity assigned in the current frame
+        order[reserved] = np.inf
+        slot = int(np.argmin(order))
+        return slot if np.isfinite(order[slot]) else -1
+
+    def match(self, embeddings: np.ndarray, threshold: float) -> List[int]:
+        """Assigns an identity to every row of the (N, dim) `embeddings`.
+
+        Each detection is matched to at most one gallery identity whose cosine
+        similarity is at least `threshold`, maximizing the total similarity of the
+        frame. The stored embeddings of matched identities are replaced by the
+        new ones and unmatched detections become new identities. Detections that
+        do not fit in the gallery, because all slots hold identities of this frame,
+        get the identity -1.
+
+        @param embeddings: The embeddings of the detections of one frame.
+        @type embeddings: np.ndarray
+        @param threshold: The cosine similarity threshold for a match.
+        @type threshold: float
+        @return: The identity number of every detection.
+        @rtype: List[int]
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        embeddings = embeddings.reshape(len(embeddings), -1)
+        if len(embeddings) == 0:
+            return []
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.maximum(norms, 1e-12)
+        if self._embeddings is None:
+            self._allocate(embeddings.shape[1])
+        elif self._embeddings.shape[1] != embeddings.shape[1]:
+            raise ValueError(
+                f"Gallery at {self.path} stores embeddings of size "
+                f"{self._embeddings.shape[1]}, but the model returns embeddings of "
+                f"size {embeddings.shape[1]}."
+            )
+
+        header = self._meta[0]
+        frame = header[1]
+        header[1] += 1
+
+        identities = np.full(len(embeddings), -1, dtype=np.int64)
+        slots = np.full(len(embeddings), -1, dtype=np.int64)
+
+        occupied = np.flatnonzero(self._identities >= 0)
+        if occupied.size:
+            gallery = (
+                self._embeddings
+                if occupied.size == self.capacity
+                else self._embeddings[occupied]
+            )
+            similarity = embeddings @ gallery.T
+            rows, cols = linear_sum_assignment(similarity, maximize=True)
+            accepted = similarity[rows, cols] >= threshold
+            rows, cols = rows[accepted], cols[accepted]
+            slots[rows] = occupied[cols]
+            identities[rows] = self._identities[occupied[cols]]
+
+        for row in np.flatnonzero(identities < 0):
+            slot = self._free_slot(slots[slots >= 0])
+            if slot < 0:
+                break
+            slots[row] = slot
+            identities[row] = header[0]
+            header[0] += 1
+            self._identities[slot] = identities[row]
+            self._created[slot] = frame
+
+        stored = slots >= 0
+        self._embeddings[slots[stored]] = embeddings[stored]
+        self._last_seen[slots[stored]] = frame
+        return identities.tolist()
+
+    def flush(self) -> None:
+        """Writes a memory-mapped gallery to disk."""
+        for array in (self._embeddings, self._meta):
+            if isinstance(array, np.memmap):
+                array.flush()
@@ -1,8 +1,13 @@
+from pathlib import Path
+from typing import Optional, Union
+
 import numpy as np
 import depthai as dai
 
 from depthai_nodes import ImgDetectionsExtended
 
+from .gallery import EVICTION_POLICIES, EmbeddingGallery
+
 
 class IdentificationNode(dai.node.HostNode):
     """A host node that re-identifies objects based on their embeddings similarity to a database of embeddings.
@@ -13,13 +18,22 @@ class IdentificationNode(dai.node.HostNode):
         The cosine similarity threshold used for merging.
     label_basename : str
         The basename of the labels (e.g., "person"). The labels will be in the format "basename_0", "basename_1", etc.
+    gallery_capacity : int
+        The maximum number of identities remembered.
+    eviction : str
+        The policy used to forget an identity when the gallery is full, "lru" or "age".
+    gallery_path : Optional[Path]
+        The base path of the memory-mapped gallery files. If set, identities survive restarts.
     """
 
     def __init__(self) -> None:
         super().__init__()
         self._cos_sim_threshold = None
         self._label_basename = None
-        self._embeddings_dict = {}
+        self._gallery_capacity = 1000
+        self._eviction = "lru"
+        self._gallery_path = None
+        self._gallery = None
 
     def setCosSimThreshold(self, csim: float) -> None:
         """Sets the cosine similarity threshold.
@@ -43,12 +57,56 @@ class IdentificationNode(dai.node.HostNode):
             raise TypeError("Label basename must be a string.")
         self._label_basename = label_basename
 
+    def setGalleryCapacity(self, capacity: int) -> None:
+        """Sets the maximum number of identities remembered.
+
+        @param capacity: The gallery capacity.
+        @type capacity: int
+        """
+        if not isinstance(capacity, int):
+            raise TypeError("Gallery capacity must be an integer.")
+        if capacity < 1:
+            raise ValueError("Gallery capacity must be a positive integer.")
+        self._gallery_capacity = capacity
+        self._gallery = None
+
+    def setEvictionPolicy(self, eviction: str) -> None:
+        """Sets the policy used to forget an identity when the gallery is full.
+
+        @param eviction: "lru" evicts the least recently seen identity, "age" the oldest one.
+        @type eviction: str
+        """
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Eviction policy must be one of {EVICTION_POLICIES}.")
+        self._eviction = eviction
+        self._gallery = None
+
+    def setGalleryPath(self, gallery_path: Optional[Union[str, Path]]) -> None:
+        """Sets the base path of the memory-mapped gallery files.
+
+        @param gallery_path: The base path, or None to keep the gallery in memory only.
+        @type gallery_path: Optional[Union[str, Path]]
+        """
+        if gallery_path is not None and not isinstance(gallery_path, (str, Path)):
+            raise TypeError("Gallery path must be a string or a Path.")
+        self._gallery_path = gallery_path
+        self._gallery = None
+
     def build(
-        self, gather_data_msg, csim: float = 0.5, label_basename: str = "person"
+        self,
+        gather_data_msg,
+        csim: float = 0.5,
+        label_basename: str = "person",
+        gallery_capacity: int = 1000,
+        eviction: str = "lru",
+        gallery_path: Optional[Union[str, Path]] = None,
     ) -> "IdentificationNode":
         self.link_args(gather_data_msg)
         self.setCosSimThreshold(csim)
         self.setLabelBasename(label_basename)
+        self.setGalleryCapacity(gallery_capacity)
+        self.setEvictionPolicy(eviction)
+        self.setGalleryPath(gallery_path)
         return self
 
     def process(self, gather_data_msg) -> None:
@@ -59,31 +117,28 @@ class IdentificationNode(dai.node.HostNode):
         assert isinstance(rec_msg_list, list)
         assert all(isinstance(msg, dai.NNData) for msg in rec_msg_list)
 
-        for detection, rec in zip(dets_msg.detections, rec_msg_list):
-            detection.label_name = self._get_label_name(rec, self._label_basename)
+        if self._gallery is None:
+            self._gallery = EmbeddingGallery(
+                self._gallery_capacity, self._eviction, self._gallery_path
+            )
+
+        detections = dets_msg.detections
+        rec_msg_list = rec_msg_list[: len(detections)]
+        if rec_msg_list:
+            embeddings = np.stack(
+                [
+                    rec.getTensor("output", dequantize=True).reshape(-1)
+                    for rec in rec_msg_list
+                ]
+            )
+            identities = self._gallery.match(embeddings, self._cos_sim_threshold)
+            for detection, identity in zip(detections, identities):
+                if identity < 0:
+                    continue
+                detection.label_name = f"{self._label_basename}_{identity}"
 
         self.out.send(dets_msg)
 
-    def _get_label_name(self, rec, basename) -> str:
-        embedding = rec.getTensor("output", dequantize=True)
-        sim = [
-            self._cos_sim(embedding, self._embeddings_dict[key])
-            for key in self._embeddings_dict
-        ]
-
-        if sim:
-            if max(sim) >= self._cos_sim_threshold:
-                idx = sim.index(max(sim))
-                label = list(self._embeddings_dict.keys())[idx]
-            else:
-                label = f"{basename}_{len(self._embeddings_dict)}"
-        else:
-            label = f"{basename}_0"
-
-        self._embeddings_dict[label] = embedding
-        return label
-
-    def _cos_sim(self, X: np.ndarray, Y: np.ndarray) -> float:
-        Y = Y.T
-        result = np.dot(X, Y) / (np.linalg.norm(X) * np.linalg.norm(Y, axis=0))
-        return result.item()
+    def onStop(self) -> None:
+        if self._gallery is not None:
+            self._gallery.flush()
@@ -6,6 +6,7 @@ from pathlib import Path
 from utils.constants import Config
 from utils.arguments import initialize_argparser
 from utils import AudioEncoder, AnnotationNode, WhisperEncoder, WhisperDecoder
+from utils.whisper_decoder import DECODER_STEP_INPUTS
 
 
 # Setup logging
@@ -28,7 +29,7 @@ if platform != "RVC4":
     raise ValueError("This example is only supported for RVC4 platform.")
 
 encoder_model_description = dai.NNModelDescription.fromYamlFile(
-    f"whisper_tiny_en_decoder.{platform}.yaml"
+    f"whisper_tiny_en_encoder.{platform}.yaml"
 )
 encoder_archive_path = dai.getModelFromZoo(encoder_model_description)
 
@@ -45,29 +46,37 @@ with dai.Pipeline(device) as pipeline:
     camera = pipeline.create(dai.node.Camera).build()
     camera_out = camera.requestOutput((1080, 720), dai.ImgFrame.Type.NV12, fps=30)
 
-    audio_encoder = pipeline.create(AudioEncoder, args.audio_file)
+    audio_encoder = pipeline.create(AudioEncoder, args.audio_file, args.stream)
 
     encoder_nn = pipeline.create(dai.node.NeuralNetwork)
     encoder_nn.setNNArchive(dai.NNArchive(archivePath=encoder_archive_path))
     audio_encoder.output.link(encoder_nn.input)
 
-    encoder_postprocess = pipeline.create(WhisperEncoder)
-
     decoder_nn = pipeline.create(dai.node.NeuralNetwork)
     decoder_nn.setNNArchive(dai.NNArchive(archivePath=decoder_archive_path))
-    encoder_postprocess.decoder_initialization.link(decoder_nn.input)
+
+    # The cross-attention caches go to the decoder once per window and are reused
+    # for every decoded token
+    for name in ("k_cache_cross", "v_cache_cross"):
+        encoder_nn.out.link(decoder_nn.inputs[name])
+        decoder_nn.inputs[name].setReusePreviousMessage(True)
+
+    encoder_postprocess = pipeline.create(WhisperEncoder).build(encoder_nn.passthrough)
 
     recursive_decoder_process = pipeline.create(WhisperDecoder, Config.MEAN_DECODE_LEN)
-    encoder_postprocess.passthrough.link(recursive_decoder_process.encoder_input)
+    encoder_postprocess.decoder_initialization.link(
+        recursive_decoder_process.encoder_input
+    )
     decoder_nn.out.link(recursive_decoder_process.decoder_input)
 
     # recursive link
-    recursive_decoder_process.out.link(decoder_nn.input)
-    encoder_postprocess = encoder_postprocess.build(
-        encoder_nn.out, recursive_decoder_process.token_sequence
-    )
+    for name in DECODER_STEP_INPUTS:
+        recursive_decoder_process.step_outputs[name].link(decoder_nn.inputs[name])
+
+    # the next audio is sent once the previous one is transcribed
+    recursive_decoder_process.token_sequence.link(audio_encoder.transcript_input)
 
-    text_process = pipeline.create(AnnotationNode)
+    text_process = pipeline.create(AnnotationNode, args.stream)
     camera_out.link(text_process.frame_intput)
     recursive_decoder_process.token_sequence.link(text_process.token_input)
 
@@ -4,11 +4,11 @@ import re
 from typing import Tuple
 from utils.constants import Config
 from depthai_nodes.utils import AnnotationHelper
-from whisper.decoding import get_tokenizer
+from utils.tokenizer import Tokenizer
 
 
 class AnnotationNode(dai.node.ThreadedHostNode):
-    def __init__(self) -> None:
+    def __init__(self, stream: bool = False) -> None:
         super().__init__()
         self.frame_intput = self.createInput("frame_input")
         self.token_input = self.createInput("token_input")
@@ -17,13 +17,16 @@ class AnnotationNode(dai.node.ThreadedHostNode):
         self.annotaion_out = self.createOutput()
         self.color_output = self.createOutput()
 
-        self.tokenizer = get_tokenizer(
-            multilingual=False, language="en", task="transcribe"
-        )
+        self.tokenizer = Tokenizer()
+
+        self.stream = stream
+        self.hint = "Listening..." if stream else "Press 'r' to record audio"
+        self.annotations = self._create_annotations()
 
-        self.annotations = AnnotationHelper()
-        self.annotations.draw_text(
-            "Press 'r' to record audio",
+    def _create_annotations(self, caption: str = "") -> AnnotationHelper:
+        annotations = AnnotationHelper()
+        annotations.draw_text(
+            self.hint,
             (
                 0.002,
                 0.05,
@@ -32,6 +35,15 @@ class AnnotationNode(dai.node.ThreadedHostNode):
             color=dai.Color(1, 1, 1, 1),
             background_color=dai.Color(0, 0, 0, 0.5),
         )
+        if caption:
+            annotations.draw_text(
+                caption,
+                (0.02, 0.9),
+                size=24,
+                color=dai.Color(1, 1, 1, 1),
+                background_color=dai.Color(0, 0, 0, 0.5),
+            )
+        return annotations
 
     def parser_text(self, text: str) -> Tuple[str, str]:
         """Parses text into tuples of (str, color) and returns the new color of LED (None if not detected or multiple detected)."""
@@ -71,6 +83,9 @@ class AnnotationNode(dai.node.ThreadedHostNode):
                 text = self.tokenizer.decode(tokens)
                 print(f"Decoded text: {text}")
                 word, color = self.parser_text(text)
+                if self.stream:
+                    # Live captions show the text of the latest window
+                    self.annotations = self._create_annotations(text.strip())
 
                 if len(color) == 3:
                     color_msg = dai.NNData()
@@ -81,17 +96,8 @@ class AnnotationNode(dai.node.ThreadedHostNode):
                     )
                     self.color_output.send(color_msg)
 
-                    self.annotations = AnnotationHelper()
-                    self.annotations.draw_text(
-                        "Press 'r' to record audio",
-                        (
-                            0.002,
-                            0.05,
-                        ),
-                        size=24,
-                        color=dai.Color(1, 1, 1, 1),
-                        background_color=dai.Color(0, 0, 0, 0.5),
-                    )
+                    if not self.stream:
+                        self.annotations = self._create_annotations()
                     color = np.array(color) / 255.0
                     dai_text_color = dai.Color(color[0], color[1], color[2], 1.0)
                     dai_frame_color = dai.Color(color[0], color[1], color[2], 0.2)
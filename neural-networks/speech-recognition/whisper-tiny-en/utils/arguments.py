@@ -25,6 +25,13 @@ def initialize_argparser():
         help="The path to the audio file to process",
     )
 
+    parser.add_argument(
+        "-s",
+        "--stream",
+        action="store_true",
+        help="Transcribe the microphone continuously instead of recording clips with 'r'",
+    )
+
     args = parser.parse_args()
 
     return parser, args
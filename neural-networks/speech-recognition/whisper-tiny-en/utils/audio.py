@@ -0,0 +1,205 @@
+from subprocess import CalledProcessError, run
+from typing import Optional
+
+import numpy as np
+
+# Audio hyperparameters of Whisper
+SAMPLE_RATE = 16000
+N_FFT = 400
+HOP_LENGTH = 160
+N_MELS = 80
+CHUNK_LENGTH = 30
+N_SAMPLES = CHUNK_LENGTH * SAMPLE_RATE  # 480000 samples in a 30-second chunk
+N_FRAMES = N_SAMPLES // HOP_LENGTH  # 3000 frames in a mel spectrogram input
+
+LOG_MEL_FLOOR = -10.0  # log10 of the clamped power of silent frames
+LOG_MEL_RANGE = 8.0  # dynamic range kept below the loudest frame
+
+
+def load_audio(file: str, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Decodes an audio file into a mono float32 waveform with ffmpeg, resampled to `sr`."""
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-threads",
+        "0",
+        "-i",
+        file,
+        "-f",
+        "s16le",
+        "-ac",
+        "1",
+        "-acodec",
+        "pcm_s16le",
+        "-ar",
+        str(sr),
+        "-",
+    ]
+    try:
+        out = run(cmd, capture_output=True, check=True).stdout
+    except CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
+
+def _hz_to_mel(frequencies: np.ndarray) -> np.ndarray:
+    """Slaney mel scale: linear below 1 kHz, logarithmic above."""
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    mels = frequencies * 3.0 / 200.0
+    log_region = frequencies >= 1000.0
+    mels[log_region] = 15.0 + np.log(frequencies[log_region] / 1000.0) / (
+        np.log(6.4) / 27.0
+    )
+    return mels
+
+
+def _mel_to_hz(mels: np.ndarray) -> np.ndarray:
+    mels = np.asarray(mels, dtype=np.float64)
+    frequencies = mels * 200.0 / 3.0
+    log_region = mels >= 15.0
+    frequencies[log_region] = 1000.0 * np.exp(
+        (np.log(6.4) / 27.0) * (mels[log_region] - 15.0)
+    )
+    return frequencies
+
+
+def mel_filters(n_mels: int = N_MELS) -> np.ndarray:
+    """
+    The (n_mels, N_FFT // 2 + 1) mel filterbank used by Whisper, i.e. Slaney-normalized
+    triangular filters on the Slaney mel scale between 0 Hz and the Nyquist frequency
+    (the same as `librosa.filters.mel(sr=16000, n_fft=400, n_mels=n_mels)`).
+    """
+    fft_frequencies = np.linspace(0, SAMPLE_RATE / 2, N_FFT // 2 + 1)
+    mel_frequencies = _mel_to_hz(
+        np.linspace(0.0, _hz_to_mel(np.array([SAMPLE_RATE / 2]))[0], n_mels + 2)
+    )
+    differences = np.diff(mel_frequencies)
+    ramps = mel_frequencies[:, None] - fft_frequencies[None, :]
+    lower = -ramps[:-2] / differences[:-1, None]
+    upper = ramps[2:] / differences[1:, None]
+    weights = np.maximum(0, np.minimum(lower, upper))
+    weights *= (2.0 / (mel_frequencies[2:] - mel_frequencies[:-2]))[:, None]
+    return weights.astype(np.float32)
+
+
+class LogMelSpectrogram:
+    """Whisper's log-mel spectrogram of 30-second chunks, in numpy.
+
+    Equivalent to `whisper.audio.log_mel_spectrogram(pad_or_trim(audio))`: a centered
+    STFT with a periodic Hann window and reflect padding, projected on the mel
+    filterbank, clamped to 8 orders of magnitude below its maximum and scaled. Frames
+    that only cover zero padding are not transformed. The result is written into one
+    reused (1, n_mels, N_FRAMES) float16 buffer.
+
+    For audio streams, `compute` takes the position of the chunk in the stream. The
+    log-mel values of frames that lie entirely inside the chunk only depend on that
+    position, so they are cached and only frames over new audio are transformed when
+    the next, overlapping chunk is computed.
+    """
+
+    def __init__(self, n_mels: int = N_MELS) -> None:
+        self.n_mels = n_mels
+        self.filters = mel_filters(n_mels)
+        n = np.arange(N_FFT)
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * n / N_FFT)).astype(np.float32)
+        self.output = np.empty((1, n_mels, N_FRAMES), dtype=np.float16)
+
+        self._log_mel = np.empty((n_mels, N_FRAMES), dtype=np.float32)
+        # Log-mel of frames by absolute stream frame, in slot frame % N_FRAMES
+        self._cache = np.empty((n_mels, N_FRAMES), dtype=np.float32)
+        self._cache_start = 0
+        self._cache_end = 0
+        self._offsets = np.arange(-(N_FFT // 2), N_FFT // 2)
+
+    def _transform(self, frames: np.ndarray) -> np.ndarray:
+        """Log10 mel power of (K, N_FFT) frames, as (n_mels, K)."""
+        spectrum = np.fft.rfft(frames * self.window, axis=1)
+        power = spectrum.real**2 + spectrum.imag**2
+        mel = self.filters @ power.T.astype(np.float32)
+        np.maximum(mel, 1e-10, out=mel)
+        return np.log10(mel, out=mel)
+
+    def _edge_frames(self, audio: np.ndarray, frames: np.ndarray) -> np.ndarray:
+        """Frames reaching past the chunk, with the reflect padding of the STFT and the
+        zero padding to N_SAMPLES."""
+        if not len(audio):
+            return np.zeros((len(frames), N_FFT), dtype=np.float32)
+        index = frames[:, None] * HOP_LENGTH + self._offsets
+        index = np.abs(index)
+        index = np.where(index >= N_SAMPLES, 2 * N_SAMPLES - 2 - index, index)
+        inside = index < len(audio)
+        return np.where(inside, audio[np.minimum(index, len(audio) - 1)], 0.0)
+
+    def _interior(self, audio: np.ndarray, first: int, last: int) -> np.ndarray:
+        """Frames first..last-1 of the chunk, all of which lie inside the audio."""
+        start = first * HOP_LENGTH - N_FFT // 2
+        windows = np.lib.stride_tricks.sliding_window_view(audio[start:], N_FFT)
+        return windows[: (last - first) * HOP_LENGTH : HOP_LENGTH]
+
+    def _cached_interior(
+        self, audio: np.ndarray, first: int, last: int, offset: int
+    ) -> None:
+        """Fills frames first..last-1 of the chunk at stream frame `offset` from the cache,
+        transforming only frames that are not cached yet."""
+        start, end = offset + first, offset + last
+        if start < self._cache_start or start > self._cache_end:
+            self._cache_start = self._cache_end = start
+        if end > self._cache_end:
+            new = self._interior(
+                audio, self._cache_end - offset, last
+            )  # frames over new audio
+            slots = np.arange(self._cache_end, end) % N_FRAMES
+            self._cache[:, slots] = self._transform(new)
+            self._cache_end = end
+            self._cache_start = max(self._cache_start, end - N_FRAMES)
+        slots = np.arange(start, end) % N_FRAMES
+        self._log_mel[:, first:last] = self._cache[:, slots]
+
+    def compute(self, audio: np.ndarray, offset: Optional[int] = None) -> np.ndarray:
+        """
+        Computes the log-mel spectrogram of `audio`, padded or trimmed to N_SAMPLES.
+
+        Args:
+            audio (np.ndarray): Mono audio at SAMPLE_RATE.
+            offset (int, optional): Position of `audio` in an audio stream in samples, a
+                multiple of HOP_LENGTH. Enables reusing frames of the previous chunk.
+
+        Returns:
+            np.ndarray: The (1, n_mels, N_FRAMES) float16 spectrogram. The buffer is
+            overwritten by the next call.
+        """
+        audio = np.asarray(audio, dtype=np.float32)[:N_SAMPLES]
+        length = len(audio)
+        half = N_FFT // 2
+
+        # Frames inside the audio, frames over zero padding only, and the rest
+        first = -(-half // HOP_LENGTH)
+        last = min(max((length - half) // HOP_LENGTH + 1, first), N_FRAMES)
+        silent = min(-(-(length + half) // HOP_LENGTH), N_FRAMES)
+        silent_end = min((N_SAMPLES - half) // HOP_LENGTH + 1, N_FRAMES)
+        edges = np.concatenate(
+            [
+                np.arange(0, min(first, N_FRAMES)),
+                np.arange(last, silent),
+                np.arange(max(silent_end, silent), N_FRAMES),
+            ]
+        )
+
+        if last > first:
+            if offset is None:
+                self._log_mel[:, first:last] = self._transform(
+                    self._interior(audio, first, last)
+                )
+            else:
+                self._cached_interior(audio, first, last, offset // HOP_LENGTH)
+        self._log_mel[:, silent:silent_end] = LOG_MEL_FLOOR
+        if len(edges):
+            self._log_mel[:, edges] = self._transform(self._edge_frames(audio, edges))
+
+        log_mel = self._log_mel
+        np.maximum(log_mel, log_mel.max() - LOG_MEL_RANGE, out=log_mel)
+        log_mel += 4.0
+        log_mel /= 4.0
+        self.output[0] = log_mel
+        return self.output
@@ -1,31 +1,131 @@
+import threading
+
 import depthai as dai
 import sounddevice as sd
 import numpy as np
-from whisper.audio import load_audio, log_mel_spectrogram, pad_or_trim
+from utils.audio import HOP_LENGTH, LogMelSpectrogram, load_audio
+from utils.constants import Config
+
+
+class AudioRingBuffer:
+    """Keeps the most recent `capacity` samples of an audio stream.
+
+    Samples are written from the audio callback thread and read from the node thread.
+    `total` counts all samples written so far, so readers can wait for new audio.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.total = 0
+        self._buffer = np.zeros(capacity, dtype=np.float32)
+        self._condition = threading.Condition()
+
+    def write(self, samples: np.ndarray) -> None:
+        skipped = max(len(samples) - self.capacity, 0)
+        samples = samples[skipped:]
+        with self._condition:
+            self.total += skipped
+            start = self.total % self.capacity
+            first = min(len(samples), self.capacity - start)
+            self._buffer[start : start + first] = samples[:first]
+            self._buffer[: len(samples) - first] = samples[first:]
+            self.total += len(samples)
+            self._condition.notify_all()
+
+    def wait_for(self, total: int, timeout: float) -> bool:
+        """Waits until `total` samples were written, returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.total >= total, timeout)
+
+    def latest(self, num_samples: int, end: int = None) -> np.ndarray:
+        """Returns a copy of the last `num_samples` samples written before sample `end`
+        (all samples written so far by default), oldest first."""
+        with self._condition:
+            end = self.total if end is None else min(end, self.total)
+            num_samples = min(num_samples, self.capacity - (self.total - end), end)
+            end = end % self.capacity
+            if num_samples <= end:
+                return self._buffer[end - num_samples : end].copy()
+            return np.concatenate(
+                [self._buffer[end - num_samples :], self._buffer[:end]]
+            )
 
 
 class AudioEncoder(dai.node.ThreadedHostNode):
-    def __init__(self, audio_file: str = None) -> None:
+    """Turns audio into log-mel spectrograms for the Whisper encoder.
+
+    Audio comes from a file, from 'r' key presses (a recording of
+    `Config.RECORDING_DURATION` seconds) or, in streaming mode, continuously from the
+    microphone. A new spectrogram is only sent once the decoder finished the previous
+    one (signalled on `transcript_input`), so the device always works on the most
+    recent audio. In streaming mode that is the last `Config.STREAM_WINDOW` seconds,
+    and consecutive windows overlap unless decoding takes longer than the window.
+    Windows start on spectrogram frame boundaries, so the frames they share with the
+    previous window are not computed again.
+    """
+
+    def __init__(self, audio_file: str = None, stream: bool = False) -> None:
         super().__init__()
         self.output = self.createOutput()
+        self.transcript_input = self.createInput("transcript_input")
         self.audio_file = audio_file
+        self.stream = stream
+        self._send_lock = threading.Lock()
+        self._mel = LogMelSpectrogram()
 
     def run(self) -> None:
         if self.audio_file:
             print(f"Processing audio file: {self.audio_file}")
             audio = load_audio(self.audio_file)
-            mel_spectrogram = self._process_audio_array(audio)
+            self._send(self._process_audio_array(audio))
 
+        if self.stream:
+            self._stream()
+
+    def _send(self, mel_spectrogram: np.ndarray, wait: bool = True) -> None:
+        """Sends a spectrogram once the decoder is done with the previous one."""
+        with self._send_lock:
+            if wait:
+                self.transcript_input.get()
             nn_data = dai.NNData()
             nn_data.addTensor(
                 "audio", mel_spectrogram, dataType=dai.TensorInfo.DataType.FP16
             )
             self.output.send(nn_data)
 
-    def _process_audio_array(self, audio_array: np.ndarray) -> np.ndarray:
-        audio_array = pad_or_trim(audio_array)
-        mel_spectrogram = log_mel_spectrogram(audio_array)
-        mel_spectrogram = mel_spectrogram.unsqueeze(0).numpy().astype(np.float16)
+    def _stream(self) -> None:
+        window_samples = int(Config.STREAM_WINDOW * Config.SAMPLE_RATE)
+        hop_samples = int(Config.STREAM_HOP * Config.SAMPLE_RATE)
+        ring = AudioRingBuffer(window_samples + HOP_LENGTH)
+
+        def on_audio(indata, frames, time, status):
+            ring.write(indata[:, 0])
+
+        print("Streaming audio...")
+        with sd.InputStream(
+            samplerate=Config.SAMPLE_RATE,
+            channels=1,
+            dtype="float32",
+            blocksize=hop_samples // 4,
+            callback=on_audio,
+        ):
+            sent_total = 0
+            while self.isRunning():
+                self.transcript_input.get()
+                while not ring.wait_for(sent_total + hop_samples, timeout=0.1):
+                    if not self.isRunning():
+                        return
+                sent_total = ring.total - ring.total % HOP_LENGTH
+                audio = ring.latest(window_samples, end=sent_total)
+                mel_spectrogram = self._process_audio_array(
+                    audio, offset=sent_total - len(audio)
+                )
+                self._send(mel_spectrogram, wait=False)
+
+    def _process_audio_array(
+        self, audio_array: np.ndarray, offset: int = None
+    ) -> np.ndarray:
+        mel_spectrogram = self._mel.compute(audio_array, offset=offset)
         assert mel_spectrogram.shape == (
             1,
             80,
@@ -34,7 +134,12 @@ class AudioEncoder(dai.node.ThreadedHostNode):
 
         return mel_spectrogram
 
-    def _record_audio_array(self, duration=5, samplerate=16000, channels=1):
+    def _record_audio_array(
+        self,
+        duration=Config.RECORDING_DURATION,
+        samplerate=Config.SAMPLE_RATE,
+        channels=1,
+    ):
         audio = sd.rec(
             int(duration * samplerate),
             samplerate=samplerate,
@@ -51,14 +156,9 @@ class AudioEncoder(dai.node.ThreadedHostNode):
 
         key = chr(key)
 
-        if key == "r":
+        if key == "r" and not self.stream:
             print("Recording audio...")
             audio = self._record_audio_array()
 
             mel_spectrogram = self._process_audio_array(audio)
-
-            nn_data = dai.NNData()
-            nn_data.addTensor(
-                "audio", mel_spectrogram, dataType=dai.TensorInfo.DataType.FP16
-            )
-            self.output.send(nn_data)
+            self._send(mel_spectrogram)
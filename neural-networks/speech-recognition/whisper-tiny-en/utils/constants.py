@@ -112,6 +112,10 @@ class Config:
     MAX_INITIAL_TIMESTAMP = 1.0  # in seconds
     MAX_INITIAL_TIMESTAMP_INDEX = int(MAX_INITIAL_TIMESTAMP / PRECISION)
     MEAN_DECODE_LEN = 224  # The official default max decoded length is 448.
+    SAMPLE_RATE = 16000  # in Hz
+    RECORDING_DURATION = 5.0  # in seconds, length of clips recorded with 'r'
+    STREAM_WINDOW = 6.0  # in seconds, audio transcribed per window in streaming mode
+    STREAM_HOP = 1.0  # in seconds, minimum new audio between two streamed windows
     LED_COLORS = {
         "red": (0, 0, 255),
         "green": (0, 255, 0),
@@ -0,0 +1,50 @@
+import base64
+import importlib.util
+import os
+from typing import Sequence
+
+import tiktoken
+from utils.constants import Config
+
+# Pre-tokenization pattern of the GPT-2 byte pair encoding used by Whisper
+PATTERN = (
+    r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"""
+)
+
+
+class Tokenizer:
+    """Decodes tokens of the English-only Whisper models into text.
+
+    Uses the GPT-2 vocabulary shipped with the `openai-whisper` package without
+    importing it, as importing `whisper` loads torch. Special tokens (start and end of
+    transcript, task, language and timestamp tokens) are skipped when decoding.
+    """
+
+    def __init__(self, vocab_path: str = None) -> None:
+        if vocab_path is None:
+            vocab_path = self._whisper_asset("gpt2.tiktoken")
+        with open(vocab_path) as vocab_file:
+            ranks = {
+                base64.b64decode(token): int(rank)
+                for token, rank in (line.split() for line in vocab_file if line)
+            }
+        self.encoding = tiktoken.Encoding(
+            name=os.path.basename(vocab_path),
+            pat_str=PATTERN,
+            mergeable_ranks=ranks,
+            special_tokens={"<|endoftext|>": Config.TOKENS.TOKEN_EOT},
+        )
+
+    @staticmethod
+    def _whisper_asset(name: str) -> str:
+        spec = importlib.util.find_spec("whisper")
+        if spec is None or not spec.submodule_search_locations:
+            raise RuntimeError(
+                "The openai-whisper package is needed for its tokenizer vocabulary."
+            )
+        return os.path.join(spec.submodule_search_locations[0], "assets", name)
+
+    def decode(self, tokens: Sequence[int]) -> str:
+        return self.encoding.decode(
+            [int(token) for token in tokens if token < Config.TOKENS.TOKEN_EOT]
+        )
@@ -3,26 +3,57 @@ import numpy as np
 from typing import Tuple
 from scipy import special as scipy_special
 from tqdm import tqdm
-from whisper.decoding import get_tokenizer
 from utils.constants import Config
 
+# Decoder model inputs that change with every token. The cross-attention caches
+# ("k_cache_cross", "v_cache_cross") are linked from the encoder on device and reused
+# by the decoder for all tokens of a window.
+DECODER_STEP_INPUTS = {
+    "k_cache_self": (np.float16, dai.TensorInfo.DataType.FP16),
+    "v_cache_self": (np.float16, dai.TensorInfo.DataType.FP16),
+    "x": (np.int32, dai.TensorInfo.DataType.INT),
+    "index": (np.int32, dai.TensorInfo.DataType.INT),
+}
+
 
 class WhisperDecoder(dai.node.ThreadedHostNode):
-    """Processes decoded outputs into readable text."""
+    """Processes decoded outputs into readable text.
+
+    Every decoding step is sent to the decoder model as one message per input in
+    `DECODER_STEP_INPUTS`, so only the self-attention caches and the last token travel
+    between host and device. The state of the timestamp rules is updated with every
+    token instead of being recomputed from all decoded tokens.
+    """
 
     def __init__(self, sample_len):
         super().__init__()
-        self.tokenizer = get_tokenizer(
-            multilingual=False, language="en", task="transcribe"
-        )
         self.encoder_input = self.createInput("encoder_input")
         self.decoder_input = self.createInput()
 
-        self.out = self.createOutput()
+        self.step_outputs = {
+            name: self.createOutput(name=name) for name in DECODER_STEP_INPUTS
+        }
         self.token_sequence = self.createOutput()
 
         self.sample_len = sample_len
+        self._reset()
+
+    def _reset(self) -> None:
         self.decoded_tokens = [Config.TOKENS["TOKEN_SOT"]]
+        # Timestamp rule state, updated in _append_token
+        self._last_was_timestamp = False
+        self._penultimate_was_timestamp = True
+        self._last_timestamp = None
+
+    def _append_token(self, token: int) -> None:
+        self.decoded_tokens.append(token)
+        is_timestamp = token >= Config.TOKENS.TOKEN_TIMESTAMP_BEGIN
+        self._penultimate_was_timestamp = self._last_was_timestamp or (
+            len(self.decoded_tokens) - Config.SAMPLE_BEGIN < 2
+        )
+        self._last_was_timestamp = is_timestamp
+        if is_timestamp:
+            self._last_timestamp = token
 
     def apply_timestamp_rules(self, logits: np.ndarray) -> Tuple[np.ndarray, float]:
         """Apply timestamp-related post-processing rules to logits."""
@@ -31,29 +62,21 @@ class WhisperDecoder(dai.node.ThreadedHostNode):
         logits[Config.TOKENS.TOKEN_NO_TIMESTAMP] = -np.inf
 
         # timestamps have to appear in pairs, except directly before EOT
-        seq = self.decoded_tokens[Config.SAMPLE_BEGIN :]
-        last_was_timestamp = (
-            len(seq) >= 1 and seq[-1] >= Config.TOKENS.TOKEN_TIMESTAMP_BEGIN
-        )
-        penultimate_was_timestamp = (
-            len(seq) < 2 or seq[-2] >= Config.TOKENS.TOKEN_TIMESTAMP_BEGIN
-        )
+        last_was_timestamp = self._last_was_timestamp
+        penultimate_was_timestamp = self._penultimate_was_timestamp
         if last_was_timestamp:
             if penultimate_was_timestamp:  # has to be non-timestamp
                 logits[Config.TOKENS.TOKEN_TIMESTAMP_BEGIN :] = -np.inf
             else:  # cannot be normal text tokens
                 logits[: Config.TOKENS.TOKEN_EOT] = -np.inf
 
-        timestamps = [
-            t for t in self.decoded_tokens if t >= Config.TOKENS.TOKEN_TIMESTAMP_BEGIN
-        ]
-        if len(timestamps) > 0:
+        if self._last_timestamp is not None:
             # timestamps shouldn't decrease; forbid timestamp tokens smaller than the last
             # also force each segment to have a nonzero length, to   prevent infinite looping
             if last_was_timestamp and not penultimate_was_timestamp:
-                timestamp_last = timestamps[-1]
+                timestamp_last = self._last_timestamp
             else:
-                timestamp_last = timestamps[-1] + 1
+                timestamp_last = self._last_timestamp + 1
             logits[Config.TOKENS.TOKEN_TIMESTAMP_BEGIN : timestamp_last] = -np.inf
 
         if len(self.decoded_tokens) == Config.SAMPLE_BEGIN:
@@ -79,13 +102,7 @@ class WhisperDecoder(dai.node.ThreadedHostNode):
         return logits, logprobs
 
     def onStart(self):
-        token_message = dai.NNData()
-        token_message.addTensor(
-            "tokens",
-            np.array([], dtype=np.int32),
-            dataType=dai.TensorInfo.DataType.INT,
-        )
-        self.token_sequence.send(token_message)
+        self._send_tokens(None)
 
     def get_tokens(self, index, logits=None):
         """Get the next tokens based on current logits."""
@@ -112,18 +129,44 @@ class WhisperDecoder(dai.node.ThreadedHostNode):
             return None
 
         x = np.array([[next_token]], dtype=np.int32)
-        self.decoded_tokens.append(int(next_token))
+        self._append_token(int(next_token))
         return x
 
+    def _send_tokens(self, window: dai.Buffer) -> None:
+        token_message = dai.NNData()
+        if window is not None:
+            token_message.setSequenceNum(window.getSequenceNum())
+            token_message.setTimestamp(window.getTimestamp())
+        token_message.addTensor(
+            "tokens",
+            np.array(self.decoded_tokens[1:], dtype=np.int32),
+            dataType=dai.TensorInfo.DataType.INT,
+        )
+        self.token_sequence.send(token_message)
+
+    def _send_step(self, window: dai.Buffer, **tensors: np.ndarray) -> None:
+        """Sends the inputs of one decoding step, one message per decoder input."""
+        for name, tensor in tensors.items():
+            dtype, data_type = DECODER_STEP_INPUTS[name]
+            message = dai.NNData()
+            message.setSequenceNum(window.getSequenceNum())
+            message.setTimestamp(window.getTimestamp())
+            message.addTensor(
+                name, tensor.astype(dtype, copy=False), dataType=data_type
+            )
+            self.step_outputs[name].send(message)
+
     def run(self) -> None:
         """Run the decoder and process encoder outputs."""
 
         while self.isRunning():
-            raw_encoder_outputs = self.encoder_input.get()
-            k_cache_cross = raw_encoder_outputs.getTensor("k_cache_cross")
-            v_cache_cross = raw_encoder_outputs.getTensor("v_cache_cross")
-            ts = raw_encoder_outputs.getTimestamp()
-            seq_num = raw_encoder_outputs.getSequenceNum()
+            # Initial decoder inputs, sent once the encoder output reached the decoder
+            window: dai.NNData = self.encoder_input.get()
+            self._reset()
+            self._send_step(
+                window,
+                **{name: window.getTensor(name) for name in DECODER_STEP_INPUTS},
+            )
 
             for i in tqdm(range(1, self.sample_len), total=self.sample_len):
                 decoder_out: dai.NNData = self.decoder_input.get()
@@ -131,48 +174,16 @@ class WhisperDecoder(dai.node.ThreadedHostNode):
                 logits = decoder_out.getTensor("logits")
                 tokens = self.get_tokens(i, logits)
 
-                if tokens is None:
-                    token_message = dai.NNData()
-                    token_message.setSequenceNum(seq_num)
-                    token_message.setTimestamp(ts)
-                    token_message.addTensor(
-                        "tokens",
-                        np.array(self.decoded_tokens[1:], dtype=np.int32),
-                        dataType=dai.TensorInfo.DataType.INT,
-                    )
-                    self.token_sequence.send(token_message)
-                    self.decoded_tokens = [Config.TOKENS["TOKEN_SOT"]]
+                # The self-attention caches hold sample_len tokens, stop at the last one
+                if tokens is None or i == self.sample_len - 1:
                     break
 
-                decoder_recursive_input = dai.NNData()
-                decoder_recursive_input.setSequenceNum(seq_num)
-                decoder_recursive_input.setTimestamp(ts)
-
-                decoder_recursive_input.addTensor(
-                    "k_cache_cross",
-                    k_cache_cross,
-                    dataType=dai.TensorInfo.DataType.FP16,
-                )
-                decoder_recursive_input.addTensor(
-                    "v_cache_cross",
-                    v_cache_cross,
-                    dataType=dai.TensorInfo.DataType.FP16,
-                )
-                decoder_recursive_input.addTensor(
-                    "k_cache_self",
-                    decoder_out.getTensor("k_cache"),
-                    dataType=dai.TensorInfo.DataType.FP16,
-                )
-                decoder_recursive_input.addTensor(
-                    "v_cache_self",
-                    decoder_out.getTensor("v_cache"),
-                    dataType=dai.TensorInfo.DataType.FP16,
-                )
-                decoder_recursive_input.addTensor(
-                    "x", tokens, dataType=dai.TensorInfo.DataType.INT
-                )
-                decoder_recursive_input.addTensor(
-                    "index", np.array([[i]]), dataType=dai.TensorInfo.DataType.INT
+                self._send_step(
+                    window,
+                    k_cache_self=decoder_out.getTensor("k_cache"),
+                    v_cache_self=decoder_out.getTensor("v_cache"),
+                    x=tokens,
+                    index=np.array([[i]], dtype=np.int32),
                 )
 
-                self.out.send(decoder_recursive_input)
+            self._send_tokens(window)
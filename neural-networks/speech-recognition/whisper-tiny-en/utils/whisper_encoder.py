@@ -7,9 +7,11 @@ logger = logging.getLogger()
 
 
 class WhisperEncoder(dai.node.HostNode):
-    """Processes the encoder outputs for the Whisper model.
-    Encoder outputs are used to initialize the decoder with necessary tensors.
-    These tensors include:
+    """Initializes the decoder once the encoder finished a window.
+    The cross-attention caches (k_cache_cross, v_cache_cross) of the encoder are linked
+    to the decoder on device and reused for every token, so they never travel to the
+    host. This node is triggered by the encoder passthrough and sends the inputs of the
+    first decoding step to the WhisperDecoder node:
     - k_cache_self: Key cache for self-attention
     - v_cache_self: Value cache for self-attention
     - x: Input token, initialized with the start of text token (SOT)
@@ -21,39 +23,27 @@ class WhisperEncoder(dai.node.HostNode):
         super().__init__()
 
         self.decoder_initialization = self.createOutput()
-        self.passthrough = self.createOutput(
-            name="passthrough",
-        )
+        self._k_cache_self = np.zeros((4, 6, 64, Config.MEAN_DECODE_LEN), np.float16)
+        self._v_cache_self = np.zeros((4, 6, Config.MEAN_DECODE_LEN, 64), np.float16)
 
-    def build(
-        self,
-        input_enc: dai.Node.Input,
-        decoder_tokens: dai.Node.Input,
-    ) -> "WhisperEncoder":
-        self.link_args(input_enc, decoder_tokens)
+    def build(self, encoder_passthrough: dai.Node.Output) -> "WhisperEncoder":
+        self.link_args(encoder_passthrough)
 
         return self
 
-    def process(self, encoder_out: dai.Buffer, decoder_tokens: dai.Buffer) -> None:
-        k_cache_cross = encoder_out.getTensor("k_cache_cross")
-        v_cache_cross = encoder_out.getTensor("v_cache_cross")
-        self.passthrough.send(encoder_out)
-
+    def process(self, encoder_passthrough: dai.Buffer) -> None:
         initialized_encoder_out = dai.NNData()
-        initialized_encoder_out.addTensor(
-            "k_cache_cross", k_cache_cross, dataType=dai.TensorInfo.DataType.FP16
-        )
-        initialized_encoder_out.addTensor(
-            "v_cache_cross", v_cache_cross, dataType=dai.TensorInfo.DataType.FP16
-        )
+        initialized_encoder_out.setSequenceNum(encoder_passthrough.getSequenceNum())
+        initialized_encoder_out.setTimestamp(encoder_passthrough.getTimestamp())
         initialized_encoder_out.addTensor(
             "k_cache_self",
-            np.zeros((4, 6, 64, Config.MEAN_DECODE_LEN), dtype=np.float16),
+            self._k_cache_self,
+            dataType=dai.TensorInfo.DataType.FP16,
         )
-
         initialized_encoder_out.addTensor(
             "v_cache_self",
-            np.zeros((4, 6, Config.MEAN_DECODE_LEN, 64), dtype=np.float16),
+            self._v_cache_self,
+            dataType=dai.TensorInfo.DataType.FP16,
         )
 
         initialized_encoder_out.addTensor(
@@ -71,4 +71,4 @@ class MJPEGStreamer(dai.node.HostNode):
         for detection in nn.detections:
             frame = self._draw_detection(frame, detection)
 
-        self.server.frametosend = frame
+        self.server.broker.publish(frame)
@@ -1,8 +1,53 @@
+import threading
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn
-from time import sleep
+from typing import Optional, Tuple
 
 import cv2
+import numpy as np
+
+CLIENT_WAIT_TIMEOUT = 1.0  # seconds
+
+
+class FrameBroker:
+    """Shares the latest JPEG-encoded frame between all connected clients.
+
+    Each frame is encoded once when it is published and tagged with an
+    increasing sequence number. Clients wait on a condition variable for a
+    sequence number newer than the one they sent last, so a slow client simply
+    skips to the newest frame instead of queuing stale ones.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._jpeg: Optional[bytes] = None
+        self._sequence_num = 0
+
+    def publish(self, frame: np.ndarray) -> None:
+        ok, encoded = cv2.imencode(".jpg", frame)
+        if not ok:
+            return
+        jpeg = encoded.tobytes()
+        with self._condition:
+            self._jpeg = jpeg
+            self._sequence_num += 1
+            self._condition.notify_all()
+
+    def wait_for_frame(
+        self, last_sequence_num: int, timeout: float = CLIENT_WAIT_TIMEOUT
+    ) -> Tuple[int, Optional[bytes]]:
+        """Blocks until a frame newer than `last_sequence_num` is published.
+
+        Returns the sequence number and JPEG bytes of the newest frame, or
+        `last_sequence_num` and None if no new frame arrived before `timeout`.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._sequence_num != last_sequence_num, timeout
+            )
+            if self._sequence_num == last_sequence_num:
+                return last_sequence_num, None
+            return self._sequence_num, self._jpeg
 
 
 class VideoStreamHandler(BaseHTTPRequestHandler):
@@ -12,19 +57,29 @@ class VideoStreamHandler(BaseHTTPRequestHandler):
             "Content-type", "multipart/x-mixed-replace; boundary=--jpgboundary"
         )
         self.end_headers()
-        while True:
-            sleep(0.1)
-            if hasattr(self.server, "frametosend"):
-                ok, encoded = cv2.imencode(".jpg", self.server.frametosend)
+        broker: FrameBroker = self.server.broker
+        sequence_num = 0
+        try:
+            while True:
+                sequence_num, jpeg = broker.wait_for_frame(sequence_num)
+                if jpeg is None:
+                    continue
                 self.wfile.write("--jpgboundary".encode())
                 self.send_header("Content-type", "image/jpeg")
-                self.send_header("Content-length", str(len(encoded)))
+                self.send_header("Content-length", str(len(jpeg)))
                 self.end_headers()
-                self.wfile.write(encoded)
+                self.wfile.write(jpeg)
                 self.end_headers()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client disconnected
+            pass
 
 
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     """Handle requests in a separate thread."""
 
-    pass
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class) -> None:
+        super().__init__(server_address, handler_class)
+        self.broker = FrameBroker()
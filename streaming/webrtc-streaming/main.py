@@ -1,22 +1,16 @@
 import asyncio
 import json
-import time
 import uuid
 from pathlib import Path
 
 import aiohttp_cors
-import depthai as dai
 from aiohttp import web
 from aiortc import RTCPeerConnection, RTCSessionDescription
 from utils.datachannel import setup_datachannel
 from utils.options_wrapper import OptionsWrapper
+from utils.pipeline_manager import PipelineManager
 from utils.transform import VideoTransform
 
-# There can be only one
-#  if every VideoTransform tries to create its own pipeline they would all try to connect to their own device
-#  one device can run only one pipeline at a time
-pipeline = None
-
 
 async def index(request):
     with (Path(__file__).parent / "client/index.html").open() as f:
@@ -33,11 +27,10 @@ async def on_shutdown(application):
     coroutines = [pc.close() for pc in application.pcs]
     await asyncio.gather(*coroutines)
     application.pcs.clear()
+    application.pipeline_manager.stop()
 
 
 async def offer(request):
-    global pipeline
-
     params = await request.json()
     options = OptionsWrapper(params.get("options", dict()))
     rtc_offer = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
@@ -53,23 +46,10 @@ async def offer(request):
         if t.kind == "video":
             print("Created for {}".format(request.remote))
 
-            # Removes the connection to the device so that a new pipeline can connect to the device
-            try:
-                if pipeline is not None and pipeline.isRunning():
-                    print("Restarting pipeline...")
-                    time.sleep(0.5)
-                    pipeline.stop()
-                    pipeline = None
-            # This can be hit because VideoTransform can call "del pipeline"
-            except NameError:
-                print("Restarting pipeline...")
-                time.sleep(0.5)
-
-            pipeline = dai.Pipeline()
-
+            # All peers share one device pipeline, it is only restarted when the options change
             setup_datachannel(pc, pc_id, request.app)
             request.app.video_transforms[pc_id] = VideoTransform(
-                pipeline, request.app, pc_id, options
+                request.app.pipeline_manager, request.app, pc_id, options
             )
             pc.addTrack(request.app.video_transforms[pc_id])
 
@@ -78,9 +58,12 @@ async def offer(request):
         global pipelines_counter
 
         print("ICE connection state is {}".format(pc.iceConnectionState))
-        if pc.iceConnectionState == "failed":
+        if pc.iceConnectionState in ("failed", "closed"):
             await pc.close()
             request.app.pcs.discard(pc)
+            video_transform = request.app.video_transforms.pop(pc_id, None)
+            if video_transform is not None:
+                video_transform.stop()
 
     @pc.on("track")
     def on_track(track):
@@ -101,6 +84,7 @@ def create_web_app():
     setattr(app, "pcs", set())
     setattr(app, "pcs_datachannels", {})
     setattr(app, "video_transforms", {})
+    setattr(app, "pipeline_manager", PipelineManager())
 
     app.on_shutdown.append(on_shutdown)
     app.router.add_get("/", index)
@@ -21,3 +21,10 @@ class OptionsWrapper:
     @property
     def preset_mode(self):
         return self.raw_options.get("preset_mode", "HIGH_ACCURACY")
+
+    @property
+    def pipeline_key(self):
+        """Options that determine the device pipeline; peers with equal keys can share it."""
+        if self.camera_type == "depth":
+            return (self.camera_type, self.preset_mode)
+        return (self.camera_type, self.width, self.height, self.nn)
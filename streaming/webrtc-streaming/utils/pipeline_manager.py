@@ -0,0 +1,284 @@
+import threading
+from typing import Optional, Tuple
+
+import cv2
+import depthai as dai
+import numpy as np
+from depthai_nodes import ImgDetectionExtended
+from depthai_nodes.node import ParsingNeuralNetwork
+
+FRAME_WAIT_TIMEOUT = 1.0  # seconds
+
+
+class SharedPipeline:
+    """Runs one device pipeline and fans its annotated frames out to many peers.
+
+    A reader thread pulls frames and detections from the device queues, draws the
+    detection overlay once per frame and stores the result together with an
+    increasing sequence number. Every `VideoTransform` waits for a sequence number
+    newer than the one it sent last, so slow peers skip to the newest frame.
+    """
+
+    def __init__(self, options) -> None:
+        self.key = options.pipeline_key
+        self.depth_flag = options.camera_type == "depth"
+        self.subscribers = 0
+
+        self._condition = threading.Condition()
+        self._frame: Optional[np.ndarray] = None
+        self._sequence_num = 0
+        self._stopped = False
+        self._stop_thread: Optional[threading.Thread] = None
+
+        self.pipeline = dai.Pipeline()
+        self.preview, self.nn, self.label_map = start_pipeline(self.pipeline, options)
+        self.pipeline.start()
+
+        self._thread = threading.Thread(target=self._read_frames, daemon=True)
+        self._thread.start()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped
+
+    def wait_for_frame(
+        self, last_sequence_num: int, timeout: float = FRAME_WAIT_TIMEOUT
+    ) -> Tuple[int, Optional[np.ndarray]]:
+        """Blocks until a frame newer than `last_sequence_num` is available.
+
+        Returns the sequence number and the RGB frame, or `last_sequence_num` and
+        None if the pipeline stopped or no new frame arrived before `timeout`.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._stopped or self._sequence_num != last_sequence_num,
+                timeout,
+            )
+            if self._stopped or self._sequence_num == last_sequence_num:
+                return last_sequence_num, None
+            return self._sequence_num, self._frame
+
+    def stop(self, wait: bool = True) -> None:
+        """Wakes up all waiting peers and stops the device pipeline.
+
+        With `wait=False` the device pipeline is stopped on a background thread, see
+        `join`.
+        """
+        with self._condition:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._condition.notify_all()
+            self._stop_thread = threading.Thread(
+                target=self._stop_pipeline, daemon=True
+            )
+        self._stop_thread.start()
+        if wait:
+            self._stop_thread.join()
+
+    def join(self) -> None:
+        """Waits until the device pipeline of a stopped SharedPipeline has stopped."""
+        with self._condition:
+            stop_thread = self._stop_thread
+        if stop_thread is not None:
+            stop_thread.join()
+
+    def _stop_pipeline(self) -> None:
+        if self.pipeline.isRunning():
+            self.pipeline.stop()
+        print("Pipeline exited.")
+
+    def _read_frames(self) -> None:
+        try:
+            while not self._stopped and self.pipeline.isRunning():
+                try:
+                    preview = self.preview.get()
+                    dets = self.nn.get().detections if self.nn is not None else []
+                except RuntimeError:
+                    # Queues are closed when the pipeline is stopped
+                    break
+                frame = self._render(preview, dets)
+                with self._condition:
+                    self._frame = frame
+                    self._sequence_num += 1
+                    self._condition.notify_all()
+        finally:
+            # Also when the device disconnected or the pipeline stopped by itself, so
+            # peers end their streams and the next peer gets a new pipeline
+            self.stop()
+
+    def _render(self, preview: dai.ImgFrame, dets) -> np.ndarray:
+        frame = preview.getFrame() if self.depth_flag else preview.getCvFrame()
+
+        if self.depth_flag:
+            frame = (frame * (255 / frame.max())).astype(np.uint8)
+            frame = cv2.applyColorMap(frame, cv2.COLORMAP_JET)
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+        for detection in dets:
+            if isinstance(detection, ImgDetectionExtended):
+                bbox = frameNorm(frame, detection.rotated_rect.getOuterRect())
+            elif isinstance(detection, dai.ImgDetection):
+                bbox = frameNorm(
+                    frame,
+                    (
+                        detection.xmin,
+                        detection.ymin,
+                        detection.xmax,
+                        detection.ymax,
+                    ),
+                )
+            else:
+                raise RuntimeError("Unknown detection type")
+
+            if self.label_map is not None:
+                label = self.label_map[detection.label]
+            else:
+                label = f"LABEL {detection.label}"
+            cv2.putText(
+                frame,
+                label,
+                (bbox[0] + 10, bbox[1] + 20),
+                cv2.FONT_HERSHEY_TRIPLEX,
+                0.5,
+                (255, 0, 0),
+            )
+            cv2.putText(
+                frame,
+                f"{int(detection.confidence * 100)}%",
+                (bbox[0] + 10, bbox[1] + 40),
+                cv2.FONT_HERSHEY_TRIPLEX,
+                0.5,
+                (255, 0, 0),
+            )
+            cv2.rectangle(frame, (bbox[0], bbox[1]), (bbox[2], bbox[3]), (255, 0, 0), 2)
+
+        if not self.depth_flag:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+        return frame
+
+
+class PipelineManager:
+    """Hands out the shared device pipeline to peer connections.
+
+    One device can run only one pipeline at a time. Peers that request the same
+    options (see `OptionsWrapper.pipeline_key`) share the running pipeline. A peer
+    requesting different options restarts the device with the new options, which
+    ends the streams of the peers still attached to the old pipeline.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._active: Optional[SharedPipeline] = None
+        self._stopping: Optional[SharedPipeline] = None
+
+    def acquire(self, options) -> SharedPipeline:
+        with self._lock:
+            if self._active is not None and (
+                self._active.stopped or self._active.key != options.pipeline_key
+            ):
+                print("Restarting pipeline...")
+                self._active.stop()
+                self._active.join()
+                self._active = None
+            if self._active is None:
+                # The device runs one pipeline at a time
+                if self._stopping is not None:
+                    self._stopping.join()
+                    self._stopping = None
+                self._active = SharedPipeline(options)
+            self._active.subscribers += 1
+            return self._active
+
+    def release(self, shared_pipeline: SharedPipeline) -> None:
+        with self._lock:
+            shared_pipeline.subscribers -= 1
+            if shared_pipeline.subscribers > 0:
+                return
+            # Called from the event loop, stopping the device pipeline would block it
+            shared_pipeline.stop(wait=False)
+            self._stopping = shared_pipeline
+            if self._active is shared_pipeline:
+                self._active = None
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._active is not None:
+                self._active.stop()
+                self._active.join()
+                self._active = None
+            if self._stopping is not None:
+                self._stopping.join()
+                self._stopping = None
+
+
+def start_pipeline(pipeline: dai.Pipeline, options):
+    depth_flag = options.camera_type == "depth"
+    platform = pipeline.getDefaultDevice().getPlatformAsString()
+
+    if platform == "RVC4":
+        fps = 30
+    else:
+        fps = 15
+    print("Creating pipeline...")
+
+    # The host node architecture is not preferred here as the frames are fanned out
+    #  to all connected peers by the SharedPipeline reader thread
+    nn_q = None
+    label_map = None
+    if depth_flag:
+        left = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_B)
+        right = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_C)
+
+        left_out = left.requestFullResolutionOutput(type=dai.ImgFrame.Type.NV12)
+        right_out = right.requestFullResolutionOutput(type=dai.ImgFrame.Type.NV12)
+        preset_mode = dai.node.StereoDepth.PresetMode.__entries[options.preset_mode][0]
+
+        stereo = pipeline.create(dai.node.StereoDepth).build(
+            left=left_out,
+            right=right_out,
+            presetMode=preset_mode,
+        )
+
+        preview_q = stereo.disparity.createOutputQueue(blocking=False, maxSize=4)
+
+    else:
+        cam = pipeline.create(dai.node.Camera).build()
+        cam_out = cam.requestOutput(
+            (options.width, options.height), dai.ImgFrame.Type.NV12, fps=fps
+        )
+
+        if options.nn:
+            model_description = dai.NNModelDescription(options.nn)
+            model_description.platform = platform
+            nn_archive = dai.NNArchive(dai.getModelFromZoo(model_description))
+
+            manip = pipeline.create(dai.node.ImageManip)
+            manip.initialConfig.setOutputSize(
+                nn_archive.getInputWidth(),
+                nn_archive.getInputHeight(),
+                dai.ImageManipConfig.ResizeMode.STRETCH,
+            )
+            manip.initialConfig.setFrameType(dai.ImgFrame.Type.BGR888p)
+            manip.setMaxOutputFrameSize(
+                nn_archive.getInputWidth() * nn_archive.getInputHeight() * 3
+            )
+            if platform == "RVC4":
+                manip.initialConfig.setFrameType(dai.ImgFrame.Type.BGR888i)
+            cam_out.link(manip.inputImage)
+
+            nn = pipeline.create(ParsingNeuralNetwork).build(manip.out, nn_archive)
+            nn.input.setBlocking(False)
+            label_map = nn_archive.getConfigV1().model.heads[0].metadata.classes
+            nn_q = nn.out.createOutputQueue(blocking=False, maxSize=4)
+        preview_q = cam_out.createOutputQueue(blocking=False, maxSize=4)
+
+    print("Pipeline created.")
+    return preview_q, nn_q, label_map
+
+
+def frameNorm(frame, bbox):
+    normVals = np.full(len(bbox), frame.shape[0])
+    normVals[::2] = frame.shape[1]
+    return (np.clip(np.array(bbox), 0, 1) * normVals).astype(int)
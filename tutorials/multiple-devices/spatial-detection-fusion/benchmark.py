@@ -0,0 +1,203 @@
+"""Replay benchmark of the detection fusion engine for N virtual cameras.
+
+Replays `SpatialImgDetections` of a recording through `FusionEngine` the way
+`FusionManager` feeds it, without devices, and reports the fusion cost per frame.
+Without `--recording`, a synthetic scene is generated: people walking around a room
+seen by cameras placed in a ring around it. Generated scenes can be stored with
+`--save-recording` and replayed later.
+
+    python3 benchmark.py                               # 1, 2, 4, 6 and 8 cameras
+    python3 benchmark.py --cameras 6 --people 50
+    python3 benchmark.py --cameras 6 --save-recording scene.npz
+    python3 benchmark.py --recording scene.npz
+"""
+
+import argparse
+import datetime
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import depthai as dai
+import numpy as np
+
+from utils.config import DISTANCE_THRESHOLD_M
+from utils.fusion import FusionEngine
+
+LABELS = ["person", "chair", "bottle"]
+
+
+def camera_ring(num_cameras: int, radius: float = 5.0, height: float = 2.5):
+    """cam_to_world matrices of cameras on a ring, looking at the room center.
+
+    Camera axes follow the convention of the fusion engine: x right, y up, z forward.
+    """
+    matrices = []
+    for angle in np.linspace(0, 2 * np.pi, num_cameras, endpoint=False):
+        position = np.array([radius * np.cos(angle), radius * np.sin(angle), height])
+        forward = -position / np.linalg.norm(position)
+        right = np.cross(forward, [0.0, 0.0, 1.0])
+        right /= np.linalg.norm(right)
+        up = np.cross(right, forward)
+        cam_to_world = np.eye(4)
+        cam_to_world[:3, :3] = np.stack([right, up, forward], axis=1)
+        cam_to_world[:3, 3] = position
+        matrices.append(cam_to_world)
+    return np.stack(matrices)
+
+
+def generate_recording(
+    num_cameras: int, num_people: int, num_frames: int, fps: int, seed: int = 0
+) -> Dict[str, np.ndarray]:
+    """Synthetic recording: one row (frame, camera, ts_ms, label, confidence, x, y, z)
+    per detection, with camera coordinates in mm."""
+    rng = np.random.default_rng(seed)
+    cam_to_world = camera_ring(num_cameras)
+    world_to_cam = np.linalg.inv(cam_to_world)
+
+    positions = np.column_stack(
+        [rng.uniform(-3, 3, (num_people, 2)), rng.uniform(0.5, 1.5, num_people)]
+    )
+    labels = rng.integers(0, len(LABELS), num_people)
+    frame_time_ms = 1000 / fps
+
+    rows = []
+    for frame in range(num_frames):
+        positions[:, :2] += rng.normal(0, 0.02, (num_people, 2))
+        positions[:, :2] = np.clip(positions[:, :2], -3, 3)
+        homogeneous = np.column_stack([positions, np.ones(num_people)])
+        for camera in range(num_cameras):
+            seen = rng.random(num_people) > 0.1  # missed detections
+            pos_cam = (world_to_cam[camera] @ homogeneous[seen].T).T[:, :3]
+            pos_cam += rng.normal(0, 0.05, pos_cam.shape)  # depth noise
+            # Device coordinates have y pointing down, in mm
+            xyz = pos_cam * np.array([1000.0, -1000.0, 1000.0])
+            ts_ms = frame * frame_time_ms + rng.uniform(0, 0.3 * frame_time_ms)
+            count = int(seen.sum())
+            rows.append(
+                np.column_stack(
+                    [
+                        np.full(count, frame),
+                        np.full(count, camera),
+                        np.full(count, ts_ms),
+                        labels[seen],
+                        rng.uniform(0.5, 1.0, count),
+                        xyz,
+                    ]
+                )
+            )
+    return {"cam_to_world": cam_to_world, "detections": np.concatenate(rows)}
+
+
+def build_messages(
+    recording: Dict[str, np.ndarray],
+) -> List[List[Tuple[str, dai.SpatialImgDetections]]]:
+    """Per frame, the (mxid, message) of every camera, in arrival order."""
+    rows = recording["detections"]
+    num_cameras = len(recording["cam_to_world"])
+    num_frames = int(rows[:, 0].max()) + 1 if len(rows) else 0
+
+    frames = []
+    for frame in range(num_frames):
+        frame_rows = rows[rows[:, 0] == frame]
+        messages = []
+        for camera in range(num_cameras):
+            camera_rows = frame_rows[frame_rows[:, 1] == camera]
+            if not len(camera_rows):
+                continue
+            detections = []
+            for _, _, _, label, confidence, x, y, z in camera_rows:
+                det = dai.SpatialImgDetection()
+                det.label = int(label)
+                det.labelName = LABELS[int(label)]
+                det.confidence = float(confidence)
+                det.spatialCoordinates = dai.Point3f(float(x), float(y), float(z))
+                detections.append(det)
+            msg = dai.SpatialImgDetections()
+            msg.detections = detections
+            msg.setTimestamp(datetime.timedelta(milliseconds=float(camera_rows[0, 2])))
+            messages.append((f"camera-{camera}", msg))
+        messages.sort(key=lambda item: item[1].getTimestamp())
+        frames.append(messages)
+    return frames
+
+
+def replay(recording: Dict[str, np.ndarray], fps: int) -> Tuple[np.ndarray, int]:
+    extrinsics = {
+        f"camera-{camera}": {"cam_to_world": cam_to_world, "friendly_id": camera + 1}
+        for camera, cam_to_world in enumerate(recording["cam_to_world"])
+    }
+    engine = FusionEngine(extrinsics, fps, DISTANCE_THRESHOLD_M)
+    frames = build_messages(recording)
+
+    latencies = np.empty(len(frames))
+    fused_windows = 0
+    for index, messages in enumerate(frames):
+        start = time.perf_counter()
+        for mxid, msg in messages:
+            engine.add_message(mxid, msg)
+        while engine.pop_groups() is not None:
+            fused_windows += 1
+        latencies[index] = time.perf_counter() - start
+    return latencies * 1000.0, fused_windows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "-c",
+        "--cameras",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 6, 8],
+        help="Numbers of virtual cameras of generated scenes.",
+    )
+    parser.add_argument(
+        "-p", "--people", type=int, default=30, help="Objects in generated scenes."
+    )
+    parser.add_argument(
+        "-n", "--frames", type=int, default=300, help="Frames of generated scenes."
+    )
+    parser.add_argument("--fps", type=int, default=30, help="Camera frame rate.")
+    parser.add_argument(
+        "--recording", type=Path, help="Replay this recording instead of generating."
+    )
+    parser.add_argument(
+        "--save-recording",
+        type=Path,
+        help="Store the generated scene (last of --cameras) to this file.",
+    )
+    args = parser.parse_args()
+
+    if args.recording:
+        with np.load(args.recording) as data:
+            recordings = [dict(data)]
+    else:
+        recordings = [
+            generate_recording(num_cameras, args.people, args.frames, args.fps)
+            for num_cameras in args.cameras
+        ]
+        if args.save_recording:
+            np.savez(args.save_recording, **recordings[-1])
+            print(f"Recording saved to {args.save_recording}")
+
+    print(
+        f"{'cameras':>8}{'dets/frame':>12}{'p50 ms':>10}{'p90 ms':>10}"
+        f"{'p99 ms':>10}{'max fused FPS':>16}"
+    )
+    for recording in recordings:
+        latencies, fused_windows = replay(recording, args.fps)
+        num_frames = len(latencies)
+        dets_per_frame = len(recording["detections"]) / max(num_frames, 1)
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        max_fps = fused_windows / (latencies.sum() / 1000.0)
+        print(
+            f"{len(recording['cam_to_world']):>8}{dets_per_frame:>12.1f}"
+            f"{p50:>10.3f}{p90:>10.3f}{p99:>10.3f}{max_fps:>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,63 +2,73 @@ import depthai as dai
 import time
 import datetime
 import collections
+import heapq
+import queue
+import threading
 import numpy as np
-import bisect
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 from scipy.optimize import linear_sum_assignment
 
 from .detection_object import WorldDetection
 
+CAMERA_STALE_S = 1.0  # cameras silent for longer are not waited for
+SKEW_HISTORY = 300  # windows kept for the arrival skew statistics
+SKEW_REPORT_INTERVAL_S = 10.0
+MAX_WAIT_S = 0.1  # longest blocking wait, so the node notices a pipeline stop
+
 
 class DetectionGroupBuffer(dai.Buffer):
     """
     A custom buffer class to hold fused detection groups directly.
     """
 
-    def __init__(self, groups: List[List[WorldDetection]]):
+    def __init__(
+        self,
+        groups: List[List[WorldDetection]],
+        arrival_skew_ms: Optional[Dict[int, float]] = None,
+    ):
         super().__init__()
         self.groups = groups
+        # Host arrival time of each camera's message relative to the first one of the window
+        self.arrival_skew_ms = arrival_skew_ms or {}
 
 
-class FusionManager(dai.node.ThreadedHostNode):
+class FusionEngine:
+    """
+    Buffers world-space detections of all cameras and fuses them per time window.
+
+    Detections of one camera message are transformed to world coordinates as one batch.
+    Timestamps waiting for fusion are kept in a min-heap, so the oldest one is found and
+    removed in O(log n).
+
+    The oldest window is fused as soon as every active camera has reported in it, or
+    once it timed out, either on the device clock (newer messages are a frame ahead) or
+    on the host clock (no camera has sent anything new). A camera is active while it
+    has sent a message within the last CAMERA_STALE_S seconds. For every fused window
+    the host arrival skew of each camera, relative to the first message of the window,
+    is recorded.
+    """
+
     def __init__(
         self,
         all_cam_extrinsics: Dict[str, Dict[str, Any]],
         fps: int,
         distance_threshold: float,
     ) -> None:
-        super().__init__()
-
-        self.fps = fps
-        self.inputs: Dict[str, dai.Node.Input] = {}
-
-        self.output = self.createOutput(
-            possibleDatatypes=[
-                dai.Node.DatatypeHierarchy(dai.DatatypeEnum.Buffer, True)
-            ]
-        )
-
         self.all_cam_extrinsics = all_cam_extrinsics
-        for mxid in all_cam_extrinsics.keys():
-            inp = self.createInput(
-                name=mxid,
-                group=mxid,
-                queueSize=4,
-                blocking=False,
-                types=[
-                    dai.Node.DatatypeHierarchy(
-                        dai.DatatypeEnum.SpatialImgDetections, True
-                    )
-                ],
-            )
-            self.inputs[mxid] = inp
 
         self.detection_buffer: Dict[int, List[WorldDetection]] = (
             collections.defaultdict(list)
         )
-        self.timestamp_queue: List[int] = []
+        self.timestamp_queue: List[int] = []  # min-heap of buffered timestamps
+        # Host arrival time (time.monotonic) of each camera's first message per timestamp
+        self.arrivals: Dict[int, Dict[str, float]] = collections.defaultdict(dict)
+        self.last_seen: Dict[str, float] = {}
+        self.arrival_skew_ms: Dict[int, collections.deque] = collections.defaultdict(
+            lambda: collections.deque(maxlen=SKEW_HISTORY)
+        )
 
-        frame_time_ms = 1000 / self.fps  # time for one frame in milliseconds
+        frame_time_ms = 1000 / fps  # time for one frame in milliseconds
         self.time_window_ms = (
             frame_time_ms * 0.8
         )  # time window for grouping near-simultaneous detections
@@ -69,69 +79,114 @@ class FusionManager(dai.node.ThreadedHostNode):
             distance_threshold  # Distance threshold for grouping detections in meters
         )
 
-    def run(self):
-        while self.isRunning():
-            self._read_inputs()
-            self._process_buffer()
-            time.sleep(0.75 / self.fps)
-
-    def _read_inputs(self):
-        """Read all available detections from input queues and buffer them."""
-        for mxid, inp in self.inputs.items():
-            msg = inp.tryGet()
-            if msg is None:
-                continue
-
-            assert isinstance(msg, dai.SpatialImgDetections)
-            extrinsics = self.all_cam_extrinsics.get(mxid)
-            if not extrinsics:
-                continue
-
-            world_dets = self._transform_detections_to_world(
-                msg.detections, extrinsics["cam_to_world"], extrinsics["friendly_id"]
-            )
-
-            ts_ms = int(msg.getTimestamp().total_seconds() * 1000)
-            self.latest_device_timestamp_ms = max(
-                self.latest_device_timestamp_ms, ts_ms
-            )
-
-            self.detection_buffer[ts_ms].extend(world_dets)
-
-            if ts_ms not in self.timestamp_queue:
-                bisect.insort(self.timestamp_queue, ts_ms)
+    def add_message(
+        self,
+        mxid: str,
+        msg: dai.SpatialImgDetections,
+        arrival: Optional[float] = None,
+    ) -> None:
+        """Transforms the detections of one camera message to world coordinates and buffers them.
 
-    def _process_buffer(self):
-        """
-        Process timestamps that are older than the fusion timeout,
-        ensuring all relevant cameras have reported.
+        `arrival` is the host time (time.monotonic) the message was received at, now if
+        not given.
         """
-        if not self.timestamp_queue:
+        extrinsics = self.all_cam_extrinsics.get(mxid)
+        if not extrinsics:
             return
+        if arrival is None:
+            arrival = time.monotonic()
+        if not self.last_seen:
+            # Cameras that never report stop being waited for after CAMERA_STALE_S
+            self.last_seen = dict.fromkeys(self.all_cam_extrinsics, arrival)
+        self.last_seen[mxid] = arrival
+
+        world_dets = self._transform_detections_to_world(
+            msg.detections, extrinsics["cam_to_world"], extrinsics["friendly_id"]
+        )
 
-        oldest_ts_ms = self.timestamp_queue[0]
-
-        if (self.latest_device_timestamp_ms - oldest_ts_ms) / 1000 > self.timeout:
-            start_ts = self.timestamp_queue.pop(0)
-            end_ts = start_ts + self.time_window_ms
-
-            all_detections_in_window = self.detection_buffer.pop(start_ts, [])
-
-            while self.timestamp_queue and self.timestamp_queue[0] <= end_ts:
-                ts_to_pop = self.timestamp_queue.pop(0)
-                all_detections_in_window.extend(
-                    self.detection_buffer.pop(ts_to_pop, [])
-                )
+        ts_ms = int(msg.getTimestamp().total_seconds() * 1000)
+        self.latest_device_timestamp_ms = max(self.latest_device_timestamp_ms, ts_ms)
 
-            if not all_detections_in_window:
-                return
+        if ts_ms not in self.detection_buffer:
+            heapq.heappush(self.timestamp_queue, ts_ms)
+        self.detection_buffer[ts_ms].extend(world_dets)
+        self.arrivals[ts_ms].setdefault(mxid, arrival)
 
-            groups = self._group_detections(all_detections_in_window)
-            pruned_groups = self._prune_redundant_detections(groups)
+    def next_deadline(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until the oldest window times out on the host clock, None if no window
+        is buffered."""
+        if not self.timestamp_queue:
+            return None
+        if now is None:
+            now = time.monotonic()
+        first_arrival = min(self.arrivals[self.timestamp_queue[0]].values())
+        return max(first_arrival + self.timeout - now, 0.0)
+
+    def pop_groups(
+        self, now: Optional[float] = None
+    ) -> Optional[Tuple[int, List[List[WorldDetection]], Dict[int, float]]]:
+        """
+        Fuses the oldest time window once every active camera has reported in it or it
+        timed out.
 
-            buffer = DetectionGroupBuffer(pruned_groups)
-            buffer.setTimestamp(datetime.timedelta(milliseconds=start_ts))
-            self.output.send(buffer)
+        Returns the start timestamp (ms), the fused groups and the arrival skew (ms) per
+        camera friendly id of the window, or None if no window is ready. The groups are
+        empty if the window holds no detections.
+        """
+        if not self.timestamp_queue:
+            return None
+        if now is None:
+            now = time.monotonic()
+
+        start_ts = self.timestamp_queue[0]
+        end_ts = start_ts + self.time_window_ms
+        window = [ts for ts in self.timestamp_queue if ts <= end_ts]
+
+        arrivals: Dict[str, float] = {}
+        for ts in window:
+            for mxid, arrival in self.arrivals[ts].items():
+                arrivals[mxid] = min(arrival, arrivals.get(mxid, arrival))
+
+        active = {
+            mxid
+            for mxid, seen in self.last_seen.items()
+            if now - seen <= CAMERA_STALE_S
+        }
+        complete = active.issubset(arrivals)
+        device_timeout = (
+            self.latest_device_timestamp_ms - start_ts
+        ) / 1000 > self.timeout
+        host_timeout = now - min(arrivals.values()) > self.timeout
+        if not (complete or device_timeout or host_timeout):
+            return None
+
+        all_detections_in_window: List[WorldDetection] = []
+        while self.timestamp_queue and self.timestamp_queue[0] <= end_ts:
+            ts_to_pop = heapq.heappop(self.timestamp_queue)
+            all_detections_in_window.extend(self.detection_buffer.pop(ts_to_pop, []))
+            self.arrivals.pop(ts_to_pop, None)
+
+        first_arrival = min(arrivals.values())
+        skew_ms = {}
+        for mxid, arrival in arrivals.items():
+            friendly_id = self.all_cam_extrinsics[mxid]["friendly_id"]
+            skew_ms[friendly_id] = (arrival - first_arrival) * 1000
+            self.arrival_skew_ms[friendly_id].append(skew_ms[friendly_id])
+
+        if not all_detections_in_window:
+            return start_ts, [], skew_ms
+
+        groups = self._group_detections(all_detections_in_window)
+        return start_ts, self._prune_redundant_detections(groups), skew_ms
+
+    def skew_summary(self) -> Dict[int, Tuple[float, float]]:
+        """Mean and maximum arrival skew (ms) per camera friendly id over the last
+        SKEW_HISTORY windows."""
+        return {
+            friendly_id: (float(np.mean(skews)), float(np.max(skews)))
+            for friendly_id, skews in sorted(self.arrival_skew_ms.items())
+            if skews
+        }
 
     def _prune_redundant_detections(
         self, groups: List[List[WorldDetection]]
@@ -163,29 +218,30 @@ class FusionManager(dai.node.ThreadedHostNode):
         cam_to_world: np.ndarray,
         friendly_id: int,
     ) -> List[WorldDetection]:
-        world_detections: List[WorldDetection] = []
-        for det in detections:
-            coords = det.spatialCoordinates
-
-            # filter out ghost detections with z=0
-            if coords.z == 0:
-                continue
+        coords = [det.spatialCoordinates for det in detections]
+        # filter out ghost detections with z=0
+        kept = [i for i, c in enumerate(coords) if c.z != 0]
+        if not kept:
+            return []
 
-            # Convert from mm to m and add homogeneous w=1
-            pos_cam = np.array(
-                [coords.x / 1000.0, -coords.y / 1000.0, coords.z / 1000.0, 1.0]
-            )
-            pos_world = cam_to_world @ pos_cam.reshape(4, 1)
-
-            world_detections.append(
-                WorldDetection(
-                    label=det.labelName,
-                    confidence=det.confidence,
-                    pos_world_homogeneous=pos_world,
-                    camera_friendly_id=friendly_id,
-                )
+        # Convert from mm to m and add homogeneous w=1
+        pos_cam = np.ones((len(kept), 4, 1))
+        pos_cam[:, :3, 0] = [
+            (coords[i].x / 1000.0, -coords[i].y / 1000.0, coords[i].z / 1000.0)
+            for i in kept
+        ]
+        # (N, 4, 1) world positions, one 4x4 @ 4x1 product per detection
+        pos_world = cam_to_world @ pos_cam
+
+        return [
+            WorldDetection(
+                label=detections[i].labelName,
+                confidence=detections[i].confidence,
+                pos_world_homogeneous=pos_world[k],
+                camera_friendly_id=friendly_id,
             )
-        return world_detections
+            for k, i in enumerate(kept)
+        ]
 
     def _group_detections(
         self, detections: List[WorldDetection]
@@ -209,23 +265,22 @@ class FusionManager(dai.node.ThreadedHostNode):
                 all_groups.append(dets)
                 continue
 
-            cost_matrix = np.full((num_dets, num_dets), np.inf)
-            for i in range(num_dets):
-                for j in range(i + 1, num_dets):
-                    dist = np.linalg.norm(
-                        dets[i].pos_world_homogeneous[:3]
-                        - dets[j].pos_world_homogeneous[:3]
-                    )
-                    cost_matrix[i, j] = dist
-                    cost_matrix[j, i] = dist
+            # Pairwise distances; the squared norms are computed as dot products like
+            # np.linalg.norm does, as the assignment is sensitive to rounding on ties
+            positions = np.array([det.pos_world_cartesian for det in dets])
+            diff = positions[:, None, :] - positions[None, :, :]
+            cost_matrix = np.sqrt((diff[..., None, :] @ diff[..., :, None])[..., 0, 0])
+            np.fill_diagonal(cost_matrix, np.inf)
 
             row_ind, col_ind = linear_sum_assignment(cost_matrix)
 
             adj = collections.defaultdict(list)
-            for r, c in zip(row_ind, col_ind):
-                if r < c and cost_matrix[r, c] < self.distance_threshold_m:
-                    adj[r].append(c)
-                    adj[c].append(r)
+            linked = (row_ind < col_ind) & (
+                cost_matrix[row_ind, col_ind] < self.distance_threshold_m
+            )
+            for r, c in zip(row_ind[linked], col_ind[linked]):
+                adj[r].append(c)
+                adj[c].append(r)
 
             visited = set()
             for i in range(num_dets):
@@ -244,3 +299,105 @@ class FusionManager(dai.node.ThreadedHostNode):
                     all_groups.append([dets[idx] for idx in current_group_indices])
 
         return all_groups
+
+
+class FusionManager(dai.node.ThreadedHostNode):
+    def __init__(
+        self,
+        all_cam_extrinsics: Dict[str, Dict[str, Any]],
+        fps: int,
+        distance_threshold: float,
+    ) -> None:
+        super().__init__()
+
+        self.fps = fps
+        self.inputs: Dict[str, dai.Node.Input] = {}
+
+        self.output = self.createOutput(
+            possibleDatatypes=[
+                dai.Node.DatatypeHierarchy(dai.DatatypeEnum.Buffer, True)
+            ]
+        )
+
+        self.all_cam_extrinsics = all_cam_extrinsics
+        for mxid in all_cam_extrinsics.keys():
+            inp = self.createInput(
+                name=mxid,
+                group=mxid,
+                queueSize=4,
+                blocking=False,
+                types=[
+                    dai.Node.DatatypeHierarchy(
+                        dai.DatatypeEnum.SpatialImgDetections, True
+                    )
+                ],
+            )
+            self.inputs[mxid] = inp
+
+        self.engine = FusionEngine(all_cam_extrinsics, fps, distance_threshold)
+
+    def run(self):
+        # One blocking reader per camera feeds a merged queue, so fusion wakes up on
+        # message arrival instead of polling
+        arrivals: queue.Queue = queue.Queue()
+        readers = [
+            threading.Thread(
+                target=self._read_input, args=(mxid, inp, arrivals), daemon=True
+            )
+            for mxid, inp in self.inputs.items()
+        ]
+        for reader in readers:
+            reader.start()
+
+        last_report = time.monotonic()
+        while self.isRunning():
+            deadline = self.engine.next_deadline()
+            timeout = MAX_WAIT_S if deadline is None else min(deadline, MAX_WAIT_S)
+            try:
+                item = arrivals.get(timeout=timeout)
+                while True:
+                    self.engine.add_message(*item)
+                    item = arrivals.get_nowait()
+            except queue.Empty:
+                pass
+            self._process_buffer()
+
+            if time.monotonic() - last_report >= SKEW_REPORT_INTERVAL_S:
+                self._report_skew()
+                last_report = time.monotonic()
+
+    def _read_input(
+        self, mxid: str, inp: dai.Node.Input, arrivals: queue.Queue
+    ) -> None:
+        """Blocks on one camera input and forwards its messages with their arrival time."""
+        while self.isRunning():
+            try:
+                msg = inp.get()
+            except RuntimeError:
+                break  # the input queue is closed when the pipeline stops
+            assert isinstance(msg, dai.SpatialImgDetections)
+            arrivals.put((mxid, msg, time.monotonic()))
+
+    def _process_buffer(self):
+        """Send the fused groups of all time windows that are ready."""
+        while True:
+            fused = self.engine.pop_groups()
+            if fused is None:
+                return
+
+            start_ts, groups, skew_ms = fused
+            if not groups:
+                continue
+            buffer = DetectionGroupBuffer(groups, skew_ms)
+            buffer.setTimestamp(datetime.timedelta(milliseconds=start_ts))
+            self.output.send(buffer)
+
+    def _report_skew(self):
+        summary = self.engine.skew_summary()
+        if not summary:
+            return
+        stats = ", ".join(
+            f"cam {friendly_id}: mean {mean:.1f} ms, max {peak:.1f} ms"
+            for friendly_id, (mean, peak) in summary.items()
+        )
+        print(f"Arrival skew ({stats})")